@@ -4,6 +4,7 @@ import math
 import warnings
 from sys import maxsize
 import json
+import os
 
 
 """
@@ -22,7 +23,8 @@ Advanced strategy tips:
 class AlgoStrategy(gamelib.AlgoCore):
     def __init__(self):
         super().__init__()
-        seed = random.randrange(maxsize)
+        # Arena scripts pass ALGO_SEED to make repeated games reproducible
+        seed = int(os.environ["ALGO_SEED"]) if "ALGO_SEED" in os.environ else random.randrange(maxsize)
         random.seed(seed)
         # gamelib.debug_write('Random seed: {}'.format(seed))
 
@@ -4,6 +4,9 @@ The gamelib package contains modules that assist in algo creation \n
 The GameState class in game_state.py is the main class most players interact with. 
 It contains functions that let you get information about resources, deploy units, and help you strategize your move. \n
 
+The AsyncAlgoCore class in async_algocore.py is an asyncio version of AlgoCore. Its handlers can be coroutines, 
+and strategies can keep computing in the background while the next messages are read. \n
+
 The GameMap class in game_map.py represents the current game map. It can be used to access information related to the locations of units. 
 Investigating it is useful for any player that wants to access more information about the current state of the game. \n
 
@@ -13,9 +16,35 @@ Investigating it is useful for any player that wants to access information about
 The AlgoCore class in algocore.py handles communication with the game engine, and forms the bones of an algo. AlgoStrategy inherits from it. 
 Investigating it is useful for advanced players interested in getting data from the action phase or communicating directly with the game engine. \n
 
+The Bitboard class in bitboard.py stores the structures on the board as a few integer masks. 
+It is cheap to hash, compare and send to other processes, which makes it useful as a cache key. \n
+
+The CoverageMap class in coverage.py records which units can attack each tile. GameMap keeps one up to date so GameState.get_attackers is a single lookup. \n
+
 The Navigation class in navigation.py contains functions related to pathfinding, which are used by GameState in pathing related functions. 
 Investigating it is useful for advanced player who want to optimize the slow default pathing algorithm we provide. \n 
 
+path_equivalence.py runs alternative pathfinders next to the Navigation class on random and replay-derived boards, and shrinks any board where they disagree. \n
+
+zobrist.py contains the keys behind GameMap.zobrist_hash and a bounded TranspositionTable for caching results per layout. \n
+
+The TargetingEngine class in targeting.py answers the same question as GameState.get_target, but caches its work so it can be asked for every unit on every frame. \n
+
+The Speculator class in speculation.py computes the next turn in a background thread while the action phase is playing out. 
+AlgoCore uses it for algos that override AlgoCore.speculate. \n
+
+latency.py records the wall and CPU time of each phase of a turn, see AlgoCore.enable_latency_tracking. \n
+
+sampler.py contains a SamplingProfiler that AlgoCore.enable_slow_turn_profiling uses to write flamegraph profiles of turns that went over budget. \n
+
+instrumentation.py counts calls to the most used gamelib functions per turn, see AlgoCore.enable_instrumentation. \n
+
+The ResourceLedger class in resources.py holds both players' SP and MP for GameState, and can reserve resources for a build plan. \n
+
+projection.py precomputes the MP income of each turn and memoizes the projections behind GameState.project_future_MP. \n
+
+zygote.py contains a warm algo server for local arenas. It imports your strategy once and forks a child for each game started through run.sh. \n
+
 util.py contains a small handful of functions that help with communication, including the debug-printing function, debug_write().
 """
 
@@ -24,6 +53,7 @@ from .util import debug_write
 from .game_state import GameState
 from .unit import GameUnit
 from .game_map import GameMap
+from .bitboard import Bitboard
 
-__all__ = ["algocore", "game_state", "game_map", "navigation", "unit", "util"]
+__all__ = ["algocore", "async_algocore", "bitboard", "coverage", "game_state", "game_map", "instrumentation", "latency", "navigation", "path_equivalence", "projection", "resources", "sampler", "speculation", "targeting", "unit", "util", "zobrist", "zygote"]
  
\ No newline at end of file
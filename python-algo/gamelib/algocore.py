@@ -1,7 +1,18 @@
 import json
+import os
+import re
+import time
 
+from . import latency
+from .bitboard import Bitboard
 from .game_state import GameState
-from .util import get_command, debug_write, BANNER_TEXT, send_command
+from .instrumentation import Instrumentation
+from .sampler import SamplingProfiler
+from .speculation import Speculator
+from .util import get_command_bytes, debug_write, BANNER_TEXT, send_commands
+
+# Finds the message type and turn number in "turnInfo":[type, turn, frame] without parsing the whole message
+TURN_INFO_PATTERN = re.compile(rb'"turnInfo"\s*:\s*\[\s*(-?\d+)(?:\s*,\s*(-?\d+))?')
 
 class AlgoCore(object):
     """
@@ -10,10 +21,26 @@ class AlgoCore(object):
 
     Attributes :
         * config (JSON): json object containing information about the game
+        * speculation: During on_turn, the result of speculate if it was validated for this turn, None otherwise
+        * speculation_timeout (float): How long a turn waits for a speculation that is still running, in seconds. 0 by default,
+          so a turn never waits and only uses a speculation that finished during the action phase
+        * latency (:obj: LatencyTracker): Time spent per phase of each turn, if enable_latency_tracking was called
+        * profiler (:obj: SamplingProfiler): Samples the stack during each turn, if enable_slow_turn_profiling was called
+        * instrumentation (:obj: Instrumentation): Counts calls to gamelib functions, if enable_instrumentation was called
 
     """
     def __init__(self):
         self.config = None
+        self.speculation = None
+        self.speculation_timeout = 0
+        self.latency = None
+        self.profiler = None
+        self.instrumentation = None
+        self._speculator = None
+        self._overrides_action_frame = False
+        self._speculating = False
+        self._slow_turn_seconds = None
+        self._profile_directory = None
 
     def on_game_start(self, config):
         """
@@ -31,8 +58,7 @@ class AlgoCore(object):
         algo_strategy.py inherits from AlgoCore and overrides this on turn function. 
         Adjusting the on_turn function in algo_strategy is the main way to adjust your algo's logic. 
         """
-        send_command("[]")
-        send_command("[]")
+        send_commands("[]", "[]")
     
     def on_action_frame(self, action_frame_game_state):
         """
@@ -43,6 +69,136 @@ class AlgoCore(object):
         """
         pass
 
+    def speculate(self, action_frame_game_state):
+        """
+        Override this to start computing the next turn while the action phase is still running.
+        It is called in a background thread with the newest action frame whenever it is free, so it should
+        not change anything on_turn or on_action_frame use without a lock. \n
+        Whatever it returns is available as self.speculation during the next on_turn, 
+        if validate_speculation accepts the frame it was computed from. By default there is no speculation.
+        """
+        return None
+
+    def validate_speculation(self, action_frame_game_state, game_state):
+        """
+        Decides if a speculation computed from an action frame can be reused for the turn that followed.
+        By default it can if the structures on the board, their upgrades and removal flags are unchanged.
+        Override it if your speculation depends on anything else, such as resources or health.
+        """
+        return Bitboard.from_state(json.loads(action_frame_game_state)) == Bitboard.from_state(json.loads(game_state))
+
+    def enable_latency_tracking(self, trace_path=None):
+        """
+        Records wall and CPU time spent reading messages, decoding them, building GameStates, in your strategy,
+        submitting turns and handling action frames. A summary is written with debug_write at the end of the game. \n
+        Call it before start, for example in the __init__ of your strategy.
+
+        Args:
+            trace_path: If given, the phases of each turn are also written to this file as a line of JSON
+
+        """
+        self.latency = latency.LatencyTracker(trace_path)
+        latency.activate(self.latency)
+
+    def enable_slow_turn_profiling(self, threshold=1.0, directory="profiles", interval=0.005):
+        """
+        Samples the stack every few milliseconds during each on_turn, and keeps the samples of turns that took longer
+        than threshold seconds. They are written to directory/turn_<turn number>.folded in collapsed stack format,
+        which flamegraph.pl and speedscope turn into flamegraphs. \n
+        Call it before start, for example in the __init__ of your strategy.
+
+        Args:
+            threshold: Turns taking longer than this many seconds are written
+            directory: Where the profiles are written
+            interval: Seconds between samples
+
+        """
+        self.profiler = SamplingProfiler(interval)
+        self._slow_turn_seconds = threshold
+        self._profile_directory = directory
+
+    def enable_instrumentation(self, functions=None):
+        """
+        Counts the calls to find_path_to_edge, get_attackers, get_locations_in_range, contains_stationary_unit
+        and can_spawn during each turn, and how long they took. The most expensive are written with debug_write
+        at the end of the game. Your own functions can be counted too, by decorating them with instrumentation.timed. \n
+        Call it before start, for example in the __init__ of your strategy.
+
+        Args:
+            functions: (class or module, attribute name) pairs to count instead of the defaults
+
+        """
+        self.instrumentation = Instrumentation() if functions is None else Instrumentation(functions)
+        self.instrumentation.enable()
+
+    def _begin_game(self):
+        """
+        Sets up what the message loop needs before the first message. The helpers below hold the handling
+        of each message that AlgoCore.start and AsyncAlgoCore.run share, so both loops track latency,
+        speculate, profile and count calls the same way.
+        """
+        # Action frames are only decoded if a subclass wants them
+        self._overrides_action_frame = type(self).on_action_frame is not AlgoCore.on_action_frame
+        self._speculating = type(self).speculate is not AlgoCore.speculate
+        if self._speculating and self._speculator is None:
+            self._speculator = Speculator(self.speculate)
+
+    def _wants_action_frames(self):
+        return self._overrides_action_frame or self._speculating
+
+    def _begin_turn(self, turn_number, game_state_string):
+        """
+        Starts tracking a turn and sets self.speculation, right before on_turn is called.
+        Returns what _end_turn needs once on_turn is done.
+        """
+        if self.latency is not None:
+            self.latency.start_turn(turn_number)
+        if self.instrumentation is not None:
+            self.instrumentation.next_turn(turn_number)
+        if self.profiler is not None:
+            self.profiler.start()
+        start = time.perf_counter()
+        speculation, valid = None, False
+        if self._speculating:
+            speculation = self._speculator.collect(self.speculation_timeout)
+            valid = speculation is not None and self.validate_speculation(speculation.frame, game_state_string)
+            self.speculation = speculation.result if valid else None
+        return turn_number, start, speculation, valid, time.perf_counter()
+
+    def _end_turn(self, turn):
+        turn_number, start, speculation, valid, strategy_start = turn
+        end = time.perf_counter()
+        if self._speculating:
+            self._speculator.record_turn(speculation, valid, end - strategy_start)
+            self.speculation = None
+        if self.profiler is not None:
+            self.profiler.stop()
+            seconds = end - start
+            if seconds > self._slow_turn_seconds:
+                path = os.path.join(self._profile_directory, "turn_{}.folded".format(turn_number))
+                self.profiler.write(path)
+                debug_write("Turn {} took {:.3f}s, profile written to {}".format(turn_number, seconds, path))
+
+    def _receive_action_frame(self, action_frame):
+        """
+        Hands a decoded action frame to the speculation, before on_action_frame is called.
+        """
+        if self._speculating:
+            self._speculator.submit(action_frame)
+
+    def _end_game(self):
+        """
+        Writes the summaries of whatever was enabled once the end state arrives.
+        """
+        if self._speculating:
+            debug_write(self._speculator.summary())
+        if self.latency is not None:
+            self.latency.report()
+            latency.activate(None)
+        if self.instrumentation is not None:
+            self.instrumentation.finish_turn()
+            self.instrumentation.disable()
+            debug_write(self.instrumentation.summary())
 
     def start(self):
         """ 
@@ -52,44 +208,61 @@ class AlgoCore(object):
         The algo continues this loop until it recieves the "End" turn message from the game.
         """
         debug_write(BANNER_TEXT)
+        self._begin_game()
 
         while True:
             # Note: Python blocks and hangs on stdin. Can cause issues if connections aren't setup properly and may need to
             # manually kill this Python program.
-            game_state_string = get_command()
-            if "replaySave" in game_state_string:
+            with latency.phase("read"):
+                message = get_command_bytes()
+            turn_info = TURN_INFO_PATTERN.search(message)
+            if turn_info is None and b"replaySave" in message:
                 """
                 This means this must be the config file. So, load in the config file as a json and add it to your AlgoStrategy class.
                 """
-                parsed_config = json.loads(game_state_string)
+                with latency.phase("decode"):
+                    parsed_config = json.loads(message)
                 self.on_game_start(parsed_config)
-            elif "turnInfo" in game_state_string:
-                state = json.loads(game_state_string)
-                stateType = int(state.get("turnInfo")[0])
+            elif turn_info is not None:
+                stateType = int(turn_info.group(1))
                 if stateType == 0:
                     """
                     This is the game turn game state message. Algo must now print to stdout 2 lines, one for build phase one for
                     deploy phase. Printing is handled by the provided functions.
                     """
-                    self.on_turn(game_state_string)
+                    with latency.phase("decode"):
+                        game_state_string = message.decode("utf-8")
+                    with latency.phase("strategy"):
+                        turn = self._begin_turn(int(turn_info.group(2) or -1), game_state_string)
+                        try:
+                            self.on_turn(game_state_string)
+                        finally:
+                            self._end_turn(turn)
                 elif stateType == 1:
                     """
                     If stateType == 1, this game_state_string string represents a single frame of an action phase
                     """
-                    self.on_action_frame(game_state_string)
+                    if self._wants_action_frames():
+                        with latency.phase("decode"):
+                            action_frame = message.decode("utf-8")
+                        self._receive_action_frame(action_frame)
+                        if self._overrides_action_frame:
+                            with latency.phase("action_frame"):
+                                self.on_action_frame(action_frame)
                 elif stateType == 2:
                     """
                     This is the end game message. This means the game is over so break and finish the program.
                     """
                     debug_write("Got end state, game over. Stopping algo.")
+                    self._end_game()
                     break
                 else:
                     """
                     Something is wrong? Received an incorrect or improperly formatted string.
                     """
-                    debug_write("Got unexpected string with turnInfo: {}".format(game_state_string))
+                    debug_write("Got unexpected string with turnInfo: {}".format(message.decode("utf-8", "replace")))
             else:
                 """
                 Something is wrong? Received an incorrect or improperly formatted string.
                 """
-                debug_write("Got unexpected string : {}".format(game_state_string))
+                debug_write("Got unexpected string : {}".format(message.decode("utf-8", "replace")))
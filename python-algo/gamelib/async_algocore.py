@@ -0,0 +1,166 @@
+import asyncio
+import inspect
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from . import latency
+from .algocore import AlgoCore, TURN_INFO_PATTERN
+from .util import debug_write, BANNER_TEXT, _binary_stdin
+
+# The longest message the stream reader accepts, action frames of large games are well below this
+MAX_MESSAGE_SIZE = 1 << 24
+
+
+class AsyncAlgoCore(AlgoCore):
+    """
+    An asyncio version of AlgoCore. \n
+    Messages from the game engine are read without blocking the event loop, so a strategy can keep
+    working between messages. on_game_start, on_turn and on_action_frame can be overridden with
+    either regular functions or coroutines (async def); coroutines are awaited before the next message
+    is handled. To keep working while further messages are read, start a task with create_task, or
+    move CPU heavy work to a thread with run_in_background. Latency tracking, speculation, slow turn
+    profiling and instrumentation work as they do on AlgoCore.
+
+    Attributes :
+        * config (JSON): json object containing information about the game
+        * loop (:obj: asyncio.AbstractEventLoop): The running event loop, set once start is called
+
+    """
+    def __init__(self):
+        super().__init__()
+        self.loop = None
+        self.__background = set()
+        self.__transport = None
+        self.__executor = None
+
+    def start(self):
+        """
+        Start the parsing loop, and return once the game ends or the game engine closes stdin.
+        """
+        asyncio.run(self.run())
+
+    async def run(self):
+        """
+        The coroutine behind start, for algos that manage their own event loop.
+        """
+        debug_write(BANNER_TEXT)
+        self.loop = asyncio.get_running_loop()
+        read_message = await self.__open_stdin()
+        self._begin_game()
+
+        try:
+            while True:
+                with latency.phase("read"):
+                    message = await read_message()
+                if not message:
+                    debug_write("Got EOF, parent game process must have died, stopping algo.")
+                    break
+                turn_info = TURN_INFO_PATTERN.search(message)
+                if turn_info is None and b"replaySave" in message:
+                    with latency.phase("decode"):
+                        parsed_config = json.loads(message)
+                    await self.__dispatch(self.on_game_start, parsed_config)
+                elif turn_info is not None:
+                    stateType = int(turn_info.group(1))
+                    if stateType == 0:
+                        with latency.phase("decode"):
+                            game_state_string = message.decode("utf-8")
+                        with latency.phase("strategy"):
+                            turn = self._begin_turn(int(turn_info.group(2) or -1), game_state_string)
+                            try:
+                                await self.__dispatch(self.on_turn, game_state_string)
+                            finally:
+                                self._end_turn(turn)
+                    elif stateType == 1:
+                        if self._wants_action_frames():
+                            with latency.phase("decode"):
+                                action_frame = message.decode("utf-8")
+                            self._receive_action_frame(action_frame)
+                            if self._overrides_action_frame:
+                                with latency.phase("action_frame"):
+                                    await self.__dispatch(self.on_action_frame, action_frame)
+                    elif stateType == 2:
+                        debug_write("Got end state, game over. Stopping algo.")
+                        self._end_game()
+                        break
+                    else:
+                        debug_write("Got unexpected string with turnInfo: {}".format(message.decode("utf-8", "replace")))
+                else:
+                    debug_write("Got unexpected string : {}".format(message.decode("utf-8", "replace")))
+        finally:
+            await self.__cancel_background()
+            if self.__transport is not None:
+                self.__transport.close()
+                self.__transport = None
+
+    async def __open_stdin(self):
+        """
+        Connects a StreamReader to stdin. Where stdin can't be watched by the event loop (a regular file,
+        a replaced sys.stdin, or Windows), lines are read by a worker thread instead.
+        """
+        reader = asyncio.StreamReader(limit=MAX_MESSAGE_SIZE)
+        try:
+            # Checked first, a transport that fails to start on a stream without a descriptor warns when collected.
+            # Note that connect_read_pipe leaves fd 0 non-blocking, also for anything else sharing it.
+            sys.stdin.fileno()
+            self.__transport, _ = await self.loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+            return reader.readline
+        except (AttributeError, NotImplementedError, OSError, ValueError):
+            stdin = _binary_stdin()
+            return lambda: self.loop.run_in_executor(None, stdin.readline)
+
+    async def __dispatch(self, handler, *args):
+        result = handler(*args)
+        if inspect.isawaitable(result):
+            await result
+
+    def __track(self, future):
+        self.__background.add(future)
+        future.add_done_callback(self.__finished)
+        return future
+
+    def __finished(self, future):
+        self.__background.discard(future)
+        if not future.cancelled() and future.exception() is not None:
+            debug_write("Background task failed: {!r}".format(future.exception()))
+
+    def create_task(self, coroutine):
+        """Runs a coroutine alongside the message loop. It is cancelled when the game ends.
+
+        Args:
+            coroutine: The coroutine to run
+
+        Returns:
+            The asyncio.Task running it
+
+        """
+        return self.__track(self.loop.create_task(coroutine))
+
+    def run_in_background(self, func, *args):
+        """Calls func(*args) in a worker thread, so CPU heavy work does not stop messages from being read.
+        When the game ends, calls that have not started are dropped. A thread can't be interrupted, so
+        calls that are already running finish by themselves; long work should check a flag to stop early.
+
+        Args:
+            func: The function to call
+            args: Its arguments
+
+        Returns:
+            An asyncio future for the result, which can be awaited from a handler
+
+        """
+        if self.__executor is None:
+            self.__executor = ThreadPoolExecutor(thread_name_prefix="algo-background")
+        return self.__track(self.loop.run_in_executor(self.__executor, func, *args))
+
+    async def __cancel_background(self):
+        pending = list(self.__background)
+        for future in pending:
+            future.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        # Not the loop's default executor, which asyncio.run would wait for while closing the loop
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=False, cancel_futures=True)
+            self.__executor = None
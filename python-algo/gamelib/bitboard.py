@@ -0,0 +1,299 @@
+"""
+A compact representation of structure layouts.
+
+Each of the 420 tiles of the arena gets one bit, numbered row by row from the bottom
+corner, so a layout is a handful of python integers. Bitboards are cheap to hash,
+compare and pickle, which makes them good cache keys and a small wire format for
+sending layouts to other processes.
+"""
+from .game_map import GameMap
+from .util import debug_write
+
+ARENA_SIZE = 28
+HALF_ARENA = ARENA_SIZE // 2
+
+# Indices into config["unitInformation"] and the p1Units/p2Units arrays, see GameState.__init__
+STRUCTURE_INDICES = (0, 1, 2)
+REMOVE_INDEX = 6
+UPGRADE_INDEX = 7
+
+
+def _arena_locations():
+    locations = []
+    for y in range(ARENA_SIZE):
+        row_size = y + 1 if y < HALF_ARENA else ARENA_SIZE - y
+        for x in range(HALF_ARENA - row_size, HALF_ARENA + row_size):
+            locations.append((x, y))
+    return locations
+
+
+LOCATIONS = _arena_locations()
+NUM_TILES = len(LOCATIONS)
+NUM_BYTES = (NUM_TILES + 7) // 8
+FULL_MASK = (1 << NUM_TILES) - 1
+_INDEX = [[-1] * ARENA_SIZE for _ in range(ARENA_SIZE)]
+for _i, (_x, _y) in enumerate(LOCATIONS):
+    _INDEX[_x][_y] = _i
+
+
+def tile_index(location):
+    """Gets the bit index of a location
+
+    Args:
+        location: An [x, y] location
+
+    Returns:
+        The bit index of the location, or -1 if it is outside the arena
+
+    """
+    x, y = map(int, location)
+    if 0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE:
+        return _INDEX[x][y]
+    return -1
+
+
+def location_mask(locations):
+    """Builds a mask with the bits of the given locations set. Locations outside the arena are ignored.
+
+    Args:
+        locations: A list of [x, y] locations
+
+    Returns:
+        The mask as an int
+
+    """
+    mask = 0
+    for location in locations:
+        i = tile_index(location)
+        if i >= 0:
+            mask |= 1 << i
+    return mask
+
+
+def mask_locations(mask):
+    """Lists the locations whose bits are set in a mask
+
+    Args:
+        mask: An int mask
+
+    Returns:
+        A list of [x, y] locations in bit order
+
+    """
+    locations = []
+    while mask:
+        low = mask & -mask
+        x, y = LOCATIONS[low.bit_length() - 1]
+        locations.append([x, y])
+        mask ^= low
+    return locations
+
+
+def count(mask):
+    """The number of locations set in a mask
+    """
+    return bin(mask).count("1")
+
+
+def half_mask(player_index):
+    """The mask of the half of the arena a player builds on, 0 for you 1 for the enemy
+    """
+    if player_index == 0:
+        return location_mask([location for location in LOCATIONS if location[1] < HALF_ARENA])
+    return location_mask([location for location in LOCATIONS if location[1] >= HALF_ARENA])
+
+
+class Bitboard:
+    """The structures on the board, as one mask per player and structure type
+
+    Attributes :
+        * structures (list): structures[player_index][type_index] is the mask of that player's structures of that type,
+          where type_index is the structure's index in config["unitInformation"] (0 = wall, 1 = support, 2 = turret)
+        * upgraded (int): Mask of upgraded structures
+        * pending_removal (int): Mask of structures marked for removal
+
+    """
+    __slots__ = ("structures", "upgraded", "pending_removal")
+
+    def __init__(self, structures=None, upgraded=0, pending_removal=0):
+        self.structures = [list(masks) for masks in structures] if structures else [[0, 0, 0], [0, 0, 0]]
+        self.upgraded = upgraded
+        self.pending_removal = pending_removal
+
+    @classmethod
+    def from_units(cls, p1_units, p2_units):
+        """Builds a bitboard from the raw p1Units and p2Units arrays of a game state or action frame
+
+        Args:
+            p1_units: The p1Units array, one list of [x, y, health, id] entries per unit type
+            p2_units: The p2Units array
+
+        Returns:
+            A new Bitboard
+
+        """
+        board = cls()
+        for player_index, units in enumerate((p1_units, p2_units)):
+            masks = board.structures[player_index]
+            for type_index in STRUCTURE_INDICES:
+                for unit in units[type_index]:
+                    masks[type_index] |= 1 << _INDEX[int(unit[0])][int(unit[1])]
+            if len(units) > UPGRADE_INDEX:
+                for unit in units[UPGRADE_INDEX]:
+                    board.upgraded |= 1 << _INDEX[int(unit[0])][int(unit[1])]
+            if len(units) > REMOVE_INDEX:
+                for unit in units[REMOVE_INDEX]:
+                    board.pending_removal |= 1 << _INDEX[int(unit[0])][int(unit[1])]
+        return board
+
+    @classmethod
+    def from_state(cls, state):
+        """Builds a bitboard from a parsed game state or action frame json object
+        """
+        return cls.from_units(state["p1Units"], state["p2Units"])
+
+    @classmethod
+    def from_game_map(cls, game_map):
+        """Builds a bitboard from the structures on a GameMap. Mobile units are ignored.
+
+        Args:
+            game_map: A GameMap
+
+        Returns:
+            A new Bitboard
+
+        """
+        type_index = {game_map.config["unitInformation"][i]["shorthand"]: i for i in STRUCTURE_INDICES}
+        board = cls()
+        for i, (x, y) in enumerate(LOCATIONS):
+            for unit in game_map[x, y]:
+                if not unit.stationary:
+                    continue
+                bit = 1 << i
+                board.structures[unit.player_index][type_index[unit.unit_type]] |= bit
+                if unit.upgraded:
+                    board.upgraded |= bit
+                if unit.pending_removal:
+                    board.pending_removal |= bit
+        return board
+
+    def to_game_map(self, config):
+        """Creates a GameMap holding the structures of this bitboard at full health
+
+        Args:
+            config: The game config
+
+        Returns:
+            A new GameMap
+
+        """
+        game_map = GameMap(config)
+        for player_index in (0, 1):
+            for type_index in STRUCTURE_INDICES:
+                unit_type = config["unitInformation"][type_index]["shorthand"]
+                for location in mask_locations(self.structures[player_index][type_index]):
+                    game_map.add_unit(unit_type, location, player_index)
+        for location in mask_locations(self.upgraded):
+            game_map.upgrade_unit(location)
+        for location in mask_locations(self.pending_removal):
+            game_map.set_pending_removal(location)
+        return game_map
+
+    def occupied(self, player_index=None):
+        """The mask of locations holding a structure
+
+        Args:
+            player_index: Only count this player's structures, 0 for you 1 for the enemy. Both players if None.
+
+        """
+        players = (0, 1) if player_index is None else (player_index,)
+        mask = 0
+        for p in players:
+            for type_mask in self.structures[p]:
+                mask |= type_mask
+        return mask
+
+    def structures_in(self, region, player_index=None, type_index=None):
+        """The mask of structures inside a region
+
+        Args:
+            region: A mask, see location_mask
+            player_index: Only include this player's structures. Both players if None.
+            type_index: Only include this structure type. All types if None.
+
+        """
+        if type_index is None:
+            return self.occupied(player_index) & region
+        players = (0, 1) if player_index is None else (player_index,)
+        mask = 0
+        for p in players:
+            mask |= self.structures[p][type_index]
+        return mask & region
+
+    def count_in(self, region, player_index=None, type_index=None):
+        """The number of structures inside a region, see structures_in
+        """
+        return count(self.structures_in(region, player_index, type_index))
+
+    def is_blocked(self, location):
+        """True if a structure stands on the location
+        """
+        i = tile_index(location)
+        return i >= 0 and bool(self.occupied() >> i & 1)
+
+    def set(self, location, player_index, type_index, upgraded=False):
+        """Places a structure, replacing whatever structure stood there. Locations outside the arena are ignored with a warning.
+        """
+        index = tile_index(location)
+        if index < 0:
+            debug_write("{} is out of bounds.".format(str(location)))
+            return
+        self.clear(location)
+        bit = 1 << index
+        self.structures[player_index][type_index] |= bit
+        if upgraded:
+            self.upgraded |= bit
+
+    def clear(self, location):
+        """Removes any structure from the location. Locations outside the arena are ignored with a warning.
+        """
+        index = tile_index(location)
+        if index < 0:
+            debug_write("{} is out of bounds.".format(str(location)))
+            return
+        keep = FULL_MASK ^ (1 << index)
+        for masks in self.structures:
+            for type_index in range(len(masks)):
+                masks[type_index] &= keep
+        self.upgraded &= keep
+        self.pending_removal &= keep
+
+    def copy(self):
+        return Bitboard(self.structures, self.upgraded, self.pending_removal)
+
+    def key(self):
+        """All masks as a flat tuple, usable as a dict key
+        """
+        return tuple(self.structures[0]) + tuple(self.structures[1]) + (self.upgraded, self.pending_removal)
+
+    def to_bytes(self):
+        """Serializes the bitboard into a fixed size bytes object, see from_bytes
+        """
+        return b"".join(mask.to_bytes(NUM_BYTES, "little") for mask in self.key())
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Restores a bitboard written by to_bytes
+        """
+        masks = [int.from_bytes(data[i:i + NUM_BYTES], "little") for i in range(0, 8 * NUM_BYTES, NUM_BYTES)]
+        return cls([masks[0:3], masks[3:6]], masks[6], masks[7])
+
+    def __eq__(self, other):
+        return isinstance(other, Bitboard) and self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def __repr__(self):
+        return "Bitboard({} structures, {} upgraded, {} pending removal)".format(
+            count(self.occupied()), count(self.upgraded), count(self.pending_removal))
@@ -0,0 +1,111 @@
+"""
+Inverted attack coverage for GameState.get_attackers.
+
+Instead of searching around a location for units that can reach it, CoverageMap stores for every
+tile the list of units that can attack it. GameMap builds it the first time it is needed and
+updates it whenever units are added, removed or upgraded, so get_attackers is a single lookup.
+"""
+import math
+
+# attackRange -> [(dx, dy), ...] offsets within range of a unit
+_stencils = {}
+
+
+def attack_stencil(attack_range):
+    """The offsets of every tile within range of an attacker, using the same distance check as get_attackers
+
+    Args:
+        attack_range: The attacker's range
+
+    Returns:
+        A list of (dx, dy) offsets. Do not modify it, it is shared.
+
+    """
+    stencil = _stencils.get(attack_range)
+    if stencil is None:
+        reach = int(math.ceil(attack_range))
+        stencil = [(dx, dy) for dx in range(-reach, reach + 1) for dy in range(-reach, reach + 1)
+                   if math.sqrt(dx ** 2 + dy ** 2) <= attack_range]
+        _stencils[attack_range] = stencil
+    return stencil
+
+
+class CoverageMap:
+    """For each player, the units of that player able to attack each tile
+
+    Attackers of a tile are kept in the same order get_attackers used to find them in:
+    by the x, then y, coordinate of the attacker, then by their order within their location.
+    Get the map of a GameMap with game_map.get_coverage_map() rather than creating one directly.
+
+    """
+    def __init__(self, game_map):
+        self.ARENA_SIZE = game_map.ARENA_SIZE
+        self.__covering = {}
+        self.__sources = {}
+        for x in range(self.ARENA_SIZE):
+            for y in range(self.ARENA_SIZE):
+                if game_map[x, y]:
+                    self.update_cell(x, y, game_map[x, y])
+
+    def __grid(self, player_index):
+        grid = self.__covering.get(player_index)
+        if grid is None:
+            grid = [[[] for _ in range(self.ARENA_SIZE)] for _ in range(self.ARENA_SIZE)]
+            self.__covering[player_index] = grid
+        return grid
+
+    def update_cell(self, x, y, units):
+        """Replaces whatever used to attack from a location with the given units
+
+        Args:
+            x, y: The location whose units changed
+            units: The units now at that location
+
+        """
+        for player_index, tiles in self.__sources.pop((x, y), ()):
+            grid = self.__covering[player_index]
+            for tx, ty in tiles:
+                grid[tx][ty] = [entry for entry in grid[tx][ty] if entry[0] != x or entry[1] != y]
+
+        sources = []
+        for unit in units:
+            if unit.damage_i + unit.damage_f <= 0:
+                continue
+            grid = self.__grid(unit.player_index)
+            tiles = []
+            for dx, dy in attack_stencil(unit.attackRange):
+                tx, ty = x + dx, y + dy
+                if 0 <= tx < self.ARENA_SIZE and 0 <= ty < self.ARENA_SIZE:
+                    attackers = grid[tx][ty]
+                    i = len(attackers)
+                    while i > 0 and (attackers[i - 1][0], attackers[i - 1][1]) > (x, y):
+                        i -= 1
+                    attackers.insert(i, (x, y, unit))
+                    tiles.append((tx, ty))
+            sources.append((unit.player_index, tiles))
+        if sources:
+            self.__sources[(x, y)] = sources
+
+    def covers(self, location):
+        """True if the location is inside the grid the map covers. Outside it, use a range search instead.
+        """
+        x, y = location
+        return 0 <= x < self.ARENA_SIZE and 0 <= y < self.ARENA_SIZE
+
+    def get_attackers(self, location, player_index):
+        """The units that can attack a unit of the given player at the given location
+
+        Args:
+            location: A location inside the grid, see covers
+            player_index: The defending player, 0 for you 1 for the enemy
+
+        Returns:
+            A new list of GameUnits
+
+        """
+        x, y = map(int, location)
+        lists = [grid[x][y] for owner, grid in self.__covering.items() if owner != player_index and grid[x][y]]
+        if len(lists) == 1:
+            return [entry[2] for entry in lists[0]]
+        entries = sorted((entry for attackers in lists for entry in attackers), key=lambda entry: (entry[0], entry[1]))
+        return [entry[2] for entry in entries]
@@ -1,6 +1,8 @@
 import math
 from .unit import GameUnit
 from .util import debug_write
+from .zobrist import zobrist_keys
+from .coverage import CoverageMap
 
 class GameMap:
     """Holds data about the current game map and provides functions
@@ -18,6 +20,9 @@ class GameMap:
         * TOP_LEFT (int): A constant that represents the top left edge
         * BOTTOM_LEFT (int): Hidden challenge! Can you guess what this constant represents???
         * BOTTOM_RIGHT (int): A constant that represents the bottom right edge
+        * zobrist_hash (int): A 64-bit hash of the structures on the map, see zobrist.py. It is kept up to date by
+          add_unit, remove_unit, upgrade_unit, set_pending_removal and assigning to game_map[x, y], but not by
+          changing the unit lists or units directly. The same goes for the coverage map, see get_coverage_map.
 
     """
     def __init__(self, config):
@@ -37,6 +42,9 @@ class GameMap:
         self.BOTTOM_RIGHT = 3
         self.__map = self.__empty_grid()
         self.__start = [13,0]
+        self.__zobrist = zobrist_keys(config)
+        self.zobrist_hash = 0
+        self.__coverage = None
     
     def __getitem__(self, location):
         if len(location) == 2 and self.in_arena_bounds(location):
@@ -46,7 +54,11 @@ class GameMap:
 
     def __setitem__(self, location, val):
         if type(location) == tuple and len(location) == 2 and self.in_arena_bounds(location):
-            self.__map[location[0]][location[1]] = val
+            x, y = location
+            self.zobrist_hash ^= self.__cell_hash(x, y)
+            self.__map[x][y] = val
+            self.zobrist_hash ^= self.__cell_hash(x, y)
+            self.__cell_changed(x, y)
             return
         self._invalid_coordinates(location)
 
@@ -75,6 +87,45 @@ class GameMap:
                 grid[x].append([])
         return grid
 
+    def __cell_hash(self, x, y):
+        key = 0
+        for unit in self.__map[x][y]:
+            key ^= self.__zobrist.unit_key(unit, x, y)
+        return key
+
+    def __cell_changed(self, x, y):
+        if self.__coverage is not None:
+            self.__coverage.update_cell(x, y, self.__map[x][y])
+
+    def get_coverage_map(self, rebuild=False):
+        """Gets the map of which units can attack each tile, building it on first use.
+        After that it is kept up to date by the same functions that update zobrist_hash.
+
+        Args:
+            rebuild: If true, build it again from scratch. Use this after changing units directly.
+
+        Returns:
+            A CoverageMap, see coverage.py
+
+        """
+        if self.__coverage is None or rebuild:
+            self.__coverage = CoverageMap(self)
+        return self.__coverage
+
+    def compute_zobrist_hash(self):
+        """Computes the hash of the map from scratch. 
+        Use it to resynchronize zobrist_hash after changing units directly.
+
+        Returns:
+            The hash of the structures currently on the map
+
+        """
+        key = 0
+        for x in range(self.ARENA_SIZE):
+            for y in range(self.ARENA_SIZE):
+                key ^= self.__cell_hash(x, y)
+        return key
+
     def _invalid_coordinates(self, location):
         self.warn("{} is out of bounds.".format(str(location)))
 
@@ -149,13 +200,15 @@ class GameMap:
             bottom_right.append([int(x), int(y)])
         return [top_right, top_left, bottom_left, bottom_right]
     
-    def add_unit(self, unit_type, location, player_index=0):
+    def add_unit(self, unit_type, location, player_index=0, health=None, count=1):
         """Add a single GameUnit to the map at the given location.
 
         Args:
             unit_type: The type of the new unit. Use the constants provided in algo_strategy.
             location: A list of two integers representing the [x,y] coordinate of the new unit
             player_index: The index corresponding to the player controlling the new unit, 0 for you 1 for the enemy
+            health: The health of the new unit, its starting health if None
+            count: How many units to add. Only mobile units can share a location.
 
         This function does not affect your turn and only changes the data stored in GameMap. The intended use of this function
         is to allow you to create arbitrary gamestates. Using this function on the game_map provided with game_state will 
@@ -167,11 +220,16 @@ class GameMap:
             self.warn("Player index {} is invalid. Player index should be 0 or 1.".format(player_index))
 
         x, y = location
-        new_unit = GameUnit(unit_type, self.config, player_index, None, location[0], location[1])
+        new_unit = GameUnit(unit_type, self.config, player_index, health, location[0], location[1])
         if not new_unit.stationary:
             self.__map[x][y].append(new_unit)
+            for _ in range(count - 1):
+                self.__map[x][y].append(GameUnit(unit_type, self.config, player_index, health, location[0], location[1]))
         else:
+            self.zobrist_hash ^= self.__cell_hash(x, y)
             self.__map[x][y] = [new_unit]
+            self.zobrist_hash ^= self.__zobrist.unit_key(new_unit, x, y)
+        self.__cell_changed(x, y)
 
     def remove_unit(self, location):
         """Remove all units on the map in the given location.
@@ -186,7 +244,61 @@ class GameMap:
             self._invalid_coordinates(location)
         
         x, y = location
+        self.zobrist_hash ^= self.__cell_hash(x, y)
         self.__map[x][y] = []
+        self.__cell_changed(x, y)
+
+    def __stationary_unit(self, location):
+        if not self.in_arena_bounds(location):
+            self._invalid_coordinates(location)
+            return None
+        x, y = location
+        for unit in self.__map[x][y]:
+            if unit.stationary:
+                return unit
+        return None
+
+    def upgrade_unit(self, location):
+        """Upgrade the structure at the given location.
+
+        Args:
+            location: The location of the structure
+
+        Returns:
+            True if a structure was upgraded, False if there is no structure or it was already upgraded
+
+        Like add_unit, this function only changes the data stored in GameMap. Use GameState.attempt_upgrade to upgrade during your turn.
+        """
+        unit = self.__stationary_unit(location)
+        if unit is None or unit.upgraded:
+            return False
+        x, y = location
+        self.zobrist_hash ^= self.__zobrist.unit_key(unit, x, y)
+        unit.upgrade()
+        self.zobrist_hash ^= self.__zobrist.unit_key(unit, x, y)
+        self.__cell_changed(x, y)
+        return True
+
+    def set_pending_removal(self, location, pending_removal=True):
+        """Flag or unflag the structure at the given location for removal.
+
+        Args:
+            location: The location of the structure
+            pending_removal: The new value of the structure's pending_removal flag
+
+        Returns:
+            True if there is a structure at the location, False otherwise
+
+        Like add_unit, this function only changes the data stored in GameMap. Use GameState.attempt_remove to remove structures during your turn.
+        """
+        unit = self.__stationary_unit(location)
+        if unit is None:
+            return False
+        x, y = location
+        self.zobrist_hash ^= self.__zobrist.unit_key(unit, x, y)
+        unit.pending_removal = pending_removal
+        self.zobrist_hash ^= self.__zobrist.unit_key(unit, x, y)
+        return True
 
     def get_locations_in_range(self, location, radius):
         """Gets locations in a circular area around a location
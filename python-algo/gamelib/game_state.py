@@ -2,11 +2,27 @@ import math
 import json
 import sys
 
+from . import latency
 from .navigation import ShortestPathFinder
-from .util import send_command, debug_write
+from .projection import mp_schedule
+from .resources import ResourceLedger
+from .util import send_commands, debug_write
 from .unit import GameUnit
 from .game_map import GameMap
 
+# The locations mobile units can be deployed on, see _spawn_edge
+_SPAWN_EDGE = None
+
+
+def _spawn_edge(game_map):
+    """The bottom left and bottom right edges as a frozenset of (x, y) tuples, built the first time it is needed
+    """
+    global _SPAWN_EDGE
+    if _SPAWN_EDGE is None:
+        edges = game_map.get_edges()
+        _SPAWN_EDGE = frozenset(tuple(location) for location in edges[game_map.BOTTOM_LEFT] + edges[game_map.BOTTOM_RIGHT])
+    return _SPAWN_EDGE
+
 def is_stationary(unit_type):
     """
         Args:
@@ -55,55 +71,59 @@ class GameState:
             * serialized_string (string): A string containing information about the game state at the start of this turn
 
         """
-        self.serialized_string = serialized_string
-        self.config = config
-        self.enable_warnings = True
-
-        global WALL, SUPPORT, TURRET, SCOUT, DEMOLISHER, INTERCEPTOR, REMOVE, UPGRADE, STRUCTURE_TYPES, ALL_UNITS, UNIT_TYPE_TO_INDEX
-        UNIT_TYPE_TO_INDEX = {}
-        WALL = config["unitInformation"][0]["shorthand"]
-        UNIT_TYPE_TO_INDEX[WALL] = 0
-        SUPPORT = config["unitInformation"][1]["shorthand"]
-        UNIT_TYPE_TO_INDEX[SUPPORT] = 1
-        TURRET = config["unitInformation"][2]["shorthand"]
-        UNIT_TYPE_TO_INDEX[TURRET] = 2
-        SCOUT = config["unitInformation"][3]["shorthand"]
-        UNIT_TYPE_TO_INDEX[SCOUT] = 3
-        DEMOLISHER = config["unitInformation"][4]["shorthand"]
-        UNIT_TYPE_TO_INDEX[DEMOLISHER] = 4
-        INTERCEPTOR = config["unitInformation"][5]["shorthand"]
-        UNIT_TYPE_TO_INDEX[INTERCEPTOR] = 5
-        REMOVE = config["unitInformation"][6]["shorthand"]
-        UNIT_TYPE_TO_INDEX[REMOVE] = 6
-        UPGRADE = config["unitInformation"][7]["shorthand"]
-        UNIT_TYPE_TO_INDEX[UPGRADE] = 7
-
-        ALL_UNITS = [SCOUT, DEMOLISHER, INTERCEPTOR, WALL, SUPPORT, TURRET]
-        STRUCTURE_TYPES = [WALL, SUPPORT, TURRET]
-
-        self.ARENA_SIZE = 28
-        self.HALF_ARENA = int(self.ARENA_SIZE / 2)
-        self.MP = 1
-        self.SP = 0
-        global MP, SP
-        MP = self.MP
-        SP = self.SP
-
-        self.game_map = GameMap(self.config)
-        self._shortest_path_finder = ShortestPathFinder()
-        self._build_stack = []
-        self._deploy_stack = []
-        self._player_resources = [
-                {'SP': 0, 'MP': 0},  # player 0, which is you
-                {'SP': 0, 'MP': 0}]  # player 1, which is the opponent
-        self.__parse_state(serialized_string)
+        with latency.phase("game_state"):
+            self.serialized_string = serialized_string
+            self.config = config
+            self.enable_warnings = True
+
+            global WALL, SUPPORT, TURRET, SCOUT, DEMOLISHER, INTERCEPTOR, REMOVE, UPGRADE, STRUCTURE_TYPES, ALL_UNITS, UNIT_TYPE_TO_INDEX
+            UNIT_TYPE_TO_INDEX = {}
+            WALL = config["unitInformation"][0]["shorthand"]
+            UNIT_TYPE_TO_INDEX[WALL] = 0
+            SUPPORT = config["unitInformation"][1]["shorthand"]
+            UNIT_TYPE_TO_INDEX[SUPPORT] = 1
+            TURRET = config["unitInformation"][2]["shorthand"]
+            UNIT_TYPE_TO_INDEX[TURRET] = 2
+            SCOUT = config["unitInformation"][3]["shorthand"]
+            UNIT_TYPE_TO_INDEX[SCOUT] = 3
+            DEMOLISHER = config["unitInformation"][4]["shorthand"]
+            UNIT_TYPE_TO_INDEX[DEMOLISHER] = 4
+            INTERCEPTOR = config["unitInformation"][5]["shorthand"]
+            UNIT_TYPE_TO_INDEX[INTERCEPTOR] = 5
+            REMOVE = config["unitInformation"][6]["shorthand"]
+            UNIT_TYPE_TO_INDEX[REMOVE] = 6
+            UPGRADE = config["unitInformation"][7]["shorthand"]
+            UNIT_TYPE_TO_INDEX[UPGRADE] = 7
+
+            ALL_UNITS = [SCOUT, DEMOLISHER, INTERCEPTOR, WALL, SUPPORT, TURRET]
+            STRUCTURE_TYPES = [WALL, SUPPORT, TURRET]
+            self._unit_costs = {unit_type: (unit_def.get('cost1', 0), unit_def.get('cost2', 0))
+                                for unit_type, unit_def in zip(UNIT_TYPE_TO_INDEX, config["unitInformation"])}
+
+            self.ARENA_SIZE = 28
+            self.HALF_ARENA = int(self.ARENA_SIZE / 2)
+            self.MP = 1
+            self.SP = 0
+            global MP, SP
+            MP = self.MP
+            SP = self.SP
+
+            self.game_map = GameMap(self.config)
+            self._shortest_path_finder = ShortestPathFinder()
+            self._max_attack_range = None
+            self._build_stack = []
+            self._deploy_stack = []
+            self._counted_deploys = False
+            self.ledger = ResourceLedger()
+            self.__parse_state(serialized_string)
 
     def __parse_state(self, state_line):
         """
         Fills in map based on the serialized game state so that self.game_map[x,y] is a list of GameUnits at that location.
         state_line is the game state as a json string.
         """
-        state = json.loads(state_line)
+        with latency.phase("decode"):
+            state = json.loads(state_line)
 
         turn_info = state["turnInfo"]
         self.turn_number = int(turn_info[1])
@@ -116,9 +136,7 @@ class GameState:
         self.enemy_health = p2_health
         self.enemy_time = p2_time
 
-        self._player_resources = [
-            {'SP': p1_SP, 'MP': p1_MP},
-            {'SP': p2_SP, 'MP': p2_MP}]
+        self.ledger = ResourceLedger((p1_SP, p1_MP), (p2_SP, p2_MP))
 
         p1units = state["p1Units"]
         p2units = state["p2Units"]
@@ -140,31 +158,15 @@ class GameState:
                 # This depends on RM and UP always being the last types to be processed
                 if unit_type == REMOVE:
                     # Quick fix will deploy engine fix soon
-                    if self.contains_stationary_unit([x,y]):
-                        self.game_map[x,y][0].pending_removal = True
+                    self.game_map.set_pending_removal([x,y])
                 elif unit_type == UPGRADE:
-                    if self.contains_stationary_unit([x,y]):
-                        self.game_map[x,y][0].upgrade()
+                    self.game_map.upgrade_unit([x,y])
                 else:
-                    unit = GameUnit(unit_type, self.config, player_number, hp, x, y)
-                    self.game_map[x,y].append(unit)
+                    self.game_map.add_unit(unit_type, [x,y], player_number, hp)
 
     def __resource_required(self, unit_type):
         return self.SP if is_stationary(unit_type) else self.MP
 
-    def __set_resource(self, resource_type, amount, player_index=0):
-        """
-        Sets the resources for the given player_index and resource_type.
-        Is automatically called by other provided functions.
-        Adds the value amount to the current held resources
-        """
-        if resource_type == self.MP:
-            resource_key = 'MP'
-        elif resource_type == self.SP:
-            resource_key = 'SP'
-        held_resource = self.get_resource(resource_type, player_index)
-        self._player_resources[player_index][resource_key] = held_resource + amount
-
     def _invalid_player_index(self, index):
         self.warn("Invalid player index {} passed, player index should always be 0 (yourself) or 1 (your opponent)".format(index))
     
@@ -175,10 +177,25 @@ class GameState:
         """Submit and end your turn.
             Must be called at the end of your turn or the algo will hang.
         """
-        build_string = json.dumps(self._build_stack)
-        deploy_string = json.dumps(self._deploy_stack)
-        send_command(build_string)
-        send_command(deploy_string)
+        with latency.phase("submit_turn"):
+            build_string = json.dumps(self._build_stack)
+            deploy_string = self.__serialize_deploys()
+            send_commands(build_string, deploy_string)
+
+    def __serialize_deploys(self):
+        """
+        The deploy stack as the json list the engine expects. Counted (type, x, y, count) entries from
+        attempt_spawn_bulk are expanded into count identical [type, x, y] entries, each serialized once.
+        """
+        if not self._counted_deploys:
+            return json.dumps(self._deploy_stack)
+        parts = []
+        for entry in self._deploy_stack:
+            if len(entry) == 4:
+                parts.extend([json.dumps(entry[:3])] * entry[3])
+            else:
+                parts.append(json.dumps(entry))
+        return "[" + ", ".join(parts) + "]"
 
     def get_resource(self, resource_type, player_index = 0):
         """Gets a players resources
@@ -191,19 +208,12 @@ class GameState:
             The number of the given resource the given player controls
 
         """
+        if player_index in (0, 1) and resource_type in (0, 1):
+            return self.ledger.get(resource_type, player_index)
         if not player_index == 1 and not player_index == 0:
             self._invalid_player_index(player_index)
             return
-        if not resource_type == self.MP and not resource_type == self.SP:
-            self.warn("Invalid resource_type '{}'. Please use MP (0) or SP (1)".format(resource_type))
-            return
-
-        if resource_type == self.MP:
-            resource_key = 'MP'
-        elif resource_type == self.SP:
-            resource_key = 'SP'
-        resources = self._player_resources[player_index]
-        return resources.get(resource_key, None)
+        self.warn("Invalid resource_type '{}'. Please use MP (0) or SP (1)".format(resource_type))
 
     def get_resources(self, player_index = 0):
         """Gets a players resources as a list
@@ -215,14 +225,25 @@ class GameState:
             [Float, Float] list where the first entry is SP the second is MP
 
         """
-        if not player_index == 1 and not player_index == 0:
-            self._invalid_player_index(player_index)
-            return
+        if player_index in (0, 1):
+            return self.ledger.get_both(player_index)
+        self._invalid_player_index(player_index)
 
-        resource_key1 = 'SP'
-        resource_key2 = 'MP'
-        resources = self._player_resources[player_index]
-        return [resources.get(resource_key1, None), resources.get(resource_key2, None)]
+    def reserve(self, label, unit_types, upgrade=False):
+        """Sets aside the resources for a whole build plan, so nothing else spends them.
+        Spend them by building inside a `with game_state.ledger.spending(label):` block,
+        which also logs what the plan actually cost, see ResourceLedger.
+
+        Args:
+            label: A name for the plan
+            unit_types: The type of every unit in the plan, repeated for each unit
+            upgrade: If True, reserve the cost of upgrading the units instead
+
+        Returns:
+            True if the plan is affordable and was reserved
+
+        """
+        return self.ledger.reserve(label, [self.type_cost(unit_type, upgrade) for unit_type in unit_types])
 
     def number_affordable(self, unit_type):
         """The number of units of a given type we can afford
@@ -238,8 +259,8 @@ class GameState:
             self._invalid_unit(unit_type)
             return
 
-        costs = self.type_cost(unit_type)
-        player_held = self.get_resources()
+        costs = self._unit_costs[unit_type]
+        player_held = [self.ledger.available(SP), self.ledger.available(MP)]
         if costs[MP] > 0 and costs[SP] > 0:
             return min(math.floor(player_held[SP] / costs[SP]), math.floor(player_held[MP] / costs[MP]))
         elif costs[MP] > 0:
@@ -271,16 +292,22 @@ class GameState:
             self.warn("Invalid current MP ({}). Current MP cannot be negative.".format(current_MP))
 
         MP = self.get_resource(self.MP, player_index) if not current_MP else current_MP
-        for increment in range(1, turns_in_future + 1):
-            current_turn = self.turn_number + increment
-            MP *= (1 - self.config["resources"]["bitDecayPerRound"])
-            MP_per_round = self.config["resources"]["bitsPerRound"]
-            MP_ramp_ups = current_turn // self.config["resources"]["turnIntervalForBitSchedule"]
-            MP_per_round_growth = self.config["resources"]["bitGrowthRate"]
-            MP_gained = MP_per_round + (MP_per_round_growth * MP_ramp_ups)
-            MP += MP_gained
-            MP = round(MP, 1)
-        return MP
+        return mp_schedule(self.config).project(MP, self.turn_number, turns_in_future)
+
+    def project_future_MP_many(self, horizons, player_index=0, current_MP=None):
+        """Predicts the MP we will have on several future turns at once, see project_future_MP
+
+        Args:
+            horizons: A list of numbers of turns in the future, such as [1, 2, 5]
+            player_index: The player whose MP we are tracking
+            current_MP: If we pass a value here, we will use that value instead of the current MP of the given player.
+
+        Returns:
+            A list with the number of MP the given player will have after each number of turns
+
+        """
+        MP = self.get_resource(self.MP, player_index) if not current_MP else current_MP
+        return mp_schedule(self.config).project_many(MP, self.turn_number, horizons)
 
     def type_cost(self, unit_type, upgrade=False):
         """Gets the cost of a unit based on its type
@@ -296,9 +323,9 @@ class GameState:
             self._invalid_unit(unit_type)
             return
         
-        unit_def = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[unit_type]]
-        cost_base = [unit_def.get('cost1', 0), unit_def.get('cost2', 0)]
+        cost_base = list(self._unit_costs[unit_type])
         if upgrade:
+            unit_def = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[unit_type]]
             return [unit_def.get('upgrade', {}).get('cost1', cost_base[SP]), unit_def.get('upgrade', {}).get('cost2', cost_base[MP])]
 
         return cost_base
@@ -330,12 +357,16 @@ class GameState:
             return False
 
         affordable = self.number_affordable(unit_type) >= num
-        stationary = is_stationary(unit_type)
-        blocked = self.contains_stationary_unit(location) or (stationary and len(self.game_map[location[0],location[1]]) > 0)
+        stationary = unit_type in STRUCTURE_TYPES
+        units = self.game_map[location[0], location[1]]
+        blocked = (stationary and len(units) > 0) or any(unit.stationary for unit in units)
         correct_territory = location[1] < self.HALF_ARENA
-        on_edge = location in (self.game_map.get_edge_locations(self.game_map.BOTTOM_LEFT) + self.game_map.get_edge_locations(self.game_map.BOTTOM_RIGHT))
+        on_edge = stationary or (location[0], location[1]) in _spawn_edge(self.game_map)
+        can_spawn = (affordable and correct_territory and not blocked and
+                     on_edge and (not stationary or num == 1))
 
-        if self.enable_warnings:
+        # Reasons are only put together when they will be printed
+        if not can_spawn and self.enable_warnings:
             fail_reason = ""
             if not affordable:
                 fail_reason = fail_reason + " Not enough resources."
@@ -343,14 +374,12 @@ class GameState:
                 fail_reason = fail_reason + " Location is blocked."
             if not correct_territory:
                 fail_reason = fail_reason + " Location in enemy territory."
-            if not (stationary or on_edge):
+            if not on_edge:
                 fail_reason = fail_reason + " Information units must be deployed on the edge."
             if len(fail_reason) > 0:
                 self.warn("Could not spawn {} at location {}.{}".format(unit_type, location, fail_reason))
 
-        return (affordable and correct_territory and not blocked and
-                (stationary or on_edge) and
-                (not stationary or num == 1))
+        return can_spawn
 
     def attempt_spawn(self, unit_type, locations, num=1):
         """Attempts to spawn new units with the type given in the given locations.
@@ -370,25 +399,70 @@ class GameState:
         if num < 1 or not locations:
             self.warn("Attempted to spawn fewer than one units! ({})".format(num))
             return
-      
+
         if type(locations[0]) == int:
             locations = [locations]
+        stationary = unit_type in STRUCTURE_TYPES
+        costs = self._unit_costs[unit_type]
+        stack = self._build_stack if stationary else self._deploy_stack
         spawned_units = 0
         for location in locations:
-            for i in range(num):
-                if self.can_spawn(unit_type, location, 1):
-                    x, y = map(int, location)
-                    costs = self.type_cost(unit_type)
-                    self.__set_resource(SP, 0 - costs[SP])
-                    self.__set_resource(MP, 0 - costs[MP])
-                    self.game_map.add_unit(unit_type, location, 0)
-                    if is_stationary(unit_type):
-                        self._build_stack.append((unit_type, x, y))
-                    else:
-                        self._deploy_stack.append((unit_type, x, y))
-                    spawned_units += 1
-                else:
-                    break
+            if not self.can_spawn(unit_type, location, 1):
+                continue
+            x, y = map(int, location)
+            # After the first unit only affordability can change, and a structure blocks its own location
+            count = 1 if stationary else min(num, self.number_affordable(unit_type))
+            self.ledger.debit(costs, count)
+            self.game_map.add_unit(unit_type, location, 0, count=count)
+            stack.extend([(unit_type, x, y)] * count)
+            spawned_units += count
+            if count < num and self.enable_warnings:
+                # Explains why no more units could be spawned here
+                self.can_spawn(unit_type, location, 1)
+        return spawned_units
+
+    def attempt_spawn_bulk(self, unit_type, locations, num=1, update_map=True):
+        """Attempts to spawn as many as num mobile units at each of the given locations, like attempt_spawn,
+        but checks each location once and works out how many units are affordable in one step.
+        Each batch is a single entry of the deploy stack until the turn is submitted,
+        so spawning thousands of units costs about as much as spawning one. Structures are passed on to attempt_spawn.
+
+        Args:
+            unit_type: The type of unit we want to spawn
+            locations: A single location or list of locations to spawn units at
+            num: The number of units of unit_type to deploy at each location
+            update_map: If False, the units are not added to game_map, which skips creating a GameUnit per unit
+
+        Returns:
+            The number of units successfully spawned
+
+        """
+        if unit_type not in ALL_UNITS:
+            self._invalid_unit(unit_type)
+            return
+        if unit_type in STRUCTURE_TYPES:
+            return self.attempt_spawn(unit_type, locations, num)
+        if num < 1 or not locations:
+            self.warn("Attempted to spawn fewer than one units! ({})".format(num))
+            return
+
+        if type(locations[0]) == int:
+            locations = [locations]
+        costs = self._unit_costs[unit_type]
+        spawned_units = 0
+        for location in locations:
+            if not self.can_spawn(unit_type, location, 1):
+                continue
+            x, y = map(int, location)
+            count = min(num, self.number_affordable(unit_type))
+            self.ledger.debit(costs, count)
+            if update_map:
+                self.game_map.add_unit(unit_type, location, 0, count=count)
+            self._deploy_stack.append((unit_type, x, y, count))
+            self._counted_deploys = True
+            spawned_units += count
+            if count < num and self.enable_warnings:
+                self.can_spawn(unit_type, location, 1)
         return spawned_units
 
     def attempt_remove(self, locations):
@@ -441,11 +515,9 @@ class GameState:
 
                 if not existing_unit.upgraded and self.config["unitInformation"][UNIT_TYPE_TO_INDEX[existing_unit.unit_type]].get("upgrade", None) is not None:
                     costs = self.type_cost(existing_unit.unit_type, True)
-                    resources = self.get_resources()
-                    if resources[SP] >= costs[SP] and resources[MP] >= costs[MP]:
-                        self.__set_resource(SP, 0 - costs[SP])
-                        self.__set_resource(MP, 0 - costs[MP])
-                        existing_unit.upgrade()
+                    if self.ledger.can_afford(costs):
+                        self.ledger.debit(costs)
+                        self.game_map.upgrade_unit([x, y])
                         self._build_stack.append((UPGRADE, x, y))
                         spawned_units += 1
             else:
@@ -542,6 +614,9 @@ class GameState:
         Their targeting priority is as follows:
             Infantry > Nearest Unit > Lowest Health > Lowest Y position > Closest to edge (Highest distance of X from the boards center, 13.5)
 
+        Each call scans every location in range. If you need targets for many units, for example in a simulation,
+        targeting.TargetingEngine gives the same results much faster.
+
         Args:
             attacking_unit: A GameUnit
 
@@ -624,6 +699,9 @@ class GameState:
         Returns:
             A list of units that would attack a unit controlled by the given player at the given location
 
+        The answer is looked up in the game map's coverage map, which is kept up to date as long as
+        units are changed through GameMap functions, see GameMap.get_coverage_map.
+
         """
 
         if not player_index == 0 and not player_index == 1:
@@ -631,15 +709,17 @@ class GameState:
         if not self.game_map.in_arena_bounds(location):
             self.warn("Location {} is not in the arena bounds.".format(location))
 
+        coverage = self.game_map.get_coverage_map()
+        if coverage.covers(location):
+            return coverage.get_attackers(location, player_index)
+
+        # Locations outside the grid fall back to searching around the location
         attackers = []
-        """
-        Get locations in the range of TURRET units
-        """
-        max_range = 0
-        for unit in self.config["unitInformation"]:
-            if unit.get('attackRange', 0) >= max_range:
-                max_range = unit.get('attackRange', 0)
-        possible_locations= self.game_map.get_locations_in_range(location, max_range)
+        if self._max_attack_range is None:
+            self._max_attack_range = 0
+            for unit in self.config["unitInformation"]:
+                self._max_attack_range = max(self._max_attack_range, unit.get('attackRange', 0), unit.get('upgrade', {}).get('attackRange', 0))
+        possible_locations= self.game_map.get_locations_in_range(location, self._max_attack_range)
         for location_unit in possible_locations:
             for unit in self.game_map[location_unit]:
                 if unit.damage_i + unit.damage_f > 0 and unit.player_index != player_index and self.game_map.distance_between_locations(location, location_unit) <= unit.attackRange:
@@ -0,0 +1,157 @@
+"""
+Call counts and cumulative time of gamelib functions.
+
+An Instrumentation registry replaces functions such as GameState.find_path_to_edge with wrappers
+that count calls and time them, and puts the originals back when disabled, so nothing is added to
+the calls of an algo that does not enable it. Times are inclusive: a wrapped function calling
+another wrapped function counts that call in both. AlgoCore.enable_instrumentation turns it on.
+"""
+import functools
+import time
+
+from .game_map import GameMap
+from .game_state import GameState
+
+# (owner, attribute) of the functions wrapped by default
+DEFAULT_FUNCTIONS = (
+    (GameState, "find_path_to_edge"),
+    (GameState, "get_attackers"),
+    (GameMap, "get_locations_in_range"),
+    (GameState, "contains_stationary_unit"),
+    (GameState, "can_spawn"),
+)
+
+_active = None
+
+
+def timed(func):
+    """Decorator counting calls to one of your own functions in the enabled registry, see Instrumentation.
+    While no registry is enabled it only adds a check per call.
+    """
+    name = func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _active is None:
+            return func(*args, **kwargs)
+        return _active.call(name, func, args, kwargs)
+    return wrapper
+
+
+class Instrumentation:
+    """Counts calls to and time spent in a set of functions, per turn
+
+    Attributes :
+        * counters (dict): For the current turn, maps function names to [calls, seconds]
+        * turns (list): (turn_number, counters) for each finished turn
+
+    """
+    def __init__(self, functions=DEFAULT_FUNCTIONS):
+        """
+        Args:
+            functions: (class or module, attribute name) pairs of the functions to wrap when enabled
+        """
+        self.counters = {}
+        self.turns = []
+        self.__functions = list(functions)
+        self.__originals = []
+        self.__turn_number = None
+
+    @property
+    def enabled(self):
+        return _active is self
+
+    def add(self, owner, attribute):
+        """Adds a function to wrap. If the registry is enabled it is wrapped immediately.
+        """
+        self.__functions.append((owner, attribute))
+        if self.enabled:
+            self.__wrap(owner, attribute)
+
+    def __wrap(self, owner, attribute):
+        original = owner.__dict__[attribute]
+        name = "{}.{}".format(getattr(owner, "__name__", owner), attribute)
+        call = self.call
+
+        @functools.wraps(original)
+        def wrapper(*args, **kwargs):
+            return call(name, original, args, kwargs)
+        self.__originals.append((owner, attribute, original))
+        setattr(owner, attribute, wrapper)
+
+    def enable(self):
+        """Wraps the functions and starts counting. Only one registry can be enabled at a time.
+        """
+        global _active
+        if self.enabled:
+            return
+        if _active is not None:
+            _active.disable()
+        for owner, attribute in self.__functions:
+            self.__wrap(owner, attribute)
+        _active = self
+
+    def disable(self):
+        """Puts the original functions back. Counts are kept.
+        """
+        global _active
+        for owner, attribute, original in reversed(self.__originals):
+            setattr(owner, attribute, original)
+        self.__originals = []
+        if _active is self:
+            _active = None
+
+    def call(self, name, func, args, kwargs):
+        """Calls func(*args, **kwargs) and adds the call to the counters of name
+        """
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            counter = self.counters.get(name)
+            if counter is None:
+                self.counters[name] = [1, seconds]
+            else:
+                counter[0] += 1
+                counter[1] += seconds
+
+    def next_turn(self, turn_number):
+        """Stores the counters of the current turn and starts counting from zero
+        """
+        self.finish_turn()
+        self.__turn_number = turn_number
+
+    def finish_turn(self):
+        """Stores the counters of the current turn, if anything was counted
+        """
+        if self.counters:
+            self.turns.append((self.__turn_number, self.counters))
+        self.counters = {}
+
+    def top(self, count=5):
+        """The functions with the most total time over the game, including the current turn
+
+        Returns:
+            A list of (name, calls, seconds, most calls in one turn, turn with the most calls), most time first
+
+        """
+        totals = {}
+        for turn_number, counters in self.turns + [(self.__turn_number, self.counters)]:
+            for name, (calls, seconds) in counters.items():
+                total = totals.setdefault(name, [0, 0.0, 0, turn_number])
+                total[0] += calls
+                total[1] += seconds
+                if calls > total[2]:
+                    total[2], total[3] = calls, turn_number
+        ranked = sorted(totals.items(), key=lambda item: item[1][1], reverse=True)
+        return [(name, calls, seconds, peak, peak_turn) for name, (calls, seconds, peak, peak_turn) in ranked[:count]]
+
+    def summary(self, count=5):
+        """A few lines describing the functions that took the most time
+        """
+        lines = ["Most expensive gamelib calls over {} turns:".format(len(self.turns) + (1 if self.counters else 0))]
+        for name, calls, seconds, peak, peak_turn in self.top(count):
+            lines.append("  {:<40} {:8} calls {:9.3f}s {:9.1f}us/call, at most {} calls (turn {})".format(
+                name, calls, seconds, seconds * 1e6 / calls, peak, peak_turn))
+        return "\n".join(lines)
@@ -0,0 +1,197 @@
+"""
+Per-phase latency instrumentation.
+
+A LatencyTracker splits the time an algo spends into phases: reading messages, decoding them,
+building GameStates, running the strategy, submitting the turn and handling action frames.
+Phases can nest, and each phase only counts the time not spent in the phases inside it, so the
+phases of a turn add up to its total. AlgoCore.enable_latency_tracking turns it on.
+"""
+import bisect
+import contextlib
+import json
+import threading
+import time
+
+from .util import debug_write
+
+PHASES = ("read", "decode", "game_state", "strategy", "submit_turn", "action_frame")
+
+# Upper bounds of the histogram buckets, in milliseconds of one phase during one turn
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000)
+
+_tracker = None
+_no_phase = contextlib.nullcontext()
+
+
+def active_tracker():
+    """The tracker phases are currently recorded to, or None
+    """
+    return _tracker
+
+
+def activate(tracker):
+    """Makes a tracker the one phase, begin and end record to. Pass None to stop recording.
+    """
+    global _tracker
+    _tracker = tracker
+
+
+def phase(name):
+    """A context manager recording its body as the given phase, if a tracker is active
+    """
+    if _tracker is None:
+        return _no_phase
+    return _tracker.phase(name)
+
+
+def begin(name):
+    """Starts a phase on the active tracker, for code that can't be wrapped in a with block. See end.
+    """
+    if _tracker is not None:
+        _tracker.begin(name)
+
+
+def end():
+    """Ends the phase most recently started with begin
+    """
+    if _tracker is not None:
+        _tracker.end()
+
+
+class LatencyTracker:
+    """Records wall and CPU time per phase, per turn
+
+    A turn covers the turn message and everything until the next turn message, so the action frames
+    of a turn are counted with it. Time before the first turn, such as reading the config, is only
+    written to the trace, with a turn of null. Only the thread that created the tracker is recorded.
+
+    Attributes :
+        * turns (list): One dict per finished turn, mapping phase names to [wall, cpu, calls], with times in seconds
+        * trace_path (string): The JSONL file every finished turn is appended to, or None
+
+    """
+    def __init__(self, trace_path=None):
+        """
+        Args:
+            trace_path: If given, each finished turn is written to this file as a line of JSON
+        """
+        self.turns = []
+        self.trace_path = trace_path
+        self.__trace = open(trace_path, "w") if trace_path else None
+        self.__thread = threading.get_ident()
+        self.__turn_number = None
+        self.__current = {}
+        self.__stack = []
+
+    def begin(self, name):
+        """Starts timing a phase. Time spent in phases started before it ends is not counted towards it.
+        """
+        if threading.get_ident() != self.__thread:
+            return
+        self.__stack.append([name, time.perf_counter(), time.thread_time(), 0.0, 0.0])
+
+    def end(self):
+        """Stops timing the innermost phase and records it
+        """
+        if threading.get_ident() != self.__thread or not self.__stack:
+            return
+        name, wall_start, cpu_start, child_wall, child_cpu = self.__stack.pop()
+        wall = time.perf_counter() - wall_start
+        cpu = time.thread_time() - cpu_start
+        self.record(name, wall - child_wall, cpu - child_cpu)
+        if self.__stack:
+            self.__stack[-1][3] += wall
+            self.__stack[-1][4] += cpu
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Times the body of a with block as a phase
+        """
+        depth = len(self.__stack)
+        self.begin(name)
+        try:
+            yield
+        finally:
+            # Phases begun inside the block and never ended are closed with it
+            while len(self.__stack) > depth:
+                self.end()
+
+    def record(self, name, wall, cpu):
+        """Adds time to a phase of the current turn
+
+        Args:
+            name: The phase
+            wall: Wall time in seconds
+            cpu: CPU time of the recording thread in seconds
+
+        """
+        entry = self.__current.get(name)
+        if entry is None:
+            self.__current[name] = [wall, cpu, 1]
+        else:
+            entry[0] += wall
+            entry[1] += cpu
+            entry[2] += 1
+
+    def start_turn(self, turn_number):
+        """Finishes the current turn and starts recording a new one
+        """
+        self.finish_turn()
+        self.__turn_number = turn_number
+
+    def finish_turn(self):
+        """Stores the current turn and writes it to the trace file. Does nothing if nothing was recorded.
+        """
+        if not self.__current:
+            return
+        if self.__turn_number is not None:
+            self.turns.append(self.__current)
+        if self.__trace is not None:
+            phases = {name: {"wall": wall, "cpu": cpu, "calls": calls} for name, (wall, cpu, calls) in self.__current.items()}
+            self.__trace.write(json.dumps({"turn": self.__turn_number, "phases": phases}) + "\n")
+            self.__trace.flush()
+        self.__current = {}
+
+    def histogram(self, name):
+        """Counts the turns by how long the phase took during them
+
+        Returns:
+            A list with one count per bucket of BUCKETS_MS, plus one for longer turns
+
+        """
+        counts = [0] * (len(BUCKETS_MS) + 1)
+        for turn in self.turns:
+            if name in turn:
+                counts[bisect.bisect_left(BUCKETS_MS, turn[name][0] * 1000)] += 1
+        return counts
+
+    def summary(self):
+        """A few lines of per-phase statistics over the finished turns, in milliseconds per turn
+        """
+        lines = ["Latency over {} turns, ms per turn (wall mean/p50/p95/max, cpu mean, histogram):".format(len(self.turns))]
+        names = list(PHASES) + sorted({name for turn in self.turns for name in turn} - set(PHASES))
+        for name in names:
+            walls = sorted(turn[name][0] * 1000 for turn in self.turns if name in turn)
+            if not walls:
+                continue
+            cpu = sum(turn[name][1] for turn in self.turns if name in turn) * 1000 / len(walls)
+            percentile = lambda p: walls[min(len(walls) - 1, int(p * len(walls)))]
+            bounds = ["<{}".format(bound) for bound in BUCKETS_MS] + [">={}".format(BUCKETS_MS[-1])]
+            histogram = " ".join("{}:{}".format(bound, n) for bound, n in zip(bounds, self.histogram(name)) if n)
+            lines.append("  {:<12} {:8.1f} {:8.1f} {:8.1f} {:8.1f}  cpu {:8.1f}  {}".format(
+                name, sum(walls) / len(walls), percentile(0.5), percentile(0.95), walls[-1], cpu, histogram))
+        return "\n".join(lines)
+
+    def close(self):
+        """Finishes the current turn and closes the trace file
+        """
+        self.finish_turn()
+        if self.__trace is not None:
+            self.__trace.close()
+            self.__trace = None
+
+    def report(self):
+        """Closes the tracker and writes the summary with debug_write
+        """
+        self.close()
+        debug_write(self.summary())
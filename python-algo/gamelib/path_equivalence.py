@@ -0,0 +1,409 @@
+"""
+Differential testing for alternative pathfinders.
+
+Any pathfinder that replaces ShortestPathFinder has to reproduce the engine's
+tie-breaking exactly, so this module runs the reference implementation next to
+a candidate on randomized and replay-derived boards, and shrinks any board where
+the two disagree down to a small counterexample.
+
+It can also be run from the command line:
+
+    python3 -m gamelib.path_equivalence my_module:FastPathFinder --config ../game-configs.json --random 200
+    python3 -m gamelib.path_equivalence my_module:FastPathFinder --replay replays/some-game.replay
+
+"""
+import argparse
+import importlib
+import json
+import random
+import sys
+
+from .game_map import GameMap
+from .game_state import GameState
+from .navigation import ShortestPathFinder
+from .util import debug_write
+
+
+_EMPTY_TURN = """{"p2Units":[[],[],[],[],[],[],[],[]],"turnInfo":[0,0,-1],"p1Stats":[30.0,25.0,5.0,0],"p1Units":[[],[],[],[],[],[],[],[]],"p2Stats":[30.0,25.0,5.0,0],"events":{"selfDestruct":[],"breach":[],"damage":[],"shield":[],"move":[],"spawn":[],"death":[],"attack":[],"melee":[]}}"""
+
+
+class PathCase:
+    """A single pathing problem
+
+    Attributes :
+        * blocked (list): Sorted (x, y) tuples of the locations holding a structure
+        * start (tuple): The (x, y) location the unit starts from
+        * target_edge (int): The edge the unit wants to reach, or None to induce it from start like the engine does
+        * source (string): Where the case came from, for reporting
+        * expected (list): The golden path recorded for this case, or None if it has to be computed with the reference
+
+    """
+    def __init__(self, blocked, start, target_edge=None, source="random", expected=None):
+        self.blocked = sorted(set(tuple(location) for location in blocked))
+        self.start = tuple(start)
+        self.target_edge = target_edge
+        self.source = source
+        self.expected = expected
+
+    def to_dict(self):
+        return {"blocked": [list(location) for location in self.blocked], "start": list(self.start),
+                "target_edge": self.target_edge, "source": self.source, "expected": self.expected}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["blocked"], data["start"], data.get("target_edge"), data.get("source", "corpus"), data.get("expected"))
+
+    def __repr__(self):
+        return "PathCase(start={}, target_edge={}, {} structures, source={})".format(
+            list(self.start), self.target_edge, len(self.blocked), self.source)
+
+
+class Counterexample:
+    """A case where the candidate disagreed with the reference
+
+    Attributes :
+        * case (PathCase): The original case
+        * minimized (PathCase): The smallest layout found that still shows the disagreement
+        * reference_path (list): The reference path on the minimized case
+        * candidate_path: The candidate's path on the minimized case, or the exception it raised
+
+    """
+    def __init__(self, case, minimized, reference_path, candidate_path):
+        self.case = case
+        self.minimized = minimized
+        self.reference_path = reference_path
+        self.candidate_path = candidate_path
+
+    def __repr__(self):
+        return "Counterexample({}, blocked={}, reference={}, candidate={})".format(
+            self.minimized, [list(location) for location in self.minimized.blocked], self.reference_path, self.candidate_path)
+
+
+def build_state(config, blocked):
+    """Creates a GameState holding walls at the given locations and nothing else
+
+    Args:
+        config: The game config
+        blocked: A list of locations to fill with structures
+
+    Returns:
+        A GameState with warnings suppressed
+
+    """
+    state = GameState(config, _EMPTY_TURN)
+    state.suppress_warnings(True)
+    wall = config["unitInformation"][0]["shorthand"]
+    for location in blocked:
+        state.game_map.add_unit(wall, list(location))
+    return state
+
+
+def find_path(finder, config, case):
+    """Runs a pathfinder on a case through GameState.find_path_to_edge
+
+    Args:
+        finder: An object with the same navigate_multiple_endpoints interface as ShortestPathFinder
+        config: The game config
+        case: The PathCase to solve
+
+    Returns:
+        The path the finder produced
+
+    """
+    state = build_state(config, case.blocked)
+    state._shortest_path_finder = finder
+    return state.find_path_to_edge(list(case.start), case.target_edge)
+
+
+def _candidate_path(finder, config, case):
+    try:
+        return find_path(finder, config, case)
+    except Exception as e:
+        return e
+
+
+def _differs(config, case, candidate, reference):
+    return find_path(reference, config, case) != _candidate_path(candidate, config, case)
+
+
+def minimize(config, case, candidate, reference=None):
+    """Shrinks the layout of a failing case while the candidate keeps disagreeing with the reference
+
+    Structures are removed in progressively smaller chunks, so the result is a layout where
+    removing any single remaining structure makes the two pathfinders agree.
+
+    Args:
+        config: The game config
+        case: A PathCase the candidate gets wrong
+        candidate: The pathfinder under test
+        reference: The reference pathfinder, a new ShortestPathFinder if None
+
+    Returns:
+        The minimized PathCase
+
+    """
+    reference = reference or ShortestPathFinder()
+    blocked = list(case.blocked)
+    chunk = max(len(blocked) // 2, 1)
+    while blocked:
+        removed_any = False
+        i = 0
+        while i < len(blocked):
+            trial = PathCase(blocked[:i] + blocked[i + chunk:], case.start, case.target_edge, case.source)
+            if _differs(config, trial, candidate, reference):
+                blocked = trial.blocked
+                removed_any = True
+            else:
+                i += chunk
+        if chunk == 1 and not removed_any:
+            break
+        chunk = max(chunk // 2, 1)
+    return PathCase(blocked, case.start, case.target_edge, case.source)
+
+
+def run_differential(config, candidate, cases, reference=None, minimize_failures=True):
+    """Runs the candidate next to the reference on every case
+
+    Cases with an expected (golden) path are compared against it directly. Everything else
+    is compared against the reference pathfinder.
+
+    Args:
+        config: The game config
+        candidate: The pathfinder under test
+        cases: An iterable of PathCase objects
+        reference: The reference pathfinder, a new ShortestPathFinder if None
+        minimize_failures: If true, shrink each failing case before reporting it
+
+    Returns:
+        A list of Counterexample objects, empty if the candidate agreed everywhere
+
+    """
+    reference = reference or ShortestPathFinder()
+    failures = []
+    for case in cases:
+        expected = case.expected if case.expected is not None else find_path(reference, config, case)
+        got = _candidate_path(candidate, config, case)
+        if got == expected:
+            continue
+        minimized = minimize(config, case, candidate, reference) if minimize_failures else case
+        failures.append(Counterexample(case, minimized, find_path(reference, config, minimized),
+                                       _candidate_path(candidate, config, minimized)))
+    return failures
+
+
+def random_cases(config, count, seed=None, density=0.25):
+    """Generates random layouts with a random free start location
+
+    Half of the starts are taken from the edges, like freshly spawned units, and half from
+    anywhere on the board, like units that are partway along their path.
+
+    Args:
+        config: The game config
+        count: The number of cases to generate
+        seed: Seed for the generator, so a failing run can be reproduced
+        density: The chance that any given location holds a structure
+
+    Returns:
+        A list of PathCase objects
+
+    """
+    rng = random.Random(seed)
+    game_map = GameMap(config)
+    locations = [(x, y) for x in range(game_map.ARENA_SIZE) for y in range(game_map.ARENA_SIZE) if game_map.in_arena_bounds([x, y])]
+    edge_locations = [tuple(location) for edge in game_map.get_edges() for location in edge]
+
+    cases = []
+    while len(cases) < count:
+        blocked = set(location for location in locations if rng.random() < density)
+        starts = edge_locations if rng.random() < 0.5 else locations
+        free = [location for location in starts if location not in blocked]
+        if not free:
+            continue
+        cases.append(PathCase(blocked, rng.choice(free), source="random seed={}".format(seed)))
+    return cases
+
+
+def load_replay(path):
+    """Reads a replay file
+
+    Args:
+        path: The path to a .replay file
+
+    Returns:
+        (config, frames) where frames is the list of parsed frame dicts in file order
+
+    """
+    config = None
+    frames = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            data = json.loads(line)
+            if "turnInfo" in data:
+                frames.append(data)
+            elif config is None:
+                config = data
+    return config, frames
+
+
+def _structure_indices(config):
+    return [i for i, unit in enumerate(config["unitInformation"]) if unit.get("unitCategory") == 0]
+
+
+def _mobile_indices(config):
+    # Spawn events also record removals and upgrades, whose unit types have no category
+    return set(i for i, unit in enumerate(config["unitInformation"]) if unit.get("unitCategory") == 1)
+
+
+def _frame_blocked(config, frame):
+    blocked = []
+    for units in (frame["p1Units"], frame["p2Units"]):
+        for i in _structure_indices(config):
+            blocked.extend((int(u[0]), int(u[1])) for u in units[i])
+    return blocked
+
+
+def replay_cases(config, frames):
+    """Builds cases from the layouts of a replay, starting from the locations where units actually spawned
+
+    Args:
+        config: The game config stored in the replay
+        frames: The frames of the replay, see load_replay
+
+    Returns:
+        A list of PathCase objects
+
+    """
+    mobile = _mobile_indices(config)
+    cases = []
+    for frame in frames:
+        starts = set(tuple(spawn[0]) for spawn in frame.get("events", {}).get("spawn", []) if spawn[1] in mobile)
+        if not starts:
+            continue
+        blocked = _frame_blocked(config, frame)
+        source = "replay turn {} frame {}".format(frame["turnInfo"][1], frame["turnInfo"][2])
+        for start in sorted(starts):
+            cases.append(PathCase(blocked, start, source=source))
+    return cases
+
+
+def check_replay_movement(config, frames, finder=None):
+    """Checks a pathfinder against the unit movement recorded in a replay
+
+    Every move event is compared against the next step of the finder's path from the unit's previous location,
+    using the structure layout of the preceding frame and the target edge of the unit's spawn location.
+    Structures that die during the same frame as the move can therefore show up as false mismatches.
+
+    Args:
+        config: The game config stored in the replay
+        frames: The frames of the replay, see load_replay
+        finder: The pathfinder to check, a new ShortestPathFinder if None
+
+    Returns:
+        A list of (turn_info, unit_id, before, after, predicted) tuples, one per move the finder did not predict
+
+    """
+    finder = finder or ShortestPathFinder()
+    mobile = _mobile_indices(config)
+    edge_state = build_state(config, [])
+    spawns = {}
+    mismatches = []
+    previous = None
+    for frame in frames:
+        events = frame.get("events", {})
+        for location, unit_type, unit_id, _ in events.get("spawn", []):
+            if unit_type in mobile:
+                spawns[unit_id] = location
+        if previous is not None and events.get("move"):
+            blocked = _frame_blocked(config, previous)
+            paths = {}
+            for before, after, _, _, unit_id, _ in events["move"]:
+                if unit_id not in spawns:
+                    continue
+                key = (tuple(before), edge_state.get_target_edge(spawns[unit_id]))
+                if key not in paths:
+                    paths[key] = _candidate_path(finder, config, PathCase(blocked, key[0], key[1], source="replay"))
+                path = paths[key]
+                predicted = path[1] if isinstance(path, list) and len(path) > 1 else None
+                if predicted != list(after):
+                    mismatches.append((frame["turnInfo"], unit_id, before, after, predicted))
+        previous = frame
+    return mismatches
+
+
+def save_corpus(path, config, cases, reference=None):
+    """Writes cases and their golden reference paths to a JSON lines file
+
+    Args:
+        path: The file to write
+        config: The game config
+        cases: The PathCase objects to record
+        reference: The reference pathfinder, a new ShortestPathFinder if None
+
+    """
+    reference = reference or ShortestPathFinder()
+    with open(path, "w") as f:
+        for case in cases:
+            golden = PathCase(case.blocked, case.start, case.target_edge, case.source, find_path(reference, config, case))
+            f.write(json.dumps(golden.to_dict()) + "\n")
+
+
+def load_corpus(path):
+    """Reads cases written by save_corpus
+
+    Args:
+        path: The file to read
+
+    Returns:
+        A list of PathCase objects with their golden paths set
+
+    """
+    with open(path) as f:
+        return [PathCase.from_dict(json.loads(line)) for line in f if line.strip()]
+
+
+def _load_candidate(spec):
+    module_name, _, class_name = spec.partition(":")
+    return getattr(importlib.import_module(module_name), class_name or "ShortestPathFinder")()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Compare a pathfinder against gamelib's ShortestPathFinder")
+    ap.add_argument("candidate", help="module:Class of the pathfinder to test")
+    ap.add_argument("--config", help="game config json, required unless --replay is given")
+    ap.add_argument("--replay", nargs="*", default=[], help="replay files to derive boards and recorded movement from")
+    ap.add_argument("--corpus", help="JSON lines corpus of golden paths written by save_corpus")
+    ap.add_argument("--random", type=int, default=0, help="number of random boards to generate")
+    ap.add_argument("--seed", type=int, default=None, help="seed for the random boards")
+    args = ap.parse_args(argv)
+
+    candidate = _load_candidate(args.candidate)
+    config = None
+    if args.config:
+        with open(args.config) as f:
+            config = json.load(f)
+
+    failures = []
+    for replay in args.replay:
+        replay_config, frames = load_replay(replay)
+        config = config or replay_config
+        failures += run_differential(replay_config, candidate, replay_cases(replay_config, frames))
+        for mismatch in check_replay_movement(replay_config, frames, candidate):
+            debug_write("Replay {} disagrees with recorded move: {}".format(replay, mismatch))
+    if config is None:
+        ap.error("--config is required without --replay")
+    if args.corpus:
+        failures += run_differential(config, candidate, load_corpus(args.corpus))
+    if args.random:
+        failures += run_differential(config, candidate, random_cases(config, args.random, args.seed))
+
+    for failure in failures:
+        debug_write(failure)
+    debug_write("{} counterexamples found".format(len(failures)))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
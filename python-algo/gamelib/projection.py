@@ -0,0 +1,108 @@
+"""
+MP projection for GameState.project_future_MP.
+
+MP decays each round, then the round's income is added and the total is rounded to one
+decimal. The rounding makes every step depend on the one before, so there is no exact
+closed form; instead MPSchedule precomputes the income of every turn once per config and
+memoizes the projected MP of each (MP, turn) pair for every horizon computed so far, so
+asking for many horizons, or the same projection again, costs one pass at most.
+"""
+
+# Projections kept per schedule before the memo is cleared
+MAX_MEMO_ENTRIES = 4096
+
+_schedules = {}
+
+
+def mp_schedule(config):
+    """The MPSchedule for a config, shared by every GameState using the same resource rules
+    """
+    resources = config["resources"]
+    key = (resources["bitDecayPerRound"], resources["bitsPerRound"], resources["bitGrowthRate"], resources["turnIntervalForBitSchedule"])
+    schedule = _schedules.get(key)
+    if schedule is None:
+        schedule = MPSchedule(config)
+        _schedules[key] = schedule
+    return schedule
+
+
+class MPSchedule:
+    """Projects MP forward with the same arithmetic, and the same rounding, as the game
+
+    Attributes :
+        * decay_factor (float): The part of a player's MP kept from one round to the next
+        * per_round (float): The MP gained each round before any growth
+        * growth (float): The extra MP per round gained every interval turns
+        * interval (int): The number of turns between increases of the income
+
+    """
+    def __init__(self, config):
+        resources = config["resources"]
+        self.decay_factor = 1 - resources["bitDecayPerRound"]
+        self.per_round = resources["bitsPerRound"]
+        self.growth = resources["bitGrowthRate"]
+        self.interval = resources["turnIntervalForBitSchedule"]
+        self.__income = []
+        self.__memo = {}
+
+    def income(self, turn_number):
+        """The MP a player gains at the start of the given turn
+        """
+        while len(self.__income) <= turn_number:
+            ramp_ups = len(self.__income) // self.interval
+            self.__income.append(self.per_round + (self.growth * ramp_ups))
+        return self.__income[turn_number]
+
+    def trajectory(self, current_MP, turn_number, turns_in_future):
+        """The MP a player will have after each of the next turns
+
+        Args:
+            current_MP: The MP the player has now
+            turn_number: The current turn
+            turns_in_future: How many turns to project
+
+        Returns:
+            A tuple with the MP after 1, 2, ... turns_in_future turns. Do not rely on it being a new object.
+
+        """
+        key = (current_MP, turn_number)
+        known = self.__memo.get(key, ())
+        if len(known) >= turns_in_future:
+            return known[:turns_in_future]
+
+        self.income(turn_number + turns_in_future)
+        income = self.__income
+        MP = known[-1] if known else current_MP
+        values = list(known)
+        for increment in range(len(known) + 1, turns_in_future + 1):
+            MP *= self.decay_factor
+            MP += income[turn_number + increment]
+            MP = round(MP, 1)
+            values.append(MP)
+        values = tuple(values)
+        if len(self.__memo) >= MAX_MEMO_ENTRIES:
+            self.__memo.clear()
+        self.__memo[key] = values
+        return values
+
+    def project(self, current_MP, turn_number, turns_in_future=1):
+        """The MP a player will have after the given number of turns. With no turns, current_MP is returned unchanged.
+        """
+        if turns_in_future < 1:
+            return current_MP
+        return self.trajectory(current_MP, turn_number, turns_in_future)[-1]
+
+    def project_many(self, current_MP, turn_number, horizons):
+        """Projects several horizons at once, in one pass up to the furthest
+
+        Args:
+            current_MP: The MP the player has now
+            turn_number: The current turn
+            horizons: A list of numbers of turns in the future
+
+        Returns:
+            A list with the projected MP for each horizon, in the same order
+
+        """
+        values = self.trajectory(current_MP, turn_number, max(horizons, default=0))
+        return [values[horizon - 1] if horizon >= 1 else current_MP for horizon in horizons]
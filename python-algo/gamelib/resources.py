@@ -0,0 +1,150 @@
+"""
+Resource bookkeeping for GameState.
+
+ResourceLedger keeps both players' SP and MP in four fixed slots, indexed by
+player_index * 2 + resource_type, so reading or spending a resource is a single list access.
+It can also reserve resources for a build plan ahead of time, and logs how much each
+labelled plan was expected to cost against what was actually spent on it.
+"""
+import contextlib
+
+# Resource types, the same values as GameState.SP and GameState.MP
+SP = 0
+MP = 1
+
+
+class SpendRecord:
+    """What a labelled plan was expected to cost, and what was spent on it
+
+    Attributes :
+        * label (string): The name of the plan
+        * planned ([float, float]): The [SP, MP] reserved for it
+        * actual ([float, float]): The [SP, MP] spent while it was the active plan
+
+    """
+    def __init__(self, label, planned):
+        self.label = label
+        self.planned = list(planned)
+        self.actual = [0, 0]
+
+    def __repr__(self):
+        return "{}: planned {:.1f} SP {:.1f} MP, spent {:.1f} SP {:.1f} MP".format(
+            self.label, self.planned[SP], self.planned[MP], self.actual[SP], self.actual[MP])
+
+
+class ResourceLedger:
+    """Both players' resources, with reservations and a spend log for player 0
+
+    Attributes :
+        * values (list): [my SP, my MP, enemy SP, enemy MP]
+        * log (list): A SpendRecord for every reservation made, in order
+
+    """
+    def __init__(self, p1_resources=(0, 0), p2_resources=(0, 0)):
+        """
+        Args:
+            p1_resources: [SP, MP] of player 0, which is you
+            p2_resources: [SP, MP] of player 1, which is the opponent
+        """
+        self.values = [p1_resources[SP], p1_resources[MP], p2_resources[SP], p2_resources[MP]]
+        self.log = []
+        self.__reserved = {}
+        self.__active = None
+        self.__active_record = None
+
+    def get(self, resource_type, player_index=0):
+        """The amount of a resource a player holds
+        """
+        return self.values[player_index * 2 + resource_type]
+
+    def get_both(self, player_index=0):
+        """A player's resources as a new [SP, MP] list
+        """
+        slot = player_index * 2
+        return self.values[slot:slot + 2]
+
+    def set(self, resource_type, amount, player_index=0):
+        """Sets the amount of a resource a player holds
+        """
+        self.values[player_index * 2 + resource_type] = amount
+
+    def add(self, resource_type, amount, player_index=0):
+        """Adds to, or with a negative amount takes from, a player's resource
+        """
+        self.values[player_index * 2 + resource_type] += amount
+
+    def available(self, resource_type):
+        """How much of one of your resources is not reserved for a plan other than the one being spent
+        """
+        held = self.values[resource_type]
+        if not self.__reserved:
+            return held
+        return held - sum(reserved[resource_type] for label, reserved in self.__reserved.items() if label != self.__active)
+
+    def can_afford(self, costs, count=1):
+        """True if count units costing [SP, MP] each fit in your available resources
+        """
+        return self.available(SP) >= costs[SP] * count and self.available(MP) >= costs[MP] * count
+
+    def debit(self, costs, count=1):
+        """Spends your resources on count units costing [SP, MP] each.
+        The spending is counted towards the active plan, see spending.
+        """
+        sp = costs[SP] * count
+        mp = costs[MP] * count
+        self.values[SP] -= sp
+        self.values[MP] -= mp
+        if self.__active is not None:
+            record = self.log[self.__active_record]
+            record.actual[SP] += sp
+            record.actual[MP] += mp
+            reserved = self.__reserved.get(self.__active)
+            if reserved is not None:
+                reserved[SP] = max(0, reserved[SP] - sp)
+                reserved[MP] = max(0, reserved[MP] - mp)
+
+    def reserve(self, label, costs):
+        """Sets aside resources for a whole plan, if they are available.
+        Reserved resources are not available to anything but spending under the same label.
+
+        Args:
+            label: A name for the plan, replacing any reservation with the same name
+            costs: A list of [SP, MP] costs, one per unit of the plan
+
+        Returns:
+            True if the plan could be reserved, False if it can't be afforded
+
+        """
+        self.release(label)
+        total = [sum(cost[SP] for cost in costs), sum(cost[MP] for cost in costs)]
+        if self.available(SP) < total[SP] or self.available(MP) < total[MP]:
+            return False
+        self.__reserved[label] = list(total)
+        self.log.append(SpendRecord(label, total))
+        return True
+
+    def release(self, label):
+        """Returns whatever is left of a reservation to the available resources
+        """
+        self.__reserved.pop(label, None)
+
+    @contextlib.contextmanager
+    def spending(self, label):
+        """Counts everything spent in the with block towards a plan, which may use its reserved resources.
+        The rest of the reservation is released at the end of the block.
+        """
+        if not any(record.label == label for record in self.log):
+            self.log.append(SpendRecord(label, (0, 0)))
+        previous = self.__active, self.__active_record
+        self.__active = label
+        self.__active_record = max(i for i, record in enumerate(self.log) if record.label == label)
+        try:
+            yield self
+        finally:
+            self.__active, self.__active_record = previous
+            self.release(label)
+
+    def report(self):
+        """One line per plan, comparing what was reserved with what was spent
+        """
+        return "\n".join(repr(record) for record in self.log)
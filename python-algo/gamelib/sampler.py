@@ -0,0 +1,96 @@
+"""
+A sampling profiler for finding slow turns.
+
+cProfile slows down every function call, so the turns it measures are not the turns that were
+slow. SamplingProfiler instead looks at the stack of the profiled thread from a background
+thread every few milliseconds, which costs the algo almost nothing. AlgoCore records every turn
+this way and keeps the samples of the turns that went over a time budget, written in the collapsed
+stack format flamegraph tools read (one "outer;inner;innermost count" line per stack).
+"""
+import collections
+import os
+import sys
+import threading
+import time
+
+
+def frame_name(code):
+    """The name of a function in collapsed stack output
+    """
+    return "{} ({}:{})".format(code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+
+
+class SamplingProfiler:
+    """Samples the stack of one thread at a fixed interval while recording
+
+    Attributes :
+        * interval (float): Seconds between samples
+        * samples (Counter): How often each stack was seen since the last start, stacks are tuples of code objects from outermost to innermost
+
+    """
+    def __init__(self, interval=0.005, thread_id=None):
+        """
+        Args:
+            interval: Seconds between samples
+            thread_id: The thread to sample, the thread creating the profiler if None
+        """
+        self.interval = interval
+        self.samples = collections.Counter()
+        self.__thread_id = threading.get_ident() if thread_id is None else thread_id
+        self.__lock = threading.Lock()
+        self.__recording = threading.Event()
+        self.__sampler = None
+
+    def start(self):
+        """Clears the samples and starts recording
+        """
+        with self.__lock:
+            self.samples = collections.Counter()
+        self.__recording.set()
+        if self.__sampler is None:
+            self.__sampler = threading.Thread(target=self.__sample, name="sampler", daemon=True)
+            self.__sampler.start()
+
+    def stop(self):
+        """Stops recording. The samples are kept until the next start.
+        """
+        self.__recording.clear()
+
+    def __sample(self):
+        while True:
+            self.__recording.wait()
+            time.sleep(self.interval)
+            frame = sys._current_frames().get(self.__thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            stack.reverse()
+            with self.__lock:
+                if stack and self.__recording.is_set():
+                    self.samples[tuple(stack)] += 1
+
+    def collapsed(self):
+        """The recorded samples in collapsed stack format
+
+        Returns:
+            A list of "outer;inner count" lines, most common stacks first
+
+        """
+        with self.__lock:
+            samples = self.samples.most_common()
+        return ["{} {}".format(";".join(frame_name(code) for code in stack), n) for stack, n in samples]
+
+    def write(self, path):
+        """Writes the recorded samples to a file in collapsed stack format
+
+        Args:
+            path: The file to write, its directory is created if needed
+
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as output:
+            for line in self.collapsed():
+                output.write(line + "\n")
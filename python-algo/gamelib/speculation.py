@@ -0,0 +1,152 @@
+"""
+Speculative next-turn computation during the action phase.
+
+While the engine streams action frames the algo is idle. AlgoCore can hand the latest frame to
+a Speculator, which computes in a background thread whatever the strategy expects to need next
+turn. When the turn arrives, a result whose frame still matches the turn is reused and anything
+else is thrown away.
+"""
+import threading
+import time
+
+from .util import debug_write
+
+
+class Speculation:
+    """A finished speculative computation
+
+    Attributes :
+        * frame (string): The action frame the computation started from
+        * result: Whatever AlgoCore.speculate returned
+        * seconds (float): How long the computation took
+
+    """
+    def __init__(self, frame, result, seconds):
+        self.frame = frame
+        self.result = result
+        self.seconds = seconds
+
+
+class Speculator:
+    """Runs a function on the most recent action frame in a background thread
+
+    Frames that arrive while the worker is busy replace each other, so only the newest
+    one is computed next. Results from before the last collect are dropped.
+
+    Attributes :
+        * hits (int): Turns that reused a speculation
+        * misses (int): Turns that had a speculation which failed validation, or none at all
+        * discarded (int): Frames and results that were replaced by newer ones before being used
+        * saved_seconds (float): Computation time of the speculations that were reused
+        * turn_seconds (float): Time spent in on_turn after speculation
+
+    """
+    def __init__(self, speculate):
+        """
+        Args:
+            speculate: A function taking an action frame string and returning anything
+        """
+        self.hits = 0
+        self.misses = 0
+        self.discarded = 0
+        self.saved_seconds = 0.0
+        self.turn_seconds = 0.0
+        self.__speculate = speculate
+        self.__condition = threading.Condition()
+        self.__pending = None
+        self.__busy = False
+        self.__finished = None
+        self.__generation = 0
+        self.__thread = None
+
+    def submit(self, frame):
+        """Queues a frame to speculate on, replacing any frame that has not been started yet
+        """
+        with self.__condition:
+            if self.__pending is not None:
+                self.discarded += 1
+            self.__pending = frame
+            if self.__thread is None:
+                self.__thread = threading.Thread(target=self.__work, name="speculation", daemon=True)
+                self.__thread.start()
+            self.__condition.notify_all()
+
+    def __work(self):
+        while True:
+            with self.__condition:
+                while self.__pending is None:
+                    self.__condition.wait()
+                frame, self.__pending = self.__pending, None
+                generation = self.__generation
+                self.__busy = True
+            start = time.perf_counter()
+            try:
+                result = self.__speculate(frame)
+            except Exception as e:
+                debug_write("Speculation failed: {!r}".format(e))
+                result = None
+            seconds = time.perf_counter() - start
+            with self.__condition:
+                self.__busy = False
+                if generation == self.__generation:
+                    if self.__finished is not None:
+                        self.discarded += 1
+                    self.__finished = Speculation(frame, result, seconds)
+                else:
+                    self.discarded += 1
+                self.__condition.notify_all()
+
+    def collect(self, timeout=None):
+        """Waits for the speculation in progress, then takes the newest finished one.
+        Anything still running after the timeout is dropped when it finishes. There is no wait when
+        the speculation in progress started from an older frame than the newest one submitted,
+        since its result would be out of date anyway.
+
+        Args:
+            timeout: The longest to wait in seconds, or None to wait until the worker is idle
+
+        Returns:
+            The newest Speculation, or None
+
+        """
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        with self.__condition:
+            # The worker is busy with an older frame while the newest waits, which makes both out of date
+            stale = lambda: self.__busy and self.__pending is not None
+            while (self.__busy or self.__pending is not None) and not stale():
+                remaining = None if deadline is None else deadline - time.perf_counter()
+                if remaining is not None and remaining <= 0:
+                    break
+                self.__condition.wait(remaining)
+            if self.__pending is not None:
+                self.discarded += 1
+                self.__pending = None
+            speculation, self.__finished = self.__finished, None
+            self.__generation += 1
+            return speculation
+
+    def record_turn(self, speculation, valid, turn_seconds):
+        """Adds a turn to the statistics
+
+        Args:
+            speculation: The Speculation collected for the turn, or None
+            valid: True if it was reused
+            turn_seconds: How long on_turn took
+
+        """
+        self.turn_seconds += turn_seconds
+        if speculation is not None and valid:
+            self.hits += 1
+            self.saved_seconds += speculation.seconds
+        else:
+            self.misses += 1
+            if speculation is not None:
+                self.discarded += 1
+
+    def summary(self):
+        """A one line report of how much turn computation speculation saved
+        """
+        total = self.saved_seconds + self.turn_seconds
+        saved_percent = 100 * self.saved_seconds / total if total > 0 else 0
+        return "Speculation reused on {} of {} turns, saved {:.3f}s of {:.3f}s turn computation ({:.0f}%), {} discarded".format(
+            self.hits, self.hits + self.misses, self.saved_seconds, total, saved_percent, self.discarded)
@@ -0,0 +1,148 @@
+"""
+Fast repeated targeting queries.
+
+GameState.get_target scans every location in range of the attacker and every unit in them on
+each call. A simulator asks for a target for every attacker on every frame, so TargetingEngine
+precomputes each attacker's range as a list of cells sorted by distance, and keeps a summary of
+the best candidate in each cell that only has to be rebuilt for cells that change.
+"""
+from .game_map import GameMap
+
+# (x, y, attackRange, getHitRadius) -> [(distance, [x, y]), ...] sorted by distance, then scan order
+_range_cache = {}
+
+
+class TargetingEngine:
+    """Answers get_target queries for a game map, giving exactly the same results as GameState.get_target
+
+    The engine caches per-cell summaries of the units it has looked at. After changing units on the map
+    outside of the engine, call invalidate for the changed locations (or with no arguments to drop everything).
+
+    Attributes :
+        * game_map (:obj: GameMap): The map the targets are chosen from
+
+    """
+    def __init__(self, game_map):
+        """Creates an engine for a map
+
+        Args:
+            game_map: A GameMap, or a GameState whose game_map will be used
+
+        """
+        self.game_map = game_map if isinstance(game_map, GameMap) else game_map.game_map
+        self.__hit_radius = self.game_map.config["unitInformation"][0]['getHitRadius']
+        self.__summaries = {}
+
+    def cells_in_range(self, location, attack_range):
+        """The locations in range of an attacker, nearest first
+
+        Locations at the same distance keep the order GameMap.get_locations_in_range returns them in,
+        which is the order get_target breaks its final ties in.
+
+        Args:
+            location: The location of the attacker
+            attack_range: The attacker's range
+
+        Returns:
+            A list of (distance, [x, y]) tuples. Do not modify it, it is shared between engines.
+
+        """
+        x, y = location
+        key = (x, y, attack_range, self.__hit_radius)
+        cells = _range_cache.get(key)
+        if cells is None:
+            center = [x, y]
+            locations = self.game_map.get_locations_in_range(center, attack_range)
+            cells = sorted(((self.game_map.distance_between_locations(l, center), l) for l in locations), key=lambda cell: cell[0])
+            _range_cache[key] = cells
+        return cells
+
+    def __summary(self, x, y):
+        """For each (player_index, stationary) pair, the lowest health unit of that kind in the cell.
+        Ties go to the unit that comes first in the cell, like get_target.
+        """
+        summary = self.__summaries.get((x, y))
+        if summary is None:
+            summary = {}
+            for index, unit in enumerate(self.game_map[x, y]):
+                key = (unit.player_index, unit.stationary)
+                best = summary.get(key)
+                if best is None or unit.health < best[0].health:
+                    summary[key] = (unit, index)
+            self.__summaries[(x, y)] = summary
+        return summary
+
+    def __cell_candidate(self, x, y, player_index, stationary):
+        candidate = None
+        for (owner, unit_stationary), (unit, index) in self.__summary(x, y).items():
+            if owner == player_index or unit_stationary != stationary:
+                continue
+            if candidate is None or (unit.health, index) < (candidate[0].health, candidate[1]):
+                candidate = (unit, index)
+        return candidate[0] if candidate else None
+
+    def get_target(self, attacking_unit):
+        """Returns the unit the given unit would attack, see GameState.get_target for the priority rules
+
+        Args:
+            attacking_unit: A GameUnit
+
+        Returns:
+            The GameUnit this unit would choose to attack, or None
+
+        """
+        cells = self.cells_in_range([attacking_unit.x, attacking_unit.y], attacking_unit.attackRange)
+        player_index = attacking_unit.player_index
+        y_sign = 1 if player_index == 0 else -1
+        half = self.game_map.HALF_ARENA - 0.5
+
+        # Mobile units are always preferred, so structures are only considered if no mobile unit is in range
+        for stationary in (False, True):
+            if (stationary and attacking_unit.damage_f == 0) or (not stationary and attacking_unit.damage_i == 0):
+                continue
+            target = None
+            target_key = None
+            target_distance = None
+            for distance, (x, y) in cells:
+                if target is not None and distance > target_distance:
+                    break
+                unit = self.__cell_candidate(x, y, player_index, stationary)
+                if unit is None:
+                    continue
+                key = (unit.health, y_sign * unit.y, -abs(half - unit.x))
+                if target is None or key < target_key:
+                    target, target_key, target_distance = unit, key, distance
+            if target is not None:
+                return target
+        return None
+
+    def invalidate(self, location=None):
+        """Forgets the cached summary of a location, or of every location if None.
+        Call this after adding, removing or damaging units without going through the engine.
+        """
+        if location is None:
+            self.__summaries.clear()
+        else:
+            self.__summaries.pop((int(location[0]), int(location[1])), None)
+
+    def remove_unit(self, unit):
+        """Removes a single unit from the map, for example when it dies during a simulation
+
+        Args:
+            unit: The GameUnit to remove
+
+        """
+        location = (unit.x, unit.y)
+        self.game_map[location] = [other for other in self.game_map[location] if other is not unit]
+        self.invalidate(location)
+
+    def set_health(self, unit, health):
+        """Changes a unit's health and updates the summary of its location
+
+        Args:
+            unit: The GameUnit that was damaged or shielded
+            health: Its new health
+
+        """
+        unit.health = health
+        self.invalidate([unit.x, unit.y])
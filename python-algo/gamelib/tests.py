@@ -1,7 +1,24 @@
 import unittest
+import gc
+import io
 import json
+import random
+import os
+import sys
+import tempfile
+import threading
+import time
+import warnings
+from .algocore import AlgoCore
+from .async_algocore import AsyncAlgoCore
 from .game_state import GameState
 from .unit import GameUnit
+from .navigation import ShortestPathFinder
+from .bitboard import Bitboard, location_mask, half_mask, NUM_TILES
+from .zobrist import TranspositionTable
+from .targeting import TargetingEngine
+from .speculation import Speculator
+from . import instrumentation, latency, path_equivalence
 
 class BasicTests(unittest.TestCase):
 
@@ -215,6 +232,60 @@ class BasicTests(unittest.TestCase):
         self.assertEqual([("DF", 13, 6)], game._build_stack, "Build queue is wrong!")
         self.assertEqual([("SI", 13, 0), ("SI", 13, 0), ("SI", 13, 0)], game._deploy_stack, "Deploy queue is wrong!")
 
+    def test_spawning_many(self):
+        game = self.make_turn_0_map()
+        game.suppress_warnings(True)
+        game.ledger.set(game.MP, 10.5)
+        self.assertEqual(3, game.attempt_spawn("EI", [24, 10], 1000), "Spawning should stop when resources run out")
+        self.assertEqual(1.5, game.get_resource(game.MP), "Resources were not spent")
+        self.assertEqual(3, len(game.game_map[24, 10]), "Units were not added to the map")
+        self.assertEqual([("EI", 24, 10)] * 3, game._deploy_stack, "Deploy queue is wrong!")
+        self.assertEqual(True, game.can_spawn("SI", (3, 10)), "Tuple locations on the edge should be accepted")
+        self.assertEqual(1, game.attempt_spawn("FF", [13, 2], 5), "Only one structure fits in a location")
+
+    def test_spawning_bulk(self):
+        game = self.make_turn_0_map()
+        game.suppress_warnings(True)
+        game.ledger.set(game.MP, 3001)
+        expected = self.make_turn_0_map()
+        expected.suppress_warnings(True)
+        expected.ledger.set(expected.MP, 3001)
+        for state in (game, expected):
+            state.attempt_spawn("PI", [13, 0])
+        self.assertEqual(1000, game.attempt_spawn_bulk("EI", [24, 10], 1000))
+        self.assertEqual(1000, expected.attempt_spawn("EI", [24, 10], 1000))
+        self.assertEqual([("PI", 13, 0), ("EI", 24, 10, 1000)], game._deploy_stack, "Batches should be single entries")
+        self.assertEqual(expected.get_resources(), game.get_resources(), "Resources were spent differently")
+        self.assertEqual(len(expected.game_map[24, 10]), len(game.game_map[24, 10]))
+        self.assertEqual(0, game.attempt_spawn_bulk("EI", [13, 13], 5), "Locations should still be validated")
+        self.assertEqual(1, game.attempt_spawn_bulk("DF", [13, 6], 3), "Structures should be spawned one per location")
+
+        outputs = []
+        for state in (game, expected):
+            stdout = sys.stdout
+            sys.stdout = io.StringIO()
+            try:
+                state.submit_turn()
+                outputs.append(sys.stdout.getvalue().splitlines()[1])
+            finally:
+                sys.stdout = stdout
+        self.assertEqual(outputs[1], outputs[0], "Counted entries should be expanded when submitted")
+
+    def test_resource_ledger(self):
+        game = self.make_turn_0_map()
+        turret_cost = game.type_cost("DF")[0]
+        self.assertEqual([25, 5], game.get_resources(), "Resources should be read from the ledger")
+        self.assertEqual(True, game.reserve("defense", ["DF"] * 12), "Twelve turrets should be affordable")
+        self.assertEqual(False, game.reserve("walls", ["FF"] * 2), "Reserved resources should not be available")
+        self.assertEqual(0, game.attempt_spawn("DF", [[3, 12]]), "Reserved resources should not be spent outside of the plan")
+        with game.ledger.spending("defense"):
+            self.assertEqual(3, game.attempt_spawn("DF", [[3, 12], [24, 12], [13, 10]]), "The plan should spend its reservation")
+        self.assertEqual(25 - 3 * turret_cost, game.get_resource(game.SP))
+        self.assertEqual(int((25 - 3 * turret_cost) / turret_cost), game.number_affordable("DF"), "The reservation should be released after the plan")
+        record = game.ledger.log[0]
+        self.assertEqual(("defense", [12 * turret_cost, 0], [3 * turret_cost, 0]), (record.label, record.planned, record.actual), "Planned and actual spending were not logged")
+        self.assertEqual(5, game.get_resource(game.MP, 1), "The enemy's resources should be untouched")
+
     def test_trivial_functions(self):
         game = self.make_turn_0_map()
 
@@ -240,7 +311,7 @@ class BasicTests(unittest.TestCase):
         self.assertEqual(1, len(game.game_map.get_locations_in_range([13,13], 0)), "We should be in 0 range of ourself")
         self.assertEqual(37, len(game.game_map.get_locations_in_range([13,13], 3.5)), "Wrong number of tiles in range")
 
-    def _test_get_attackers(self):
+    def test_get_attackers(self):
         game = self.make_turn_0_map()
         
         self.assertEqual([], game.get_attackers([13,13], 0), "Are we being attacked by a ghost?")
@@ -271,7 +342,525 @@ class BasicTests(unittest.TestCase):
         self.future_turn_testing_function(game, 11.6, 2)
         self.future_turn_testing_function(game, 13.7, 3)
 
+    def test_future_MP_schedule(self):
+        game = self.make_turn_0_map()
+        resources = game.config["resources"]
+
+        def project_by_loop(MP, turn_number, turns_in_future):
+            for increment in range(1, turns_in_future + 1):
+                MP *= (1 - resources["bitDecayPerRound"])
+                MP += resources["bitsPerRound"] + resources["bitGrowthRate"] * ((turn_number + increment) // resources["turnIntervalForBitSchedule"])
+                MP = round(MP, 1)
+            return MP
+
+        rng = random.Random(3)
+        for _ in range(200):
+            game.turn_number = rng.randint(0, 100)
+            current_MP = round(rng.uniform(0.1, 60), rng.randint(0, 3))
+            turns = rng.randint(1, 30)
+            self.assertEqual(project_by_loop(current_MP, game.turn_number, turns), game.project_future_MP(turns, current_MP=current_MP),
+                "Projection does not match the turn by turn calculation")
+        game.turn_number = 7
+        horizons = [5, 1, 0, 12]
+        self.assertEqual([project_by_loop(9.5, 7, h) for h in horizons], game.project_future_MP_many(horizons, current_MP=9.5))
+
     def future_turn_testing_function(self, game, expected, turns):
         actual = game.project_future_MP(turns)
         self.assertAlmostEqual(actual, expected, 0, "Expected {} MP {} turns from now, got {}".format(expected, turns, actual))
 
+    def test_path_equivalence(self):
+        game = self.make_turn_0_map()
+        cases = path_equivalence.random_cases(game.config, 4, seed=7)
+        failures = path_equivalence.run_differential(game.config, ShortestPathFinder(), cases)
+        self.assertEqual([], failures, "The reference pathfinder disagrees with itself")
+
+        class NoTieBreakPathFinder(ShortestPathFinder):
+            def _better_direction(self, prev_tile, new_tile, prev_best, previous_move_direction, end_points):
+                return False
+
+        failures = path_equivalence.run_differential(game.config, NoTieBreakPathFinder(), cases[:1])
+        self.assertEqual(1, len(failures), "Ignoring tie-breaking should change the path")
+        minimized = failures[0].minimized
+        self.assertLessEqual(len(minimized.blocked), len(cases[0].blocked), "Minimizing should never add structures")
+        self.assertNotEqual(failures[0].reference_path, failures[0].candidate_path, "The minimized case should still disagree")
+
+        frame = json.loads(game.serialized_string)
+        frame["events"]["spawn"] = [[[13, 0], 3, "1", 1], [[13, 13], 0, "2", 1], [[12, 12], 6, "3", 1], [[14, 14], 7, "4", 1]]
+        cases = path_equivalence.replay_cases(game.config, [frame])
+        self.assertEqual([(13, 0)], [tuple(case.start) for case in cases], "Only mobile spawns should start paths, not removals or upgrades")
+
+    def test_bitboard(self):
+        game = self.make_turn_0_map()
+        self.assertEqual(420, NUM_TILES, "The arena should have 420 tiles")
+        game.game_map.add_unit("FF", [13, 13], 0)
+        game.game_map.add_unit("DF", [12, 12], 0)
+        game.game_map.add_unit("EF", [14, 14], 1)
+        game.game_map.add_unit("EI", [13, 0], 0)
+        game.game_map[12, 12][0].upgrade()
+        board = Bitboard.from_game_map(game.game_map)
+        self.assertEqual(3, board.count_in(location_mask([[13, 13], [12, 12], [14, 14], [13, 0]])), "Mobile units should not be in the bitboard")
+        self.assertEqual(2, board.count_in(half_mask(0)), "I should have 2 structures on my half")
+        self.assertEqual(1, board.count_in(half_mask(1), 1, 1), "My opponent should have one support")
+        self.assertEqual(board, Bitboard.from_game_map(board.to_game_map(game.config)), "Bitboard does not survive a trip through GameMap")
+        self.assertEqual(board, Bitboard.from_bytes(board.to_bytes()), "Bitboard does not survive serialization")
+
+        units = [[[13, 13, 75.0, "1"]], [], [[12, 12, 90.0, "2"]], [], [], [], [], [[12, 12, 90.0, "3"]]]
+        enemy_units = [[], [[14, 14, 30.0, "4"]], [], [], [], [], [], []]
+        self.assertEqual(board, Bitboard.from_units(units, enemy_units), "Bitboard built from raw units does not match the GameMap")
+
+        stderr, sys.stderr = sys.stderr, io.StringIO()
+        try:
+            board.set([0, 0], 0, 0)
+            board.clear([27, 27])
+            self.assertIn("out of bounds", sys.stderr.getvalue(), "Locations outside the arena should be warned about")
+        finally:
+            sys.stderr = stderr
+        self.assertEqual(board, Bitboard.from_units(units, enemy_units), "Locations outside the arena should be ignored")
+
+    def test_zobrist_hash(self):
+        game = self.make_turn_0_map()
+        game_map = game.game_map
+        self.assertEqual(0, game_map.zobrist_hash, "An empty map should hash to 0")
+        game_map.add_unit("FF", [13, 13], 0)
+        game_map.add_unit("DF", [14, 14], 1)
+        one_wall_one_turret = game_map.zobrist_hash
+        game_map.add_unit("EI", [13, 0], 0)
+        self.assertEqual(one_wall_one_turret, game_map.zobrist_hash, "Mobile units should not change the hash")
+        game_map.upgrade_unit([14, 14])
+        game_map.set_pending_removal([13, 13])
+        self.assertNotEqual(one_wall_one_turret, game_map.zobrist_hash, "Upgrades and removal flags should change the hash")
+        self.assertEqual(game_map.compute_zobrist_hash(), game_map.zobrist_hash, "Incremental hash drifted from the full hash")
+        game_map.set_pending_removal([13, 13], False)
+        game_map[14, 14] = []
+        game_map.add_unit("DF", [14, 14], 1)
+        self.assertEqual(one_wall_one_turret, game_map.zobrist_hash, "Undoing changes should restore the hash")
+        game_map.remove_unit([13, 13])
+        game_map.remove_unit([14, 14])
+        self.assertEqual(0, game_map.zobrist_hash, "Removing every structure should restore the empty hash")
+
+        other = self.make_turn_0_map().game_map
+        other.add_unit("DF", [14, 14], 1)
+        other.add_unit("FF", [13, 13], 0)
+        self.assertEqual(one_wall_one_turret, other.zobrist_hash, "The hash should not depend on build order")
+
+    def test_transposition_table(self):
+        table = TranspositionTable(2)
+        table.put(1, "a")
+        table.put(2, "b")
+        self.assertEqual("a", table.get(1), "Stored result is missing")
+        table.put(3, "c")
+        self.assertNotIn(2, table, "The least recently used entry should have been evicted")
+        self.assertEqual("d", table.get_or_compute(4, lambda: "d"), "get_or_compute should store computed results")
+        self.assertEqual(2, len(table), "The table grew past its bound")
+        self.assertEqual((1, 1), (table.hits, table.misses), "Hits and misses are miscounted")
+
+    def test_targeting_engine(self):
+        game = self.make_turn_0_map()
+        rng = random.Random(3)
+        units = []
+        for location in game.game_map:
+            roll = rng.random()
+            player_index = 0 if location[1] < game.HALF_ARENA else 1
+            if roll < 0.2:
+                game.game_map.add_unit(rng.choice(["FF", "EF", "DF"]), location, player_index)
+            elif roll < 0.3:
+                for _ in range(rng.randint(1, 3)):
+                    game.game_map.add_unit(rng.choice(["PI", "EI", "SI"]), location, rng.randint(0, 1))
+            for unit in game.game_map[location]:
+                unit.health = rng.choice([5, 10, 15])
+                units.append(unit)
+
+        engine = TargetingEngine(game)
+        for unit in units:
+            self.assertIs(game.get_target(unit), engine.get_target(unit), "Engine picked a different target for {}".format(unit))
+
+        for unit in units[::3]:
+            engine.remove_unit(unit)
+        for unit in units[1::3]:
+            engine.set_health(unit, 1)
+        for unit in units[2::3]:
+            self.assertIs(game.get_target(unit), engine.get_target(unit), "Engine picked a different target after deaths for {}".format(unit))
+
+    def test_coverage_map(self):
+        game = self.make_turn_0_map()
+
+        def scan_attackers(location, player_index):
+            attackers = []
+            for other in game.game_map.get_locations_in_range(location, 4.5):
+                for unit in game.game_map[other]:
+                    if unit.damage_i + unit.damage_f > 0 and unit.player_index != player_index and game.game_map.distance_between_locations(location, other) <= unit.attackRange:
+                        attackers.append(unit)
+            return attackers
+
+        rng = random.Random(5)
+        locations = list(game.game_map)
+        for location in rng.sample(locations, 60):
+            game.game_map.add_unit(rng.choice(["FF", "EF", "DF", "PI", "SI"]), location, rng.randint(0, 1))
+        self.assertEqual(scan_attackers([13, 13], 0), game.get_attackers([13, 13], 0), "Coverage map disagrees with a range scan")
+
+        for location in rng.sample(locations, 20):
+            game.game_map.remove_unit(location)
+        for location in rng.sample(locations, 20):
+            game.game_map.add_unit("DF", location, rng.randint(0, 1))
+        for location in rng.sample(locations, 20):
+            game.game_map.upgrade_unit(location)
+        for location in locations:
+            for player_index in (0, 1):
+                self.assertEqual(scan_attackers(location, player_index), game.get_attackers(location, player_index),
+                                 "Coverage map was not updated for {}".format(location))
+
+    def run_algo(self, algo, messages):
+        stdin, stdout, stderr = sys.stdin, sys.stdout, sys.stderr
+        sys.stdin = io.TextIOWrapper(io.BytesIO("".join(line + "\n" for line in messages).encode()))
+        sys.stdout, sys.stderr = io.StringIO(), io.StringIO()
+        try:
+            algo.start()
+            return sys.stdout.getvalue()
+        finally:
+            sys.stdin, sys.stdout, sys.stderr = stdin, stdout, stderr
+
+    def test_algocore_loop(self):
+        game = self.make_turn_0_map()
+        turn = game.serialized_string
+        frame = turn.replace('"turnInfo":[0,0,-1]', '"turnInfo":[1,0,0]')
+        end = turn.replace('"turnInfo":[0,0,-1]', '"turnInfo":[2,1,-1]')
+
+        class RecordingAlgo(AlgoCore):
+            def __init__(self):
+                super().__init__()
+                self.frames = []
+
+            def on_turn(self, turn_state):
+                state = GameState(self.config, turn_state)
+                state.attempt_spawn("PI", [13, 0], 2)
+                state.submit_turn()
+
+            def on_action_frame(self, action_frame_game_state):
+                self.frames.append(json.loads(action_frame_game_state)["turnInfo"])
+
+        algo = RecordingAlgo()
+        output = self.run_algo(algo, [json.dumps(game.config), turn, frame, frame, end, turn])
+        self.assertEqual('[]\n[["PI", 13, 0], ["PI", 13, 0]]\n', output, "Turn was not submitted as two lines")
+        self.assertEqual([[1, 0, 0], [1, 0, 0]], algo.frames, "Action frames were not passed on")
+        self.assertEqual("[]\n[]\n", self.run_algo(AlgoCore(), [json.dumps(game.config), turn, frame, end]), "Default turn should be empty")
+
+    def test_async_algocore_loop(self):
+        game = self.make_turn_0_map()
+        turn = game.serialized_string
+        frame = turn.replace('"turnInfo":[0,0,-1]', '"turnInfo":[1,0,0]')
+
+        class BackgroundAlgo(AsyncAlgoCore):
+            def __init__(self):
+                super().__init__()
+                self.frames = 0
+
+            async def on_turn(self, turn_state):
+                state = GameState(self.config, turn_state)
+                spawn_count = await self.run_in_background(lambda: 3)
+                state.attempt_spawn("PI", [13, 0], spawn_count)
+                state.submit_turn()
+
+            def on_action_frame(self, action_frame_game_state):
+                self.frames += 1
+
+        algo = BackgroundAlgo()
+        # No end state, the algo should stop cleanly when stdin closes
+        output = self.run_algo(algo, [json.dumps(game.config), turn, frame, frame])
+        self.assertEqual('[]\n[["PI", 13, 0], ["PI", 13, 0], ["PI", 13, 0]]\n', output, "Async turn was not submitted")
+        self.assertEqual(2, algo.frames, "Action frames were not passed on")
+
+        # Read from a real pipe, which the event loop watches through a transport. The game ends
+        # with an end state while the pipe is still open, so the transport has to be closed by the algo.
+        end = turn.replace('"turnInfo":[0,0,-1]', '"turnInfo":[2,1,-1]')
+        read_fd, write_fd = os.pipe()
+        pipe = os.fdopen(write_fd, "w")
+        pipe.write("".join(line + "\n" for line in [json.dumps(game.config), turn, frame, end]))
+        pipe.flush()
+        stdin, stdout, stderr = sys.stdin, sys.stdout, sys.stderr
+        sys.stdin = os.fdopen(read_fd)
+        sys.stdout, sys.stderr = io.StringIO(), io.StringIO()
+        try:
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter("always", ResourceWarning)
+                BackgroundAlgo().start()
+                gc.collect()
+            output = sys.stdout.getvalue()
+        finally:
+            pipe.close()
+            sys.stdin.close()
+            sys.stdin, sys.stdout, sys.stderr = stdin, stdout, stderr
+        self.assertEqual('[]\n[["PI", 13, 0], ["PI", 13, 0], ["PI", 13, 0]]\n', output, "Async turn read from a pipe was not submitted")
+        self.assertEqual([], [str(w.message) for w in caught if issubclass(w.category, ResourceWarning)], "The stdin transport was not closed")
+
+    def test_async_algocore_background_work(self):
+        game = self.make_turn_0_map()
+        turn = game.serialized_string
+        end = turn.replace('"turnInfo":[0,0,-1]', '"turnInfo":[2,1,-1]')
+        release = threading.Event()
+
+        class BusyAlgo(AsyncAlgoCore):
+            def on_turn(self, turn_state):
+                self.busy = self.run_in_background(release.wait, 10)
+                GameState(self.config, turn_state).submit_turn()
+
+        start = time.perf_counter()
+        try:
+            self.run_algo(BusyAlgo(), [json.dumps(game.config), turn, end])
+            seconds = time.perf_counter() - start
+        finally:
+            release.set()
+        self.assertLess(seconds, 5, "The end of the game should not wait for work running in the background")
+
+    def test_async_algocore_hooks(self):
+        game = self.make_turn_0_map()
+        turn = game.serialized_string
+        same_layout = turn.replace('"turnInfo":[0,0,-1]', '"turnInfo":[1,0,5]')
+        next_turn = turn.replace('"turnInfo":[0,0,-1]', '"turnInfo":[0,1,-1]')
+        end = turn.replace('"turnInfo":[0,0,-1]', '"turnInfo":[2,2,-1]')
+        original = GameState.can_spawn
+
+        class HookedAlgo(AsyncAlgoCore):
+            def __init__(self):
+                super().__init__()
+                self.reused = []
+
+            def speculate(self, action_frame_game_state):
+                return json.loads(action_frame_game_state)["turnInfo"]
+
+            async def on_turn(self, turn_state):
+                self.reused.append(self.speculation)
+                state = GameState(self.config, turn_state)
+                state.can_spawn("PI", [13, 0])
+                state.submit_turn()
+
+        with tempfile.TemporaryDirectory() as directory:
+            trace_path = os.path.join(directory, "trace.jsonl")
+            algo = HookedAlgo()
+            algo.speculation_timeout = 1.0
+            algo.enable_latency_tracking(trace_path)
+            algo.enable_instrumentation()
+            algo.enable_slow_turn_profiling(0, directory, 0.001)
+            self.run_algo(algo, [json.dumps(game.config), turn, same_layout, next_turn, end])
+            self.assertIsNone(latency.active_tracker(), "The end of the game should stop recording phases")
+            with open(trace_path) as trace:
+                records = [json.loads(line) for line in trace]
+            profiles = sorted(name for name in os.listdir(directory) if name.endswith(".folded"))
+
+        self.assertEqual([None, [1, 0, 5]], algo.reused, "Speculation should work on the async core")
+        self.assertEqual([None, 0, 1], [record["turn"] for record in records], "Every turn should be traced")
+        self.assertIn("strategy", records[1]["phases"])
+        self.assertEqual(["turn_0.folded", "turn_1.folded"], profiles, "Turns over the threshold should be profiled")
+        self.assertIs(original, GameState.can_spawn, "Functions should be restored at the end of the game")
+        self.assertEqual([0, 1], [turn_number for turn_number, counters in algo.instrumentation.turns], "Every turn should be counted")
+
+    def test_speculation(self):
+        game = self.make_turn_0_map()
+        turn = game.serialized_string
+        same_layout = turn.replace('"turnInfo":[0,0,-1]', '"turnInfo":[1,0,5]')
+        new_layout = same_layout.replace('"p1Units":[[]', '"p1Units":[[[13,13,75.0,"1"]]')
+        next_turn = turn.replace('"turnInfo":[0,0,-1]', '"turnInfo":[0,1,-1]')
+        end = turn.replace('"turnInfo":[0,0,-1]', '"turnInfo":[2,2,-1]')
+
+        class SpeculatingAlgo(AlgoCore):
+            def __init__(self):
+                super().__init__()
+                self.reused = []
+
+            def speculate(self, action_frame_game_state):
+                return json.loads(action_frame_game_state)["turnInfo"]
+
+            def on_turn(self, turn_state):
+                self.reused.append(self.speculation)
+                GameState(self.config, turn_state).submit_turn()
+
+        algo = SpeculatingAlgo()
+        # Each frame here comes right before its turn, so the turn waits for the speculation to finish
+        algo.speculation_timeout = 1.0
+        self.run_algo(algo, [json.dumps(game.config), turn, same_layout, next_turn, new_layout, next_turn, end])
+        self.assertEqual([None, [1, 0, 5], None], algo.reused, "Speculation should only be reused when the layout matches")
+        self.assertEqual((1, 2), (algo._speculator.hits, algo._speculator.misses), "Speculation statistics are wrong")
+
+    def test_speculation_does_not_wait_for_old_frames(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def speculate(frame):
+            started.set()
+            release.wait(10)
+            return frame
+
+        speculator = Speculator(speculate)
+        try:
+            speculator.submit("old")
+            started.wait(10)
+            start = time.perf_counter()
+            self.assertIsNone(speculator.collect(0), "Nothing has finished yet")
+            speculator.submit("newer")
+            self.assertIsNone(speculator.collect(5), "There is nothing to wait for when a newer frame is queued")
+            self.assertLess(time.perf_counter() - start, 1, "collect should not wait for a speculation on an old frame")
+        finally:
+            release.set()
+        self.assertEqual(0, AlgoCore().speculation_timeout, "Turns should not wait for speculation by default")
+
+    def test_latency_tracking(self):
+        game = self.make_turn_0_map()
+        turn = game.serialized_string
+        frame = turn.replace('"turnInfo":[0,0,-1]', '"turnInfo":[1,0,0]')
+        next_turn = turn.replace('"turnInfo":[0,0,-1]', '"turnInfo":[0,1,-1]')
+        end = turn.replace('"turnInfo":[0,0,-1]', '"turnInfo":[2,1,-1]')
+
+        class TimedAlgo(AlgoCore):
+            def on_turn(self, turn_state):
+                GameState(self.config, turn_state).submit_turn()
+
+            def on_action_frame(self, action_frame_game_state):
+                json.loads(action_frame_game_state)
+
+        with tempfile.TemporaryDirectory() as directory:
+            trace_path = os.path.join(directory, "trace.jsonl")
+            algo = TimedAlgo()
+            algo.enable_latency_tracking(trace_path)
+            self.run_algo(algo, [json.dumps(game.config), turn, frame, frame, next_turn, end])
+            self.assertIsNone(latency.active_tracker(), "The end of the game should stop recording phases")
+            with open(trace_path) as trace:
+                records = [json.loads(line) for line in trace]
+
+        self.assertEqual([None, 0, 1], [record["turn"] for record in records], "Every turn should be traced")
+        phases = records[1]["phases"]
+        for name in ("read", "decode", "game_state", "strategy", "submit_turn", "action_frame"):
+            self.assertIn(name, phases, "Phase {} was not recorded".format(name))
+        self.assertEqual(2, phases["action_frame"]["calls"], "Each action frame should be timed")
+        self.assertEqual(1, phases["game_state"]["calls"], "GameState construction should be timed once")
+        self.assertEqual([2, 2], [sum(algo.latency.histogram("strategy")), sum(algo.latency.histogram("submit_turn"))], "Histograms should count turns")
+        self.assertIn("strategy", algo.latency.summary())
+        self.assertIsNone(latency.active_tracker())
+
+    def test_slow_turn_profiling(self):
+        game = self.make_turn_0_map()
+        turn = game.serialized_string
+        next_turn = turn.replace('"turnInfo":[0,0,-1]', '"turnInfo":[0,1,-1]')
+        end = turn.replace('"turnInfo":[0,0,-1]', '"turnInfo":[2,1,-1]')
+
+        class SlowAlgo(AlgoCore):
+            def on_turn(self, turn_state):
+                state = GameState(self.config, turn_state)
+                if state.turn_number == 1:
+                    self.search(time.perf_counter() + 0.05)
+                state.submit_turn()
+
+            def search(self, deadline):
+                while time.perf_counter() < deadline:
+                    pass
+
+        with tempfile.TemporaryDirectory() as directory:
+            algo = SlowAlgo()
+            algo.enable_slow_turn_profiling(0.03, directory, 0.001)
+            self.run_algo(algo, [json.dumps(game.config), turn, next_turn, end])
+            self.assertEqual(["turn_1.folded"], os.listdir(directory), "Only the slow turn should be written")
+            with open(os.path.join(directory, "turn_1.folded")) as profile:
+                lines = profile.read().splitlines()
+
+        self.assertTrue(lines, "The slow turn should have samples")
+        stack, samples = lines[0].rsplit(" ", 1)
+        self.assertIn("on_turn", stack)
+        self.assertIn("search", stack.split(";")[-1], "The innermost frame should be the busy function")
+        self.assertGreater(int(samples), 0)
+
+    def test_instrumentation(self):
+        game = self.make_turn_0_map()
+        turn = game.serialized_string
+        next_turn = turn.replace('"turnInfo":[0,0,-1]', '"turnInfo":[0,1,-1]')
+        end = turn.replace('"turnInfo":[0,0,-1]', '"turnInfo":[2,1,-1]')
+        original = GameState.can_spawn
+
+        @instrumentation.timed
+        def plan(state):
+            state.find_path_to_edge([13, 0])
+            return state.can_spawn("PI", [13, 0])
+
+        class CountingAlgo(AlgoCore):
+            def on_turn(self, turn_state):
+                state = GameState(self.config, turn_state)
+                for _ in range(state.turn_number + 1):
+                    plan(state)
+                state.submit_turn()
+
+        algo = CountingAlgo()
+        algo.enable_instrumentation()
+        self.assertIsNot(original, GameState.can_spawn, "Functions should be wrapped while enabled")
+        self.run_algo(algo, [json.dumps(game.config), turn, next_turn, end])
+        self.assertIs(original, GameState.can_spawn, "Functions should be restored at the end of the game")
+
+        per_turn = [(turn_number, counters["GameState.can_spawn"][0]) for turn_number, counters in algo.instrumentation.turns]
+        self.assertEqual([(0, 1), (1, 2)], per_turn, "Counters should be reset every turn")
+        top = {name: (calls, peak, peak_turn) for name, calls, seconds, peak, peak_turn in algo.instrumentation.top(10)}
+        self.assertEqual((3, 2, 1), top["GameState.find_path_to_edge"])
+        self.assertEqual((3, 2, 1), top[plan.__qualname__])
+        self.assertGreater(top["GameState.contains_stationary_unit"][0], 0)
+        plan(GameState(game.config, turn))
+        self.assertEqual({}, algo.instrumentation.counters, "Nothing should be counted while disabled")
+
+    @unittest.skipUnless(sys.platform.startswith("linux") and os.path.isdir("/proc/self/fd"), "The zygote needs /proc")
+    def test_zygote(self):
+        import shutil
+        import subprocess
+        from .zygote import Zygote
+
+        class EchoAlgo:
+            def start(self):
+                line = sys.stdin.readline()
+                sys.stdout.write("{} {}".format(os.environ.get("ALGO_SEED"), line))
+                sys.exit(3)
+
+        with tempfile.TemporaryDirectory() as directory:
+            shutil.copy(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "run.sh"), directory)
+            zygote = Zygote(EchoAlgo, os.path.join(directory, ".zygote"))
+            zygote.start()
+            try:
+                games = [subprocess.Popen(["bash", os.path.join(directory, "run.sh")], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                          env=dict(os.environ, ALGO_SEED=str(seed))) for seed in range(3)]
+                for seed, game in enumerate(games):
+                    game.stdin.write("turn {}\n".format(seed).encode())
+                    game.stdin.close()
+                deadline = time.time() + 10
+                while any(game.poll() is None for game in games) and time.time() < deadline:
+                    zygote.poll(0.05)
+                outputs = [game.stdout.read().decode() for game in games]
+                for game in games:
+                    game.stdout.close()
+            finally:
+                zygote.stop()
+            self.assertEqual(["0 turn 0\n", "1 turn 1\n", "2 turn 2\n"], outputs, "Each game should get its own pipes and environment")
+            self.assertEqual([3, 3, 3], [game.returncode for game in games], "run.sh should exit with the code of its game")
+            self.assertEqual(["requests"], os.listdir(os.path.join(directory, ".zygote")), "Only the request pipe should be left")
+
+    @unittest.skipUnless(sys.platform.startswith("linux") and os.path.isdir("/proc/self/fd"), "The zygote needs /proc")
+    def test_zygote_fallback(self):
+        import shutil
+        import subprocess
+        from .zygote import Zygote
+
+        with tempfile.TemporaryDirectory() as directory:
+            shutil.copy(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "run.sh"), directory)
+            with open(os.path.join(directory, "algo_strategy.py"), "w") as algo:
+                algo.write("import sys\nsys.stdout.write('played here ' + sys.stdin.readline())\n")
+            zygote = Zygote(None, os.path.join(directory, ".zygote"))
+            zygote.start()
+
+            def play():
+                game = subprocess.run(["bash", os.path.join(directory, "run.sh")], input=b"turn\n", stdout=subprocess.PIPE,
+                                      env=dict(os.environ, PYTHON_CMD=sys.executable, ZYGOTE_TIMEOUT="1"), timeout=10)
+                return game.stdout.decode(), game.returncode
+
+            try:
+                # Never polled, like a zygote that hangs
+                self.assertEqual(("played here turn\n", 0), play(), "run.sh should play itself when the zygote does not answer")
+                pid_path = os.path.join(directory, ".zygote", "pid")
+                with open(pid_path) as pid_file:
+                    pid = pid_file.readline()
+                with open(pid_path, "w") as pid_file:
+                    pid_file.write(pid + "some other process\n")
+                self.assertEqual(("played here turn\n", 0), play(), "run.sh should not use a pid that is no longer the zygote's")
+            finally:
+                zygote.stop()
+            self.assertEqual(["requests"], os.listdir(os.path.join(directory, ".zygote")), "Reply pipes should be removed")
@@ -1,32 +1,79 @@
+import io
 import sys
 
 
 BANNER_TEXT = "---------------- Starting Your Algo --------------------"
 
+# Action frames can be hundreds of kilobytes, so stdin is read in large binary chunks
+STDIN_BUFFER_SIZE = 1 << 20
+
+_stdin = None
+_stdin_source = None
+
+
+def _binary_stdin():
+    """Opens a large binary buffer on stdin the first time it is needed.
+    Falls back to reading sys.stdin itself when it is not a real file, for example in tests.
+    """
+    global _stdin, _stdin_source
+    if _stdin is None or _stdin_source is not sys.stdin:
+        try:
+            _stdin = open(sys.stdin.fileno(), "rb", buffering=STDIN_BUFFER_SIZE, closefd=False)
+        except (AttributeError, ValueError, OSError, io.UnsupportedOperation):
+            _stdin = _TextStdin(sys.stdin)
+        _stdin_source = sys.stdin
+    return _stdin
+
+
+class _TextStdin:
+    """Reads bytes from a stream that may only support text, such as a replaced sys.stdin
+    """
+    def __init__(self, stream):
+        self.stream = stream
+
+    def readline(self):
+        buffer = getattr(self.stream, "buffer", None)
+        if buffer is not None:
+            return buffer.readline()
+        return self.stream.readline().encode("utf-8")
 
-def get_command():
-    """Gets input from stdin
+
+def get_command_bytes():
+    """Gets the next line from stdin as undecoded bytes, ready to be passed to json.loads
 
     """
     try:
-        ret = sys.stdin.readline()
+        ret = _binary_stdin().readline()
     except EOFError:
         # Game parent process terminated so exit
         debug_write("Got EOF, parent game process must have died, exiting for cleanup")
         exit()
-    if ret == "":
+    if ret == b"":
         # Happens if parent game process dies, so exit for cleanup, 
         # Don't change or starter-algo process won't exit even though the game has closed
         debug_write("Got EOF, parent game process must have died, exiting for cleanup")
         exit()
     return ret
 
+def get_command():
+    """Gets input from stdin
+
+    """
+    return get_command_bytes().decode("utf-8")
+
 def send_command(cmd):
     """Sends your turn to standard output.
     Should usually only be called by 'GameState.submit_turn()'
 
     """
-    sys.stdout.write(cmd.strip() + "\n")
+    send_commands(cmd)
+
+def send_commands(*cmds):
+    """Sends several lines to standard output with a single write and flush.
+    Should usually only be called by 'GameState.submit_turn()'
+
+    """
+    sys.stdout.write("".join(cmd.strip() + "\n" for cmd in cmds))
     sys.stdout.flush()
 
 def debug_write(*msg):
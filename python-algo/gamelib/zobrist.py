@@ -0,0 +1,126 @@
+"""
+Zobrist hashing of structure layouts, and a bounded transposition table keyed on it.
+
+GameMap keeps a 64-bit hash of its structures up to date as units are added, removed,
+upgraded or flagged for removal, see GameMap.zobrist_hash. The random keys behind the
+hash are derived from the unit types in the config rather than from python's hash
+seed, so the same layout hashes to the same value in every process.
+"""
+import hashlib
+import random
+from collections import OrderedDict
+
+ARENA_SIZE = 28
+
+_keys_by_seed = {}
+
+
+class ZobristKeys:
+    """The random keys for one config
+
+    Attributes :
+        * type_index (dict): Maps a structure's shorthand to its index in config["unitInformation"]
+        * structure (list): structure[player_index][type_index][x * 28 + y] is the key of that structure on that tile
+        * upgraded (list): upgraded[x * 28 + y] is xored in when the structure on that tile is upgraded
+        * pending_removal (list): pending_removal[x * 28 + y] is xored in when the structure on that tile is flagged for removal
+
+    """
+    def __init__(self, shorthands, seed):
+        rng = random.Random(seed)
+        tiles = ARENA_SIZE * ARENA_SIZE
+        self.type_index = {shorthand: i for i, shorthand in enumerate(shorthands)}
+        self.structure = [[[rng.getrandbits(64) for _ in range(tiles)] for _ in shorthands] for _ in range(2)]
+        self.upgraded = [rng.getrandbits(64) for _ in range(tiles)]
+        self.pending_removal = [rng.getrandbits(64) for _ in range(tiles)]
+
+    def unit_key(self, unit, x, y):
+        """The hash contribution of a unit standing at x, y. Mobile units do not contribute.
+        """
+        if not unit.stationary:
+            return 0
+        tile = x * ARENA_SIZE + y
+        key = self.structure[1 if unit.player_index == 1 else 0][self.type_index[unit.unit_type]][tile]
+        if unit.upgraded:
+            key ^= self.upgraded[tile]
+        if unit.pending_removal:
+            key ^= self.pending_removal[tile]
+        return key
+
+
+def zobrist_keys(config):
+    """Gets the keys for a config. Configs with the same structure types share the same keys.
+
+    Args:
+        config: The game config
+
+    Returns:
+        A ZobristKeys object
+
+    """
+    shorthands = tuple(unit["shorthand"] for unit in config["unitInformation"][:3])
+    seed = int.from_bytes(hashlib.sha256("|".join(shorthands).encode()).digest()[:8], "little")
+    if seed not in _keys_by_seed:
+        _keys_by_seed[seed] = ZobristKeys(shorthands, seed)
+    return _keys_by_seed[seed]
+
+
+class TranspositionTable:
+    """A bounded cache for results computed on a layout, evicting the least recently used entry when full
+
+    Keys are usually game_map.zobrist_hash, or a tuple of it and whatever else the result depends on,
+    for example (game_map.zobrist_hash, start_location) for a path.
+
+    Attributes :
+        * max_entries (int): The number of entries kept before the oldest are evicted
+        * hits (int): The number of lookups that found an entry
+        * misses (int): The number of lookups that did not
+
+    """
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.__entries = OrderedDict()
+
+    def get(self, key, default=None):
+        """Looks up a stored result
+
+        Args:
+            key: The key the result was stored with
+            default: Returned if there is no entry for the key
+
+        """
+        try:
+            value = self.__entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.__entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Stores a result, evicting the least recently used entry if the table is full
+        """
+        self.__entries[key] = value
+        self.__entries.move_to_end(key)
+        if len(self.__entries) > self.max_entries:
+            self.__entries.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        """Returns the stored result for key, calling compute() and storing its result on a miss
+        """
+        value = self.get(key, self)
+        if value is self:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        self.__entries.clear()
+
+    def __contains__(self, key):
+        return key in self.__entries
+
+    def __len__(self):
+        return len(self.__entries)
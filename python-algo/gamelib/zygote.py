@@ -0,0 +1,265 @@
+"""
+A warm algo server for local arenas.
+
+Every game normally starts a new Python interpreter, which then imports gamelib and your
+strategy before it can read the first message, often a few hundred milliseconds. The zygote
+does that once and then waits for games. For each game run.sh, still a plain bash script, writes
+its process id to the zygote's request pipe and waits. The zygote forks a child, which opens the
+same stdin, stdout and stderr as run.sh through /proc and plays the game on them. It answers
+"started" to run.sh right away and the child's exit code when the game is over. A game then
+starts in a few milliseconds. If no "started" comes within $ZYGOTE_TIMEOUT seconds (2 by default),
+run.sh plays the game itself.
+
+Start it from the algo directory and leave it running while you play games:
+    python3 -m gamelib.zygote
+
+run.sh uses the zygote while it is running and starts the algo normally otherwise, so the same
+algo still works everywhere else. Restart the zygote after changing your code, since it keeps the
+version it imported. It needs /proc, so it only works on Linux.
+"""
+import importlib
+import io
+import os
+import random
+import selectors
+import signal
+import sys
+import traceback
+
+# The directory next to run.sh holding the request pipe, the zygote's pid and a reply pipe per game
+ZYGOTE_DIR = ".zygote"
+# The exit code run.sh reports if the zygote goes away without one
+LOST_EXIT_CODE = 70
+# run.sh copies its stdin, stdout and stderr to these descriptors, which its own redirections leave alone
+STREAM_FDS = (5, 6, 7)
+
+
+def _open_streams(pid):
+    """Opens the stdin, stdout and stderr of run.sh, which works for the pipes the engine uses
+    """
+    return [os.open("/proc/{}/fd/{}".format(pid, fd), flags) for fd, flags in
+            zip(STREAM_FDS, (os.O_RDONLY, os.O_WRONLY | os.O_APPEND, os.O_WRONLY | os.O_APPEND))]
+
+
+def _read_environment(pid):
+    with open("/proc/{}/environ".format(pid), "rb") as environ:
+        entries = environ.read().split(b"\0")
+    return dict(entry.decode("utf-8", "replace").split("=", 1) for entry in entries if b"=" in entry)
+
+
+def _play(strategy, streams, environment, cwd):
+    """Runs in the forked child: plays one game on the streams of run.sh, as if started by it
+    """
+    for target, fd in enumerate(streams):
+        os.dup2(fd, target)
+        os.close(fd)
+    os.environ.clear()
+    os.environ.update(environment)
+    os.chdir(cwd)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    # New stream objects on the new descriptors, the zygote's may hold buffered data or have been replaced.
+    # Line buffered like python -u, the engine reads the turns as they are written.
+    sys.stdin = io.TextIOWrapper(open(0, "rb", closefd=False))
+    sys.stdout = io.TextIOWrapper(open(1, "wb", buffering=0, closefd=False), line_buffering=True, write_through=True)
+    sys.stderr = io.TextIOWrapper(open(2, "wb", buffering=0, closefd=False), line_buffering=True, write_through=True)
+    # Children would all share the zygote's random state otherwise
+    random.seed()
+    code = 0
+    try:
+        strategy().start()
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    finally:
+        for stream in (sys.stdout, sys.stderr):
+            try:
+                stream.flush()
+            except (OSError, ValueError):
+                pass
+    return code
+
+
+class Zygote:
+    """Forks a child playing one game for each process id written to its request pipe
+
+    Attributes :
+        * strategy (class): The AlgoCore subclass the children play with
+        * directory (string): Where the request pipe, the pid file and the reply pipes are
+        * games (dict): For each running child, the (run.sh pid, reply pipe fd) of its game
+
+    """
+    def __init__(self, strategy, directory):
+        self.strategy = strategy
+        self.directory = directory
+        self.games = {}
+        self.__selector = selectors.DefaultSelector()
+        self.__requests = None
+        self.__buffer = b""
+        # Children and run.sh processes are watched with pidfds where Python and Linux have them, polled otherwise
+        self.__pidfds = hasattr(os, "pidfd_open")
+
+    def start(self):
+        """Creates the request pipe and starts accepting games
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, "requests")
+        if not os.path.exists(path):
+            os.mkfifo(path)
+        # Opened for writing too, so the pipe never reports end of file between games
+        self.__requests = os.open(path, os.O_RDWR | os.O_NONBLOCK)
+        self.__selector.register(self.__requests, selectors.EVENT_READ, ("request", None))
+        # run.sh compares the command line with that of the process, in case the pid now belongs to another
+        with open("/proc/self/cmdline", "rb") as cmdline:
+            command = cmdline.read().replace(b"\0", b" ").decode("utf-8", "replace")
+        with open(os.path.join(self.directory, "pid"), "w") as pid_file:
+            pid_file.write("{}\n{}\n".format(os.getpid(), command))
+
+    def stop(self):
+        """Stops every running game and removes the pid file, so run.sh no longer uses the zygote
+        """
+        pid_path = os.path.join(self.directory, "pid")
+        if os.path.exists(pid_path):
+            os.remove(pid_path)
+        for child in list(self.games):
+            os.kill(child, signal.SIGKILL)
+            os.waitpid(child, 0)
+            self.__finish(child, LOST_EXIT_CODE)
+        self.__selector.close()
+        if self.__requests is not None:
+            os.close(self.__requests)
+            self.__requests = None
+
+    def serve(self):
+        """Handles requests and finished games until interrupted
+        """
+        while True:
+            self.poll(None if self.__pidfds else 0.05)
+
+    def poll(self, timeout=0):
+        """Handles whatever happened within timeout seconds
+        """
+        for key, events in self.__selector.select(timeout):
+            kind, child = key.data
+            if kind == "request":
+                self.__read_requests()
+            elif kind == "caller":
+                # run.sh was killed, for example by the engine, so the game is over
+                os.kill(child, signal.SIGKILL)
+        if not self.__pidfds:
+            for child, (caller, reply) in list(self.games.items()):
+                if not os.path.exists("/proc/{}".format(caller)):
+                    os.kill(child, signal.SIGKILL)
+        # Only the games' own children are waited on, the process may have others
+        for child in list(self.games):
+            pid, status = os.waitpid(child, os.WNOHANG)
+            if pid == child:
+                self.__finish(child, os.waitstatus_to_exitcode(status))
+
+    def __read_requests(self):
+        try:
+            self.__buffer += os.read(self.__requests, 1 << 16)
+        except BlockingIOError:
+            return
+        *lines, self.__buffer = self.__buffer.split(b"\n")
+        for line in lines:
+            if line.strip().isdigit():
+                self.__start_game(int(line))
+
+    def __start_game(self, caller):
+        try:
+            reply = os.open(os.path.join(self.directory, str(caller)), os.O_RDWR | os.O_NONBLOCK)
+        except OSError:
+            return
+        try:
+            streams = _open_streams(caller)
+            environment = _read_environment(caller)
+            cwd = os.readlink("/proc/{}/cwd".format(caller))
+            caller_fd = os.pidfd_open(caller) if self.__pidfds else None
+        except OSError as e:
+            # Anything but "started" makes run.sh play the game itself
+            sys.stderr.write("Could not start a game for process {}: {}\n".format(caller, e))
+            os.write(reply, b"%d\n" % LOST_EXIT_CODE)
+            os.close(reply)
+            return
+        sys.stdout.flush()
+        sys.stderr.flush()
+        child = os.fork()
+        if child == 0:
+            code = 1
+            try:
+                self.__close_in_child(reply, caller_fd)
+                code = _play(self.strategy, streams, environment, cwd)
+            finally:
+                os._exit(code)
+        for fd in streams:
+            os.close(fd)
+        os.write(reply, b"started\n")
+        self.games[child] = (caller, reply)
+        if caller_fd is not None:
+            self.__selector.register(caller_fd, selectors.EVENT_READ, ("caller", child))
+            self.__selector.register(os.pidfd_open(child), selectors.EVENT_READ, ("child", child))
+
+    def __close_in_child(self, reply, caller_fd):
+        """A child keeps nothing of the zygote but its own streams
+        """
+        for key in list(self.__selector.get_map().values()):
+            os.close(key.fd)
+        self.__selector.close()
+        for caller, other_reply in self.games.values():
+            os.close(other_reply)
+        os.close(reply)
+        if caller_fd is not None:
+            os.close(caller_fd)
+
+    def __finish(self, child, code):
+        caller, reply = self.games.pop(child)
+        for key in list(self.__selector.get_map().values()):
+            if key.data[1] == child:
+                self.__selector.unregister(key.fd)
+                os.close(key.fd)
+        try:
+            os.write(reply, b"%d\n" % code)
+        except OSError:
+            pass
+        os.close(reply)
+        # run.sh removes its reply pipe itself, unless it was killed
+        try:
+            os.remove(os.path.join(self.directory, str(caller)))
+        except OSError:
+            pass
+
+
+def load_strategy(spec="algo_strategy:AlgoStrategy"):
+    """Imports a strategy class given as "module:Class", from the current directory
+    """
+    module_name, _, class_name = spec.partition(":")
+    if os.getcwd() not in sys.path:
+        sys.path.insert(0, os.getcwd())
+    return getattr(importlib.import_module(module_name), class_name or "AlgoStrategy")
+
+
+def main(arguments):
+    """python3 -m gamelib.zygote [module:Class], run from the algo directory
+    """
+    if not os.path.isdir("/proc/self/fd"):
+        sys.stderr.write("The zygote needs /proc, which this system does not have\n")
+        return 1
+    strategy = load_strategy(*arguments[:1])
+    zygote = Zygote(strategy, os.path.join(os.getcwd(), ZYGOTE_DIR))
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    zygote.start()
+    sys.stderr.write("Zygote for {} waiting for games in {}\n".format(strategy.__name__, zygote.directory))
+    try:
+        zygote.serve()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        zygote.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,4 +1,39 @@
 #!/bin/bash
 
 DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
+# While a zygote (python3 -m gamelib.zygote) is running it plays the game, without starting a new interpreter
+ZYGOTE="$DIR/.zygote"
+
+# Reads a line of the zygote's answer into reply, giving up if the zygote dies or, unless $1 is 0,
+# if nothing of it came within $1 seconds. A read that times out keeps what it read, so nothing is lost.
+read_reply() {
+    local part waited=0
+    reply=
+    until read -t 1 -r part <&8; do
+        reply+=$part
+        kill -0 "$zygote_pid" 2>/dev/null || { reply=; return 1; }
+        waited=$((waited + 1))
+        [ -z "$reply" ] && [ "$1" -gt 0 ] && [ "$waited" -ge "$1" ] && return 1
+    done
+    reply+=$part
+}
+
+# The pid file also holds the zygote's command line, so a process that got the pid of a zygote that died is not taken for it
+if [ -p "$ZYGOTE/requests" ] && { read -r zygote_pid && IFS= read -r zygote_cmdline; } < "$ZYGOTE/pid" 2>/dev/null \
+        && [ "$(tr '\0' ' ' < "/proc/$zygote_pid/cmdline" 2>/dev/null)" = "$zygote_cmdline" ] \
+        && mkfifo "$ZYGOTE/$$" 2>/dev/null; then
+    # The game's pipes, where the zygote finds them however the lines below redirect stdin and stdout.
+    # The reply pipe is opened for reading and writing, so opening it never waits for the zygote.
+    exec 5<&0 6>&1 7>&2 8<>"$ZYGOTE/$$"
+    echo $$ > "$ZYGOTE/requests"
+    # The zygote answers "started" once its child has the game, and the child's exit code when it is over
+    if read_reply "${ZYGOTE_TIMEOUT:-2}" && [ "$reply" = "started" ]; then
+        read_reply 0
+        rm -f "$ZYGOTE/$$"
+        exit "${reply:-70}"
+    fi
+    # Without its reply pipe the zygote can no longer take the game, so it is safe to play it here
+    rm -f "$ZYGOTE/$$"
+    exec 5<&- 6>&- 7>&- 8<&-
+fi
 ${PYTHON_CMD:-python3} -u "$DIR/algo_strategy.py"
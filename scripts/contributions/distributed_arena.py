@@ -0,0 +1,349 @@
+#!/usr/bin/env python
+
+'''
+------------------------------------------------------------------------------------------------
+Copyright: CC0 - completely open to edit, share, etc
+
+Short Description:
+This is a python script to spread the matches of run_arena.py over several computers.
+One coordinator hands out matches, and any number of workers run them and send back the results.
+------------------------------------------------------------------------------------------------
+
+README:
+
+This program assumes this file is in the contributions/scripts directory, next to run_arena.py
+
+Every worker needs its own copy of this repository with engine.jar, game-configs.json and the
+same algos in the algos directory (a shared network drive or a git checkout both work).
+
+Start the coordinator with the matches to play, chosen the same way as in run_arena.py:
+>py scripts/contributions/distributed_arena.py coordinator -a
+>py scripts/contributions/distributed_arena.py coordinator -s algo1 algo2 algo3 --host 0.0.0.0 --port 8765
+
+By default the coordinator only accepts workers from the same computer. Use --host 0.0.0.0 to
+accept workers from other computers on your network. There is no authentication, so only do
+this on a network you trust.
+
+Then start a worker on each computer, pointing at the coordinator:
+>py scripts/contributions/distributed_arena.py worker 192.168.1.20:8765 -b 8
+
+-b is the number of games the worker runs at a time, the number of CPU cores by default.
+Several workers on the same computer are fine, which is also an easy way to try this out:
+>py scripts/contributions/distributed_arena.py coordinator -s algo1 algo2 algo3 &
+>py scripts/contributions/distributed_arena.py worker localhost:8765 -b 2 &
+>py scripts/contributions/distributed_arena.py worker localhost:8765 -b 2
+
+Each game runs in its own directory, so games running at the same time never mix up their replays.
+Workers send back the replay and a short summary (winner and number of turns) of every match.
+The coordinator saves the replays in the replays directory (change it with -r) as
+<match number>_<algo1>_vs_<algo2>.replay, and prints the winner of each match as it comes in.
+Use --summary-only on a worker to only send back the summaries.
+
+Finished matches are added to the same results file as run_arena.py (arena_results.jsonl in the
+repository root, change it with --results), so its standings count them, and matches the same
+versions of both algos already played are skipped. Use --fresh to play everything again.
+
+A match that a worker has not finished after --timeout seconds (30 minutes by default), for
+example because the worker was stopped, is handed out again to the next worker that asks.
+
+The protocol is one line of JSON sent by the worker and one line of JSON answered by the
+coordinator per connection:
+	{"type": "request"}                          ->  {"type": "job", "id": 3, "algo1": "a", "algo2": "b"}
+	                                                 {"type": "wait", "seconds": 1} (nothing to hand out yet)
+	                                                 {"type": "done"} (every match is finished)
+	{"type": "result", "id": 3, "returncode": 0,
+	 "summary": {...}, "replay": "..."}           ->  {"type": "ack"}
+
+A worker that cannot run a match at all (java missing, a broken algo directory) answers at once with
+"error" set in its result, instead of leaving the match to time out. Such a match is handed out again,
+and recorded as failed after 3 attempts.
+'''
+
+import sys
+try:
+	import os
+	import json
+	import time
+	import shutil
+	import socket
+	import argparse
+	import threading
+	import collections
+	import socketserver
+	from run_arena import run_all, run_specific, run_from_file, run_match, get_root_dir, make_game_dir, summarize_replay, ResultsStore, print_standings
+except ImportError as e:
+	print("WARNING: Module not found, full error:\n")
+	print(str(e))
+	sys.exit()
+
+
+DEFAULT_PORT = 8765
+# The returncode of a match a worker could not start
+FAILED_RETURNCODE = -1
+# How often a match that failed to start is handed out again before it is recorded as failed
+MAX_ATTEMPTS = 3
+
+# Sends one JSON message and reads the answer
+def send_message(address, message, timeout=60):
+	with socket.create_connection(address, timeout=timeout) as connection:
+		connection.sendall(json.dumps(message).encode('utf-8') + b'\n')
+		reader = connection.makefile('rb')
+		line = reader.readline()
+	if not line:
+		raise ConnectionError('Coordinator closed the connection')
+	return json.loads(line)
+
+# Hands out matches and collects their results
+# With a results store, every finished match is also added to it, like the matches of run_arena.py
+class Coordinator:
+	def __init__(self, matches, replay_dir, timeout, store=None):
+		self.matches = list(matches)
+		self.replay_dir = replay_dir
+		self.timeout = timeout
+		self.store = store
+		self.pending = collections.deque(range(len(self.matches)))
+		self.leased = {}
+		self.results = {}
+		self.failures = collections.Counter()
+		self.finished = threading.Event()
+		self.lock = threading.Lock()
+		self.start_time = time.time()
+		if len(self.matches) == 0:
+			self.finished.set()
+
+	# Matches whose worker took too long go back to the front of the queue
+	def requeue_expired(self):
+		now = time.time()
+		for match_id, deadline in list(self.leased.items()):
+			if deadline < now:
+				del self.leased[match_id]
+				self.pending.appendleft(match_id)
+				print ('Match {} timed out, handing it out again'.format(match_id))
+
+	def handle(self, message):
+		with self.lock:
+			if message.get('type') == 'request':
+				self.requeue_expired()
+				if self.pending:
+					match_id = self.pending.popleft()
+					self.leased[match_id] = time.time() + self.timeout
+					algo1, algo2 = self.matches[match_id]
+					return {'type': 'job', 'id': match_id, 'algo1': algo1, 'algo2': algo2}
+				if self.finished.is_set():
+					return {'type': 'done'}
+				return {'type': 'wait', 'seconds': 1}
+			if message.get('type') == 'result':
+				self.record(message)
+				return {'type': 'ack'}
+		return {'type': 'error', 'message': 'Unknown message type {}'.format(message.get('type'))}
+
+	def record(self, message):
+		match_id = message['id']
+		if match_id in self.results or not 0 <= match_id < len(self.matches):
+			return
+		self.leased.pop(match_id, None)
+		if match_id in self.pending:
+			self.pending.remove(match_id)
+		algo1, algo2 = self.matches[match_id]
+		if message.get('error'):
+			self.failures[match_id] += 1
+			if self.failures[match_id] < MAX_ATTEMPTS:
+				self.pending.append(match_id)
+				print ('Match {} ({} vs {}) could not be run: {}, handing it out again'.format(match_id, algo1, algo2, message['error']))
+				return
+			print ('Match {} ({} vs {}) could not be run {} times, giving up: {}'.format(match_id, algo1, algo2, MAX_ATTEMPTS, message['error']))
+		summary = message.get('summary') or {}
+		if message.get('error'):
+			summary['error'] = message['error']
+		self.results[match_id] = summary
+		path = None
+		if message.get('replay'):
+			os.makedirs(self.replay_dir, exist_ok=True)
+			path = os.path.join(self.replay_dir, '{:04d}_{}_vs_{}.replay'.format(match_id, algo1, algo2))
+			with open(path, 'w') as replay:
+				replay.write(message['replay'])
+		# Matches that could not be run are left out, so the next run plays them
+		if self.store is not None and not message.get('error'):
+			self.store.add(algo1, algo2, None, dict(summary, returncode=message.get('returncode'), replay=path))
+
+		winner = {1: algo1, 2: algo2}.get(summary.get('winner'), 'unknown')
+		minutes = (time.time() - self.start_time) / 60
+		print ('{}/{} {} vs {}: winner {} ({} turns, engine exit code {}) - {:.1f} matches per minute'.format(
+			len(self.results), len(self.matches), algo1, algo2, winner, summary.get('turns'), message.get('returncode'),
+			len(self.results) / minutes if minutes > 0 else 0))
+		if len(self.results) == len(self.matches):
+			self.finished.set()
+
+
+class CoordinatorServer(socketserver.ThreadingTCPServer):
+	allow_reuse_address = True
+	daemon_threads = True
+
+
+class CoordinatorHandler(socketserver.StreamRequestHandler):
+	def handle(self):
+		line = self.rfile.readline()
+		if not line:
+			return
+		try:
+			answer = self.server.coordinator.handle(json.loads(line))
+		except (ValueError, KeyError, TypeError) as e:
+			answer = {'type': 'error', 'message': str(e)}
+		self.wfile.write(json.dumps(answer).encode('utf-8') + b'\n')
+
+
+# With a results store, matches the same versions of both algos already played are skipped
+def run_coordinator(matches, host, port, replay_dir, timeout, store=None):
+	all_matches = list(matches)
+	matches = all_matches
+	if store is not None:
+		matches = [match for match in all_matches if store.get(match[0], match[1]) is None]
+		if len(matches) < len(all_matches):
+			print ('Skipping {} matches already played by the same versions of both algos'.format(len(all_matches) - len(matches)))
+	coordinator = Coordinator(matches, replay_dir, timeout, store)
+	server = CoordinatorServer((host, port), CoordinatorHandler)
+	server.coordinator = coordinator
+	thread = threading.Thread(target=server.serve_forever, daemon=True)
+	thread.start()
+	print ('Coordinating {} matches on {}:{}'.format(len(coordinator.matches), host, port))
+	try:
+		while not coordinator.finished.wait(1):
+			pass
+		# Give the workers a moment to hear that everything is done
+		time.sleep(2)
+	finally:
+		server.shutdown()
+		server.server_close()
+	minutes = (time.time() - coordinator.start_time) / 60
+	print ()
+	print ('Finished all matches! {} matches in {:.1f} minutes'.format(len(coordinator.results), minutes))
+	print ()
+	if store is not None:
+		print_standings(all_matches, store, 'Standings, including matches played in earlier runs:' if len(matches) < len(all_matches) else 'Standings:')
+	return coordinator.results
+
+
+# Runs one match and returns the result message for the coordinator.
+# A match that could not be run at all, for example because java is missing, is sent back as failed right away
+def play(job, root_dir, log_dir, summary_only):
+	algo1 = os.path.join(root_dir, 'algos', job['algo1'])
+	algo2 = os.path.join(root_dir, 'algos', job['algo2'])
+	log_path = os.path.join(log_dir, '{:04d}_{}_vs_{}.log'.format(job['id'], job['algo1'], job['algo2']))
+	game_dir = None
+	try:
+		game_dir = make_game_dir(root_dir)
+		result = run_match(algo1, algo2, 0, log_path, game_dir)
+		replay = result.replay.read_text() if result.replay is not None else ''
+	except Exception as e:
+		print ('Could not run match {} ({} vs {}): {}'.format(job['id'], job['algo1'], job['algo2'], e))
+		return {
+			'type': 'result',
+			'id': job['id'],
+			'returncode': FAILED_RETURNCODE,
+			'error': '{}: {}'.format(type(e).__name__, e),
+			'summary': {},
+			'replay': '',
+		}
+	finally:
+		if game_dir is not None:
+			shutil.rmtree(game_dir, ignore_errors=True)
+	return {
+		'type': 'result',
+		'id': job['id'],
+		'returncode': result.returncode,
+		'summary': summarize_replay(replay),
+		'replay': '' if summary_only else replay,
+	}
+
+# Asks for matches until the coordinator is done or gone
+def worker_loop(address, root_dir, log_dir, summary_only):
+	failures = 0
+	while True:
+		try:
+			answer = send_message(address, {'type': 'request'})
+			failures = 0
+		except OSError:
+			failures += 1
+			if failures >= 5:
+				return
+			time.sleep(1)
+			continue
+		if answer['type'] == 'done':
+			return
+		if answer['type'] == 'wait':
+			time.sleep(answer.get('seconds', 1))
+			continue
+		if answer['type'] != 'job':
+			print ('Unexpected answer from the coordinator: {}'.format(answer))
+			return
+		result = play(answer, root_dir, log_dir, summary_only)
+		for attempt in range(5):
+			try:
+				send_message(address, result)
+				break
+			except OSError:
+				time.sleep(1)
+
+def run_worker(address, batch_size, log_dir, summary_only):
+	root_dir = get_root_dir()
+	batch_size = batch_size or os.cpu_count() or 1
+	log_dir = log_dir or os.path.join(root_dir, 'arena_logs')
+	os.makedirs(log_dir, exist_ok=True)
+	print ('Running {} games at a time for {}:{}'.format(batch_size, address[0], address[1]))
+	threads = [threading.Thread(target=worker_loop, args=(address, root_dir, log_dir, summary_only), daemon=True) for _ in range(batch_size)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	print ('Coordinator has no more matches, stopping')
+
+def parse_address(text):
+	host, _, port = text.rpartition(':')
+	if not host:
+		return (text, DEFAULT_PORT)
+	return (host, int(port))
+
+# handles all the arguments
+def parse_args():
+	ap = argparse.ArgumentParser(add_help=False, formatter_class=argparse.RawTextHelpFormatter)
+	ap.add_argument('-h', '--help', action='help', help='show this help message and exit\n\n')
+	modes = ap.add_subparsers(dest='mode')
+
+	coordinator = modes.add_parser('coordinator', help='hand out matches to workers\n\n')
+	coordinator.add_argument("-a", "--all", action='store_true', help="run every combination of all algos in the directory")
+	coordinator.add_argument("-s", "--specific", nargs='*', default=[], help="run every combination of algos added")
+	coordinator.add_argument("-f", "--file", default='', help="run every combination of algos in a specified file")
+	coordinator.add_argument("--host", default='127.0.0.1', help="address to listen on, 0.0.0.0 to accept workers from other computers")
+	coordinator.add_argument("--port", type=int, default=DEFAULT_PORT, help="port to listen on")
+	coordinator.add_argument("-r", "--replays", default=None, help="directory to save replays in, defaults to replays in the repository root")
+	coordinator.add_argument("--timeout", type=float, default=30 * 60, help="seconds before an unfinished match is handed out again")
+	coordinator.add_argument("--results", default=None, help="file remembering the results of earlier runs, shared with run_arena.py, defaults to arena_results.jsonl in the repository root")
+	coordinator.add_argument("--fresh", action='store_true', help="play every match again, even if the same versions of both algos already played it")
+
+	worker = modes.add_parser('worker', help='run matches for a coordinator\n\n')
+	worker.add_argument("address", help="host:port of the coordinator")
+	worker.add_argument("-b", "--batch", type=int, default=None, help="number of games to run at a single time, defaults to the number of CPU cores")
+	worker.add_argument("-l", "--logs", default=None, help="directory for the output of each game, defaults to arena_logs in the repository root")
+	worker.add_argument("--summary-only", action='store_true', help="only send back the winner and number of turns, not the replay")
+	return vars(ap.parse_args())
+
+if __name__ == '__main__':
+	args = parse_args() # get command line arguments
+
+	if args['mode'] == 'worker':
+		run_worker(parse_address(args['address']), args['batch'], args['logs'], args['summary_only'])
+	elif args['mode'] == 'coordinator':
+		if args['all']:
+			matches = run_all()
+		elif len(args['specific']) > 0:
+			matches = run_specific(args['specific'])
+		elif args['file'] != '':
+			matches = run_from_file(args['file'])
+		else:
+			print ('No algos given - no action taken')
+			sys.exit()
+		replay_dir = args['replays'] or os.path.join(get_root_dir(), 'replays')
+		store = ResultsStore(args['results'] or os.path.join(get_root_dir(), 'arena_results.jsonl'), load=not args['fresh'])
+		run_coordinator(matches, args['host'], args['port'], replay_dir, args['timeout'], store)
+	else:
+		print ('Choose coordinator or worker, see -h')
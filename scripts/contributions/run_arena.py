@@ -16,8 +16,11 @@ README:
 
 This program assumes this file is in the contributions/scripts directory
 
-This program was originally built to run matches repeatedly, but I modified it since games are
-mostly deterministic per comments of @n-sanders. If you want the original (PowerShell) code you can see it here:
+By default each pairing plays one game, which is only enough when both algos play the same way
+every time. Algos that use random numbers can win one game and lose the next, so compare them
+with -n (see below): each pairing is played up to n times with different seeds, and stops early
+once its win rate is settled, after at least --min-games decisive games. The original
+(PowerShell) code, which also ran matches repeatedly, is here:
 https://forum.c1games.com/t/running-multiple-games/225
 
 This script takes an input of algos and runs them in an arena format, matching each against
@@ -49,23 +52,74 @@ algo3
 ...
 
 
-Lastly, the final argument you can (and should) in combination with each of these
-is -b, for batch_size. This controls how many games can run at one time to keep
-this from melting your computer. The default is 5.
+Lastly, you can combine each of these with -b, for batch_size. This controls how many games
+can run at one time. Matches wait in a queue and a fixed pool of workers takes the next one as
+soon as a game finishes, so the computer stays busy without being overloaded. The default is
+the number of CPU cores.
 
 For example:
 >py scripts/contributions/run_arena.py -a -b 6
 
 This would run every single game like before, but 6 games at a time.
 
-DO NOT RUN WITH A LARGE BATCH SIZE (like >15, depending on your computer) or else it will take forever and crash.
-
-
-At the end I also run the get_results.py script that outputs some data. I recommend having
-matplotlib installed for graphs, etc.
-
-You can do much more with the get_results.py script that is not shown here and I plan
-on expanding its capabilities.
+Too many games at once do more than slow the arena down: algos that search until a time budget
+runs out search less, and algos close to the turn time limit start taking damage or skipping
+turns, which changes who wins. With --adaptive, -b is only the most games at a time, and the
+arena adjusts the number of games as it goes:
+>py scripts/contributions/run_arena.py -a -b 16 --adaptive
+It starts with half of -b, and after each match it runs one game fewer when:
+- the load of the computer is above its number of CPU cores, or less than 10% of memory is free.
+- an algo took more than --time-margin (0.5 by default) of the soft turn time limit from
+  game-configs.json per turn on average, or was hit for taking too long.
+- an algo took more than 1.5 times longer per turn than in its fastest game so far (and 50ms more).
+Otherwise, while every slot is busy, it runs one game more. Changes are printed as they happen.
+
+The output of each game engine goes to its own file in the arena_logs directory (change it
+with -l), named after the match, instead of being kept in memory. Progress is printed as
+matches finish, along with the throughput in matches per minute.
+
+Games are not always deterministic, algos often use random numbers (the starter algo does).
+To measure how often one algo really beats another, play each pairing several times with -n:
+>py scripts/contributions/run_arena.py -s algo1 algo2 algo3 -n 30
+
+Each repetition k of a pairing sets the ALGO_SEED environment variable to --seed + k (0 + k by
+default) for both algos, so a run can be repeated exactly. The starter algo seeds random with
+ALGO_SEED when it is set; do the same in your own algos. Replays are saved as
+replays/<algo1>_vs_<algo2>_seed<seed>.replay and each pairing gets a win rate with a Wilson
+confidence interval (--confidence, 0.95 by default). A pairing stops being scheduled as soon as
+the interval no longer contains 50%, after at least --min-games decisive games, so no time is
+spent confirming obvious results.
+
+Results are remembered between runs in arena_results.jsonl (change it with -r), keyed by a hash
+of the contents of both algo directories, the engine and game-configs.json, and the seed. A game
+whose algos have not changed since it was last played is not played again, and its old result is
+counted with the new ones. After changing one algo out of 30, only its 29 pairings are played.
+Use --fresh to play everything again.
+
+Every match starts a new Java virtual machine for the engine and a new process for each algo,
+which can take longer than a fast game itself. The engine only plays one game per process, so
+it cannot be kept running between matches, but two things help:
+- with more than one game at a time (-b), the next match starts while the others play, so the
+  startup of one game overlaps with the play of the others.
+- --jvm-cache records the classes the engine loads into a class data archive during the first
+  game (arena_engine_<hash>.jsa in the repository root) and lets every later game load them
+  from it, which cuts the engine's startup. This needs Java 13 or newer and is skipped otherwise.
+At the end the startup overhead of each match (its wall time minus the game time the engine
+reports in the replay) is printed separately from the game time, so you can see how much of
+the arena's time goes to starting processes.
+
+
+As each match finishes, its result is read from the end of its replay (the endStats line and
+the last frame) and appended to arena_results.jsonl, one JSON object per match:
+{"algo1": ..., "algo2": ..., "seed": ..., "winner": 1, "turns": 42, "duration": 11446,
+ "health": [30.0, 0.0], "points_scored": [30.0, 0.0], "computation_time": [58238, 103],
+ "crashed": [false, false], "timeout_death": [false, false], "replay": ".../replays/....replay", ...}
+At the end the standings are printed from these records, counting every stored game of each
+pairing whatever its seed, with the wins, average health left and average computation time of
+each algo. To print them again without playing anything:
+>py scripts/contributions/run_arena.py -a --standings
+
+For a closer look at single games, like graphs of every turn, use the get_results.py script.
 
 If you have questions just ask me on the forums - @Isaac
 '''
@@ -77,70 +131,285 @@ try:
 	import argparse
 	import itertools
 	import time
-	import copy
-	import multiprocessing as mp
+	import json
+	import math
+	import shutil
+	import tempfile
+	import hashlib
+	import collections
+	import threading
+	import statistics
+	from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+	sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir))
+	import match_launch
 except ImportError as e:
 	print("WARNING: Module not found, full error:\n")
 	print(str(e))
 	sys.exit()
 
 
-# Runs a single game
-def run_single_game(process_command, algo1, algo2, max_name_len):
-	p = subprocess.Popen(
-		process_command,
-		shell=True,
-		stdout=subprocess.PIPE,
-		stderr=subprocess.PIPE
-		)
-	output, error = p.communicate()
-	# daemon necessary so game shuts down if this script is shut down by user
-	p.daemon = 1
-	p.wait()
-	print("{: <30}{: <{fill}}   vs   {}".format('Finished running match:', algo1, algo2, fill=str(max_name_len)))
-
-	# print (''.join(['{}\n'.format(x) for x in str(output).split('\\r\\n')])[1:])
-	if str(error) != "b''":
-		print ('Error with match - {} {}:\n\tError:\n{}'.format(algo1, algo2, error))
-
-def run_match(arg1='', arg2='', max_name_len=0):
-	# Get location of this run file
-	file_dir = os.path.dirname(os.path.realpath(__file__)).replace('\\contributions', '')
-	parent_dir = os.path.join(file_dir, os.pardir)
-	parent_dir = os.path.abspath(parent_dir)
-
-	# Get if running in windows OS
-	is_windows = sys.platform.startswith('win')
+# The root of the repository, where engine.jar is
+def get_root_dir():
+	return os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir, os.pardir))
 
+# cwd is where the engine runs and writes its replays, the repository root by default
+# seed is passed to both algos in the ALGO_SEED environment variable, java_options to the JVM running the engine
+# Streams the engine's output into log_path and returns the match_launch.MatchResult of the game
+def run_match(arg1='', arg2='', max_name_len=0, log_path=os.devnull, cwd=None, seed=None, java_options=()):
 	# Set default path for algos if script is run with no params
-	default_algo = parent_dir + "\\algos\\starter-algo-ZIPME\\run.ps1" if is_windows else parent_dir + "/algos/starter-algo-ZIPME/run.sh" 
-	algo1 = default_algo
-	algo2 = default_algo
-
-	# If script run with params, use those algo locations when running the game
-	if arg1 != '':
-		algo1 = arg1
-	if arg2 != '':
-		algo2 = arg2
-
-	# If folder path is given instead of run file path, add the run file to the path based on OS
-	# trailing_char deals with if there is a trailing \ or / or not after the directory name
-	if is_windows:
-		if "run.ps1" not in algo1:
-			trailing_char = "" if algo1.endswith("\\") else "\\"
-			algo1 = algo1 + trailing_char + "run.ps1"
-		if "run.ps1" not in algo2:
-			trailing_char = "" if algo2.endswith("\\") else "\\"
-			algo2 = algo2 + trailing_char + "run.ps1"
+	default_algo = os.path.join(get_root_dir(), "algos", "starter-algo-ZIPME")
+	algo1 = arg1 if arg1 != '' else default_algo
+	algo2 = arg2 if arg2 != '' else default_algo
+
+	name1 = match_launch.algo_name(algo1)
+	name2 = match_launch.algo_name(algo2)
+	env = None if seed is None else dict(os.environ, ALGO_SEED=str(seed))
+	print ('{: <30}{: <{fill}}   vs   {}'.format('Starting match:', name1, name2, fill=str(max_name_len)))
+	with open(log_path, 'wb') as log:
+		result = match_launch.run_match(algo1, algo2, cwd, log, subprocess.STDOUT, env, java_options)
+	print("{: <30}{: <{fill}}   vs   {}".format('Finished running match:', name1, name2, fill=str(max_name_len)))
+
+	if result.returncode != 0:
+		print ('Error with match - {} {}: engine exited with code {}, see {}'.format(name1, name2, result.returncode, log_path))
+	return result
+
+# A directory with the engine and its config, where one game can write its replay without seeing any other
+def make_game_dir(root_dir):
+	game_dir = tempfile.mkdtemp(prefix='arena_game_')
+	for name in ('engine.jar', 'game-configs.json'):
+		source = os.path.join(root_dir, name)
+		if not os.path.exists(source):
+			continue
+		try:
+			os.symlink(source, os.path.join(game_dir, name))
+		except (OSError, NotImplementedError):
+			shutil.copy(source, game_dir)
+	return game_dir
+
+# The last count lines of a file, read from its end so a long replay is not read in full
+def read_last_lines(path, count=2, chunk_size=1 << 16):
+	with open(path, 'rb') as replay:
+		replay.seek(0, os.SEEK_END)
+		position = replay.tell()
+		data = b''
+		while position > 0 and data.strip().count(b'\n') < count:
+			step = min(chunk_size, position)
+			position -= step
+			replay.seek(position)
+			data = replay.read(step) + data
+	return [line.decode('utf-8', 'replace') for line in data.strip().split(b'\n')[-count:]]
+
+# Reads the result of a game from the last two lines of its replay: the last frame and the endStats.
+# Per player values are [player 1, player 2] lists.
+def summarize_lines(lines):
+	if not lines:
+		return {}
+	try:
+		end_stats = json.loads(lines[-1]).get('endStats')
+	except ValueError:
+		return {}
+	if not end_stats:
+		return {}
+	players = [end_stats.get('player1', {}), end_stats.get('player2', {})]
+	health = [None, None]
+	if len(lines) > 1:
+		try:
+			last_frame = json.loads(lines[-2])
+			health = [last_frame.get('p1Stats', [None])[0], last_frame.get('p2Stats', [None])[0]]
+		except (ValueError, AttributeError, IndexError):
+			pass
+	return {
+		'winner': end_stats.get('winner'),
+		'turns': end_stats.get('turns'),
+		'duration': end_stats.get('duration'),
+		'player1': players[0].get('name'),
+		'player2': players[1].get('name'),
+		'health': health,
+		'points_scored': [player.get('points_scored') for player in players],
+		'computation_time': [player.get('total_computation_time') for player in players],
+		'crashed': [player.get('crashed') for player in players],
+		'timeout_death': [player.get('timeout_death') for player in players],
+		'time_damage_taken': [player.get('time_damage_taken') for player in players],
+	}
+
+# Reads the result of a game from the text of its replay
+def summarize_replay(replay):
+	return summarize_lines(replay.strip().splitlines()[-2:])
+
+# Plays a match in its own directory, moves the replay to the replays directory and returns its summary.
+# Replays of seeded games are named after the pairing and seed, others keep the name the engine gave them.
+def play_match(name1, name2, seed, max_name_len, log_dir):
+	root_dir = get_root_dir()
+	label = '{}_vs_{}'.format(os.path.basename(name1), os.path.basename(name2))
+	if seed is not None:
+		label += '_seed{}'.format(seed)
+	game_dir = make_game_dir(root_dir)
+	java_options = engine_archive.options() if engine_archive is not None else []
+	try:
+		result = run_match(os.path.join(root_dir, 'algos', name1), os.path.join(root_dir, 'algos', name2),
+			max_name_len, os.path.join(log_dir, label + '.log'), game_dir, seed, java_options)
+		if engine_archive is not None:
+			engine_archive.finished(java_options, result.returncode)
+		summary = {}
+		if result.replay is not None:
+			summary = summarize_lines(read_last_lines(result.replay))
+			replay_dir = os.path.join(root_dir, 'replays')
+			os.makedirs(replay_dir, exist_ok=True)
+			summary['replay'] = os.path.join(replay_dir, label + '.replay' if seed is not None else result.replay.name)
+			shutil.move(str(result.replay), summary['replay'])
+	finally:
+		shutil.rmtree(game_dir, ignore_errors=True)
+	summary['returncode'] = result.returncode
+	summary['seconds'] = result.seconds
+	if summary.get('duration') is not None:
+		summary['overhead'] = max(0, result.seconds - summary['duration'] / 1000)
+	return summary
+
+# A class data archive of the engine's classes, shared by every game after the first
+class ClassDataArchive:
+	def __init__(self, path):
+		self.path = path
+		self.lock = threading.Lock()
+		self.recording = False
+
+	# Java 13 and newer can record an archive when the JVM exits
+	@staticmethod
+	def supported():
+		probe = os.path.join(tempfile.gettempdir(), 'arena_probe_{}.jsa'.format(os.getpid()))
+		try:
+			returncode = subprocess.call(['java', '-XX:ArchiveClassesAtExit=' + probe, '-version'],
+				stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+		except OSError:
+			return False
+		finally:
+			if os.path.exists(probe):
+				os.remove(probe)
+		return returncode == 0
+
+	# JVM options for a game about to start. One game at a time records the archive until it exists.
+	def options(self):
+		with self.lock:
+			if os.path.exists(self.path):
+				return ['-XX:SharedArchiveFile=' + self.path]
+			if self.recording:
+				return []
+			self.recording = True
+			return ['-XX:ArchiveClassesAtExit=' + self.path + '.tmp']
+
+	# The archive is only used once the game recording it is over, so no game reads half of it
+	def finished(self, java_options, returncode):
+		if not any(option.startswith('-XX:ArchiveClassesAtExit') for option in java_options):
+			return
+		with self.lock:
+			if returncode == 0 and os.path.exists(self.path + '.tmp'):
+				os.replace(self.path + '.tmp', self.path)
+			self.recording = False
+
+engine_archive = None
+
+# Turns on --jvm-cache for every game played by this process
+def enable_class_data_sharing():
+	global engine_archive
+	root_dir = get_root_dir()
+	if not ClassDataArchive.supported():
+		print ('This version of Java cannot record class data archives (Java 13 or newer is needed), --jvm-cache is ignored')
+		return
+	engine = os.path.join(root_dir, 'engine.jar')
+	name = 'arena_engine_{}.jsa'.format(hash_contents(engine) if os.path.exists(engine) else 'missing')
+	engine_archive = ClassDataArchive(os.path.join(root_dir, name))
+
+# How much of the time of the matches went to starting the engine and algos rather than to the games
+def print_overhead(summaries):
+	timed = [summary for summary in summaries if summary.get('overhead') is not None]
+	if not timed:
+		return
+	overhead = sum(summary['overhead'] for summary in timed)
+	total = sum(summary['seconds'] for summary in timed)
+	print ('Startup overhead: {:.2f}s per match on average, {:.2f}s of game time, {:.0%} of the time of {} matches'.format(
+		overhead / len(timed), (total - overhead) / len(timed), overhead / total if total > 0 else 0, len(timed)))
+
+# A hash of the contents of a directory or file, ignoring python caches and hidden files
+def hash_contents(path):
+	digest = hashlib.sha256()
+	if os.path.isfile(path):
+		paths = [path]
+		base = os.path.dirname(path)
 	else:
-		if "run.sh" not in algo1:
-			trailing_char = "" if algo1.endswith('/') else "/"
-			algo1 = algo1 + trailing_char + "run.sh"
-		if "run.sh" not in algo2:
-			trailing_char = "" if algo2.endswith('/') else "/"
-			algo2 = algo2 + trailing_char + "run.sh"
-
-	run_single_game("cd {} && java -jar engine.jar work {} {}".format(parent_dir, algo1, algo2), algo1.split('\\')[-2].replace('algos/',''),  algo2.split('\\')[-2].replace('algos/',''), max_name_len)
+		paths = []
+		base = path
+		for dir_path, dir_names, file_names in os.walk(path):
+			dir_names[:] = sorted(name for name in dir_names if name != '__pycache__' and not name.startswith('.'))
+			paths.extend(os.path.join(dir_path, name) for name in sorted(file_names) if not name.endswith('.pyc') and not name.startswith('.'))
+	for file_path in paths:
+		digest.update(os.path.relpath(file_path, base).replace(os.sep, '/').encode('utf-8') + b'\0')
+		with open(file_path, 'rb') as contents:
+			for chunk in iter(lambda: contents.read(1 << 20), b''):
+				digest.update(chunk)
+		digest.update(b'\0')
+	return digest.hexdigest()[:16]
+
+# What is kept of each game's summary in the results file
+RESULT_FIELDS = ('winner', 'turns', 'duration', 'health', 'points_scored', 'computation_time', 'crashed', 'timeout_death',
+	'time_damage_taken', 'returncode', 'replay')
+
+# Results of previous games, one JSON object per line, keyed by what was played.
+# With load False earlier results are ignored, but new ones are still added to the file.
+class ResultsStore:
+	def __init__(self, path, load=True):
+		self.path = path
+		self.results = {}
+		self.lock = threading.Lock()
+		self.hashes = {}
+		root_dir = get_root_dir()
+		self.engine = hash_contents(os.path.join(root_dir, 'engine.jar')) if os.path.exists(os.path.join(root_dir, 'engine.jar')) else ''
+		configs = os.path.join(root_dir, 'game-configs.json')
+		self.engine += hash_contents(configs) if os.path.exists(configs) else ''
+		if load and os.path.exists(path):
+			with open(path) as results:
+				for line in results:
+					try:
+						record = json.loads(line)
+						self.results[(record['hash1'], record['hash2'], record['engine'], record['seed'])] = record
+					except (ValueError, KeyError):
+						continue
+
+	# Algo directories are only hashed once per run
+	def algo_hash(self, name):
+		if name not in self.hashes:
+			self.hashes[name] = hash_contents(os.path.join(get_root_dir(), 'algos', name))
+		return self.hashes[name]
+
+	def key(self, name1, name2, seed):
+		return (self.algo_hash(name1), self.algo_hash(name2), self.engine, seed)
+
+	def get(self, name1, name2, seed=None):
+		return self.results.get(self.key(name1, name2, seed))
+
+	# Every stored game between the same versions of both algos, whatever its seed
+	def records(self, name1, name2):
+		pair = self.key(name1, name2, None)[:3]
+		with self.lock:
+			return [record for key, record in self.results.items() if key[:3] == pair]
+
+	def add(self, name1, name2, seed, summary):
+		hash1, hash2, engine, seed = self.key(name1, name2, seed)
+		record = {'algo1': name1, 'algo2': name2, 'hash1': hash1, 'hash2': hash2, 'engine': engine, 'seed': seed, 'time': time.time()}
+		for field in RESULT_FIELDS:
+			record[field] = summary.get(field)
+		with self.lock:
+			self.results[(hash1, hash2, engine, seed)] = record
+			with open(self.path, 'a') as results:
+				results.write(json.dumps(record) + '\n')
+
+# Wilson score interval for a win rate, z is the normal quantile of the confidence level
+def wilson_interval(wins, games, z):
+	if games == 0:
+		return (0.0, 1.0)
+	rate = wins / games
+	denominator = 1 + z * z / games
+	center = (rate + z * z / (2 * games)) / denominator
+	half_width = z * math.sqrt(rate * (1 - rate) / games + z * z / (4 * games * games)) / denominator
+	return (max(0.0, center - half_width), min(1.0, center + half_width))
 
 # handles all the arguments
 def parse_args():
@@ -162,13 +431,62 @@ def parse_args():
 	ap.add_argument(
 		"-b", "--batch",
 		type=int,
-		default=5,
-		help="number of games to run at a single time (on seperate threads)\n\n")
+		default=None,
+		help="number of games to run at a single time, defaults to the number of CPU cores\n\n")
+	ap.add_argument(
+		"-l", "--logs",
+		default=None,
+		help="directory for the output of each game, defaults to arena_logs in the repository root\n\n")
+	ap.add_argument(
+		"-n", "--repeat",
+		type=int,
+		default=1,
+		help="play each pairing up to this many times with different seeds and report win rates\n\n")
+	ap.add_argument(
+		"--seed",
+		type=int,
+		default=0,
+		help="ALGO_SEED of the first repetition, repetition k uses seed + k\n\n")
+	ap.add_argument(
+		"--confidence",
+		type=float,
+		default=0.95,
+		help="confidence level of the win rate intervals\n\n")
+	ap.add_argument(
+		"--min-games",
+		type=int,
+		default=6,
+		help="decisive games a pairing needs before it can stop early\n\n")
+	ap.add_argument(
+		"-r", "--results",
+		default=None,
+		help="file remembering the results of earlier runs, defaults to arena_results.jsonl in the repository root\n\n")
+	ap.add_argument(
+		"--fresh",
+		action='store_true',
+		help="play every match again, even if the same versions of both algos already played it, and remember the new results\n\n")
+	ap.add_argument(
+		"--jvm-cache",
+		action='store_true',
+		help="share the classes the engine loads between games with a class data archive, for a faster engine startup\n\n")
+	ap.add_argument(
+		"--standings",
+		action='store_true',
+		help="only print the standings of the algos from the results file, without playing\n\n")
+	ap.add_argument(
+		"--adaptive",
+		action='store_true',
+		help="treat -b as the most games at a time and run fewer when the computer or the algos are short of time\n\n")
+	ap.add_argument(
+		"--time-margin",
+		type=float,
+		default=0.5,
+		help="with --adaptive, the part of the soft turn time limit an algo may use per turn before fewer games are run\n\n")
 	return vars(ap.parse_args())
 
 # called by the -a arg, runs every algo in directory
 def run_all():
-	algos_dir = os.path.dirname(os.path.realpath(__file__)).replace('scripts\\contributions', '')+'algos\\'
+	algos_dir = os.path.join(get_root_dir(), 'algos')
 	algos = os.listdir(algos_dir)
 	matches = itertools.combinations(algos, 2)
 	return matches
@@ -188,42 +506,291 @@ def run_from_file(filePath):
 		print ('File {} was not found'.format(filePath))
 		sys.exit()
 
-# returns the number of processess that are active
-def get_num_running(processes):
-	c = 0
-	for i, proc in processes.items():
-		if proc.is_alive():
-			c += 1
-	return c
-
-# starts a subprocess for each match up to batch_size and then starts them as they finish
-def run_matches(matches, batch_size):
-	tmp = copy.deepcopy(matches)
-	max_name_len = len(max(tmp, key=lambda e:len(e[0]))[0])
-
-	algos = []
-	processes = {}
-	i = 0
-	for match in matches:
-		algos.append((match[0],match[1]))
-		algo1 = 'algos/{}'.format(match[0])
-		algo2 = 'algos/{}'.format(match[1])
-		processes[i] = mp.Process(target=run_match, args=(algo1, algo2, max_name_len))
-		i += 1
-
-	for i in range(len(processes)):
-		print ('{: <30}{: <{fill}}   vs   {}'.format('Starting match:', algos[i][0], algos[i][1], fill=str(max_name_len)))
-		processes[i].start()
-		i += 1
-		while get_num_running(processes) >= batch_size:
-			time.sleep(.1)
-
-	while get_num_running(processes) > 0:
-			time.sleep(.1)
+# queues every match and runs them on a pool of batch_size workers, each game writing its output to log_dir.
+# With a throttle, it decides how many of the workers are used.
+def run_matches(matches, batch_size=None, log_dir=None, results=None, throttle=None):
+	all_matches = list(matches)
+	matches = all_matches
+	if results is not None:
+		matches = [match for match in all_matches if results.get(match[0], match[1]) is None]
+		if len(matches) < len(all_matches):
+			print ('Skipping {} matches already played by the same versions of both algos'.format(len(all_matches) - len(matches)))
+	if len(matches) == 0:
+		print ('No matches to run')
+		if results is not None:
+			print_standings(all_matches, results)
+		return 0
+	max_name_len = max(len(match[0]) for match in matches)
+	batch_size = batch_size or os.cpu_count() or 1
+	log_dir = log_dir or os.path.join(get_root_dir(), 'arena_logs')
+	os.makedirs(log_dir, exist_ok=True)
+
+	if throttle is not None:
+		batch_size = throttle.maximum
+		print ('Running {} matches, {} to {} at a time'.format(len(matches), 1, batch_size))
+	else:
+		print ('Running {} matches, {} at a time'.format(len(matches), batch_size))
+	start = time.time()
+	finished = 0
+	# Threads are enough here, each worker spends its time waiting on a game engine process
+	pool = ThreadPoolExecutor(max_workers=batch_size)
+	queued = list(reversed(matches))
+	running = {}
+	summaries = []
+	try:
+		while queued or running:
+			while queued and len(running) < (throttle.limit if throttle is not None else batch_size):
+				name1, name2 = queued.pop()
+				running[pool.submit(play_match, name1, name2, None, max_name_len, log_dir)] = (name1, name2)
+			done, _ = wait(running, return_when=FIRST_COMPLETED)
+			busy = len(running)
+			for future in done:
+				match = running.pop(future)
+				summary = future.result()
+				summaries.append(summary)
+				if results is not None:
+					results.add(match[0], match[1], None, summary)
+				if throttle is not None:
+					throttle.record(match, summary, busy)
+				finished += 1
+				minutes = (time.time() - start) / 60
+				print ('{}/{} matches finished, {:.1f} matches per minute'.format(finished, len(matches), finished / minutes if minutes > 0 else 0))
+	except KeyboardInterrupt:
+		print ('Stopping, matches that have not started yet are cancelled')
+		for future in running:
+			future.cancel()
+		raise
+	finally:
+		pool.shutdown(wait=True)
+
+	minutes = (time.time() - start) / 60
+	print ()
+	print ('Finished all matches! {} matches in {:.1f} minutes, {:.1f} matches per minute'.format(finished, minutes, finished / minutes if minutes > 0 else 0))
+	print_overhead(summaries)
+	if throttle is not None:
+		throttle.report()
+	print ()
+	if results is not None:
+		print_standings(all_matches, results, 'Standings, including matches played in earlier runs:' if len(matches) < len(all_matches) else 'Standings:')
+	return finished
+
+# The number of games to run at once, following the load of the computer and the time the algos need.
+# maximum is the most games at once, time_limit the soft turn time limit in milliseconds.
+class Throttle:
+	def __init__(self, maximum, time_limit, time_margin=0.5, slowdown=1.5):
+		self.maximum = maximum
+		self.limit = max(1, maximum // 2)
+		self.lowest = self.highest = self.limit
+		self.time_limit = time_limit
+		self.time_margin = time_margin
+		self.slowdown = slowdown
+		# fastest milliseconds per turn seen for each algo, when it had the computer mostly to itself
+		self.baseline = {}
+
+	# Why the computer itself is overloaded, or None
+	@staticmethod
+	def system_pressure():
+		try:
+			load = os.getloadavg()[0]
+			if load > (os.cpu_count() or 1):
+				return 'load {:.1f} on {} cores'.format(load, os.cpu_count())
+		except (AttributeError, OSError):
+			pass
+		try:
+			with open('/proc/meminfo') as meminfo:
+				memory = dict((line.split(':')[0], int(line.split()[1])) for line in meminfo if len(line.split()) > 1)
+			if memory['MemAvailable'] < 0.1 * memory['MemTotal']:
+				return '{:.0f} MB of memory free'.format(memory['MemAvailable'] / 1024)
+		except (OSError, KeyError, ValueError):
+			pass
+		return None
+
+	# Why the algos of a finished match were short of time, or None
+	def contention(self, names, summary):
+		turns = summary.get('turns')
+		if not turns:
+			return None
+		for player, name in enumerate(names):
+			if (summary.get('timeout_death') or [None, None])[player] or ((summary.get('time_damage_taken') or [0, 0])[player] or 0) > 0:
+				return '{} went over the time limit'.format(name)
+			computation = (summary.get('computation_time') or [None, None])[player]
+			if computation is None:
+				continue
+			per_turn = computation / turns
+			if self.time_limit and per_turn > self.time_margin * self.time_limit:
+				return '{} took {:.0f}ms per turn, close to the limit of {}ms'.format(name, per_turn, self.time_limit)
+			baseline = self.baseline.get(name)
+			if baseline is None or per_turn < baseline:
+				self.baseline[name] = per_turn
+			elif per_turn > self.slowdown * baseline and per_turn - baseline > 50:
+				return '{} took {:.0f}ms per turn instead of {:.0f}ms'.format(name, per_turn, baseline)
+		return None
+
+	# Adjusts the limit after a match, running is the number of games that were running with it
+	def record(self, names, summary, running):
+		reason = self.contention(names, summary) or self.system_pressure()
+		if reason is not None and self.limit > 1:
+			self.limit -= 1
+			print ('Running at most {} games at a time: {}'.format(self.limit, reason))
+		elif reason is None and running >= self.limit and self.limit < self.maximum:
+			self.limit += 1
+			print ('Running at most {} games at a time'.format(self.limit))
+		self.lowest = min(self.lowest, self.limit)
+		self.highest = max(self.highest, self.limit)
+
+	def report(self):
+		print ('Games at a time went from {} to {}, ending at {}'.format(self.lowest, self.highest, self.limit))
+
+# The soft turn time limit algos get locally, in milliseconds
+def get_time_limit():
+	try:
+		with open(os.path.join(get_root_dir(), 'game-configs.json')) as configs:
+			return json.load(configs)['timingAndReplay']['waitTimeBotSoft']
+	except (OSError, ValueError, KeyError):
+		return None
+
+# Wins of each algo over every stored game of the matches, with or without a seed, counting results stored by earlier runs
+def print_standings(matches, results, title='Standings, including matches played in earlier runs:'):
+	wins = collections.Counter()
+	games = collections.Counter()
+	health = collections.defaultdict(list)
+	computation = collections.defaultdict(list)
+	crashes = collections.Counter()
+	for name1, name2 in matches:
+		for record in results.records(name1, name2):
+			if record['winner'] not in (1, 2):
+				continue
+			wins[(name1, name2)[record['winner'] - 1]] += 1
+			for player, name in enumerate((name1, name2)):
+				games[name] += 1
+				if (record.get('health') or [None, None])[player] is not None:
+					health[name].append(record['health'][player])
+				if (record.get('computation_time') or [None, None])[player] is not None:
+					computation[name].append(record['computation_time'][player])
+				if (record.get('crashed') or [None, None])[player]:
+					crashes[name] += 1
+	if not games:
+		return
+	print ()
+	print (title)
+	fill = max(len(name) for name in games)
+	for name in sorted(games, key=lambda name: (-wins[name], name)):
+		print ('{: <{fill}}  {:3} wins out of {:3}   health left {:5.1f}   computation {:7.0f}ms per game{}'.format(
+			name, wins[name], games[name], statistics.mean(health[name]) if health[name] else 0,
+			statistics.mean(computation[name]) if computation[name] else 0,
+			'   crashed {} times'.format(crashes[name]) if crashes[name] else '', fill=fill))
+	print ()
+
+# plays each pairing up to repeats times on a pool of batch_size workers, stopping pairings early once settled
+def run_repeated(matches, repeats, batch_size=None, log_dir=None, base_seed=0, confidence=0.95, min_games=6, results=None, throttle=None):
+	matches = list(matches)
+	if len(matches) == 0:
+		print ('No matches to run')
+		return {}
+	max_name_len = max(len(match[0]) for match in matches)
+	batch_size = throttle.maximum if throttle is not None else batch_size or os.cpu_count() or 1
+	log_dir = log_dir or os.path.join(get_root_dir(), 'arena_logs')
+	os.makedirs(log_dir, exist_ok=True)
+	z = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+	stats = {match: {'scheduled': 0, 'wins': 0, 'losses': 0, 'errors': 0, 'settled': False} for match in matches}
+
+	# Seeds played before by the same versions of both algos count without being played again
+	def record(match, winner):
+		match_stats = stats[match]
+		if winner == 1:
+			match_stats['wins'] += 1
+		elif winner == 2:
+			match_stats['losses'] += 1
+		else:
+			match_stats['errors'] += 1
+		games = match_stats['wins'] + match_stats['losses']
+		low, high = wilson_interval(match_stats['wins'], games, z)
+		if not match_stats['settled'] and games >= min_games and (low > 0.5 or high < 0.5):
+			match_stats['settled'] = True
+			print ('{} vs {} settled after {} games'.format(match[0], match[1], games))
+
+	stored = {}
+	if results is not None:
+		for match in matches:
+			stored[match] = set()
+			for seed in range(base_seed, base_seed + repeats):
+				previous = results.get(match[0], match[1], seed)
+				if previous is not None:
+					stored[match].add(seed)
+		stored_games = sum(len(seeds) for seeds in stored.values())
+		if stored_games:
+			print ('Counting {} games already played by the same versions of both algos'.format(stored_games))
+
+	# The unsettled pairing with the fewest games scheduled goes next, so repetitions spread over all pairings
+	# Stored seeds are counted here instead of being handed out
+	def next_job():
+		while True:
+			open_matches = [match for match in matches if not stats[match]['settled'] and stats[match]['scheduled'] < repeats]
+			if not open_matches:
+				return None
+			match = min(open_matches, key=lambda match: stats[match]['scheduled'])
+			seed = base_seed + stats[match]['scheduled']
+			stats[match]['scheduled'] += 1
+			if seed not in stored.get(match, ()):
+				return match, seed
+			record(match, results.get(match[0], match[1], seed)['winner'])
+
+	print ('Running {} pairings up to {} times each, {} at a time'.format(len(matches), repeats, batch_size))
+	start = time.time()
+	finished = 0
+	summaries = []
+	pool = ThreadPoolExecutor(max_workers=batch_size)
+	running = {}
+	try:
+		while True:
+			while len(running) < (throttle.limit if throttle is not None else batch_size):
+				job = next_job()
+				if job is None:
+					break
+				(name1, name2), seed = job
+				running[pool.submit(play_match, name1, name2, seed, max_name_len, log_dir)] = job
+			if not running:
+				break
+			done, _ = wait(running, return_when=FIRST_COMPLETED)
+			busy = len(running)
+			for future in done:
+				match, seed = running.pop(future)
+				summary = future.result()
+				summaries.append(summary)
+				if throttle is not None:
+					throttle.record(match, summary, busy)
+				finished += 1
+				if results is not None:
+					results.add(match[0], match[1], seed, summary)
+				record(match, summary.get('winner'))
+			minutes = (time.time() - start) / 60
+			print ('{} games finished, {:.1f} matches per minute'.format(finished, finished / minutes if minutes > 0 else 0))
+	except KeyboardInterrupt:
+		print ('Stopping, matches that have not started yet are cancelled')
+		for future in running:
+			future.cancel()
+		raise
+	finally:
+		pool.shutdown(wait=True)
 
 	print ()
-	print ('Finished all matches!')
+	print_overhead(summaries)
+	if throttle is not None:
+		throttle.report()
+	print ('Win rates ({:.0%} confidence):'.format(confidence))
+	for (name1, name2), match_stats in stats.items():
+		games = match_stats['wins'] + match_stats['losses']
+		low, high = wilson_interval(match_stats['wins'], games, z)
+		rate = match_stats['wins'] / games if games else 0
+		print ('{: <{fill}}   vs   {: <{fill}}  {:3}-{:<3}  {} wins {:6.1%}  [{:.1%}, {:.1%}]{}{}'.format(
+			name1, name2, match_stats['wins'], match_stats['losses'], name1, rate, low, high,
+			'  stopped early' if match_stats['settled'] and games < repeats else '',
+			'  ({} games without a winner)'.format(match_stats['errors']) if match_stats['errors'] else '',
+			fill=str(max_name_len)))
 	print ()
+	if results is not None:
+		print_standings(matches, results, 'Standings, including games played in earlier runs:' if stored_games else 'Standings:')
+	return stats
 
 if __name__ == '__main__':
 	args = parse_args() # get command line arguments
@@ -239,19 +806,17 @@ if __name__ == '__main__':
 		print ('No arguments - no action taken')
 		sys.exit()
 
-	tmp = copy.deepcopy(matches)
-	run_matches(matches, args['batch'])		# run all matches
-
-	# if get_results is avalible, run a summary of the matches played
-	try:
-		args = {	'all':		False, 				\
-					'verbose':	False, 				\
-					'averages':	[], 				\
-					'file':		[],					\
-					'graph':	['wins'],	\
-					'num':		len(list(tmp))		\
-				}
-		from get_results import main
-		main(args)
-	except Exception as e:
-		print (e)
+	matches = list(matches)
+	if args['jvm_cache']:
+		enable_class_data_sharing()
+	results = ResultsStore(args['results'] or os.path.join(get_root_dir(), 'arena_results.jsonl'), load=not args['fresh'])
+	if args['standings']:
+		print_standings(matches, results, 'Standings from {}:'.format(results.path))
+		sys.exit()
+	throttle = None
+	if args['adaptive']:
+		throttle = Throttle(args['batch'] or os.cpu_count() or 1, get_time_limit(), args['time_margin'])
+	if args['repeat'] > 1:
+		run_repeated(matches, args['repeat'], args['batch'], args['logs'], args['seed'], args['confidence'], args['min_games'], results, throttle)
+		sys.exit()
+	run_matches(matches, args['batch'], args['logs'], results, throttle)		# run all matches
@@ -0,0 +1,111 @@
+'''
+Tests of the coordinator and workers of distributed_arena.py, talking over 127.0.0.1 with the games stubbed out.
+Run them from this directory:
+>py -m unittest test_distributed_arena
+'''
+
+import os
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+import distributed_arena
+from distributed_arena import Coordinator, CoordinatorServer, CoordinatorHandler, worker_loop, MAX_ATTEMPTS
+from test_tournament import MemoryResults
+
+
+# The last lines of a replay won by player 1
+def replay_lines():
+	frame = {'p1Stats': [12.0, 1, 2, 3], 'p2Stats': [0.0, 1, 2, 3]}
+	end = {'endStats': {'winner': 1, 'turns': 42, 'duration': 40, 'player1': {'total_computation_time': 120}, 'player2': {'total_computation_time': 80}}}
+	return json.dumps(frame) + '\n' + json.dumps(end) + '\n'
+
+
+class DistributedArenaTests(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+		self.started = []
+		self.lock = threading.Lock()
+
+	# Plays the matches on worker threads against a coordinator on a free port, with play_game standing in for the engine
+	def run_arena(self, matches, play_game, workers=3, timeout=60):
+		self.store = MemoryResults()
+		self.coordinator = Coordinator(matches, os.path.join(self.directory, 'replays'), timeout, self.store)
+		server = CoordinatorServer(('127.0.0.1', 0), CoordinatorHandler)
+		server.coordinator = self.coordinator
+		threading.Thread(target=server.serve_forever, daemon=True).start()
+		self.addCleanup(server.server_close)
+		self.addCleanup(server.shutdown)
+
+		def run_match(algo1, algo2, max_name_len, log_path, game_dir):
+			names = (os.path.basename(algo1), os.path.basename(algo2))
+			with self.lock:
+				self.started.append(names)
+			play_game(names)
+			replay = Path(game_dir) / 'game.replay'
+			replay.write_text(replay_lines())
+			return SimpleNamespace(returncode=0, replay=replay)
+
+		def make_game_dir(root_dir):
+			return tempfile.mkdtemp(dir=self.directory)
+
+		with mock.patch.object(distributed_arena, 'run_match', run_match), \
+				mock.patch.object(distributed_arena, 'make_game_dir', make_game_dir), mock.patch('sys.stdout'):
+			threads = [threading.Thread(target=worker_loop, args=(server.server_address, self.directory, self.directory, False), daemon=True)
+				for _ in range(workers)]
+			for thread in threads:
+				thread.start()
+			self.assertTrue(self.coordinator.finished.wait(30), "Every match should finish")
+			for thread in threads:
+				thread.join(10)
+				self.assertFalse(thread.is_alive(), "Workers should stop once the coordinator is done")
+
+	def test_every_match_is_leased_and_played_once(self):
+		matches = [('a', 'b'), ('a', 'c'), ('b', 'c'), ('a', 'd'), ('b', 'd'), ('c', 'd')]
+
+		def play_game(names):
+			match_id = matches.index(names)
+			self.assertIn(match_id, self.coordinator.leased, "A match should be leased while a worker plays it")
+
+		self.run_arena(matches, play_game)
+		self.assertEqual(sorted(matches), sorted(self.started), "Each match should be played once")
+		self.assertEqual({}, self.coordinator.leased)
+		self.assertEqual(len(matches), len(self.coordinator.results))
+		self.assertEqual(len(matches), len(os.listdir(os.path.join(self.directory, 'replays'))))
+		record = self.store.get('a', 'b')
+		self.assertEqual((1, 42, 0), (record['winner'], record['turns'], record['returncode']), "Results should be stored like those of run_arena.py")
+		self.assertTrue(os.path.exists(record['replay']))
+
+	def test_expired_lease_is_handed_out_again(self):
+		# The first worker to get the match stops answering until another worker finished it
+		def play_game(names):
+			with self.lock:
+				first = len(self.started) == 1
+			if first:
+				self.coordinator.finished.wait(30)
+
+		self.run_arena([('a', 'b')], play_game, workers=2, timeout=0.5)
+		self.assertEqual([('a', 'b'), ('a', 'b')], self.started, "The match should be handed out again after its lease expired")
+		self.assertEqual(1, len(self.coordinator.results), "The late result should not count twice")
+		self.assertEqual(1, len(os.listdir(os.path.join(self.directory, 'replays'))))
+
+	def test_match_that_cannot_run_is_given_up(self):
+		def play_game(names):
+			if names == ('a', 'c'):
+				raise FileNotFoundError('java')
+
+		self.run_arena([('a', 'b'), ('a', 'c')], play_game, workers=2)
+		self.assertEqual(MAX_ATTEMPTS, self.started.count(('a', 'c')), "A failing match should be tried MAX_ATTEMPTS times")
+		self.assertIn('FileNotFoundError', self.coordinator.results[1]['error'])
+		self.assertIsNone(self.store.get('a', 'c'), "A match that never ran should not be stored as played")
+		self.assertEqual(1, self.store.get('a', 'b')['winner'])
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,51 @@
+'''
+Tests of the results file and standings of run_arena.py, without playing any games.
+Run them from this directory:
+>py -m unittest test_run_arena
+'''
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from run_arena import ResultsStore, print_standings
+
+
+class StandingsTests(unittest.TestCase):
+	def setUp(self):
+		directory = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+		self.path = os.path.join(directory, 'arena_results.jsonl')
+		# Algos are told apart by name instead of by the contents of their directories
+		patcher = mock.patch.object(ResultsStore, 'algo_hash', lambda self, name: name)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+
+	def standings(self, matches):
+		output = io.StringIO()
+		with mock.patch('sys.stdout', output):
+			print_standings(matches, ResultsStore(self.path), 'Standings:')
+		return [line.split() for line in output.getvalue().splitlines() if line and line != 'Standings:']
+
+	def test_every_seed_counts(self):
+		results = ResultsStore(self.path)
+		for seed in range(3):
+			results.add('a', 'b', seed, {'winner': 1 if seed < 2 else 2, 'health': [10.0, 0.0]})
+		results.add('a', 'b', None, {'winner': 2, 'health': [0.0, 5.0]})
+		results.add('b', 'c', 0, {'winner': 1})
+		results.add('b', 'c', 1, {'winner': None})
+		lines = self.standings([('a', 'b'), ('b', 'c')])
+		self.assertEqual([['b', '3', 'wins', 'out', 'of', '5'], ['a', '2', 'wins', 'out', 'of', '4'], ['c', '0', 'wins', 'out', 'of', '1']],
+			[line[:6] for line in lines], "Games of every seed should count, and games without a winner should not")
+
+	def test_other_versions_do_not_count(self):
+		ResultsStore(self.path).add('a', 'b', 0, {'winner': 1})
+		with mock.patch.object(ResultsStore, 'algo_hash', lambda self, name: name + ' changed'):
+			self.assertEqual([], self.standings([('a', 'b')]), "Games of other versions of the algos should not count")
+
+
+if __name__ == '__main__':
+	unittest.main()
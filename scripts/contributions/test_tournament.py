@@ -0,0 +1,126 @@
+'''
+Tests of the ratings and Swiss pairing of tournament.py, without playing any games.
+Run them from this directory:
+>py -m unittest test_tournament
+'''
+
+import unittest
+from unittest import mock
+
+import tournament
+from tournament import Ratings, START_RATING, START_DEVIATION, swiss_pairs, default_rounds, run_swiss
+
+
+# Remembers results in memory, by name instead of by the contents of the algo directories
+class MemoryResults:
+	def __init__(self):
+		self.results = {}
+
+	def get(self, name1, name2, seed=None):
+		return self.results.get((name1, name2, seed))
+
+	def add(self, name1, name2, seed, summary):
+		self.results[(name1, name2, seed)] = summary
+
+
+def ratings_with_scores(scores):
+	ratings = Ratings(sorted(scores))
+	ratings.score.update(scores)
+	return ratings
+
+
+class RatingsTests(unittest.TestCase):
+	def test_win_moves_both_ratings(self):
+		ratings = Ratings(['a', 'b'])
+		ratings.update('a', 'b', 1.0)
+		self.assertGreater(ratings.rating['a'], START_RATING)
+		self.assertAlmostEqual(ratings.rating['a'] - START_RATING, START_RATING - ratings.rating['b'], msg="Equal algos should gain and lose the same")
+		self.assertAlmostEqual(1662.2, ratings.rating['a'], places=1)
+		self.assertLess(ratings.deviation['a'], START_DEVIATION, "A game should make the rating more certain")
+		self.assertEqual((1.0, 0.0), (ratings.score['a'], ratings.score['b']))
+		self.assertEqual((1, 1), (ratings.games['a'], ratings.games['b']))
+
+	def test_draw_between_equals_keeps_ratings(self):
+		ratings = Ratings(['a', 'b'])
+		ratings.update('a', 'b', 0.5)
+		self.assertAlmostEqual(START_RATING, ratings.rating['a'])
+		self.assertAlmostEqual(START_RATING, ratings.rating['b'])
+
+	def test_expected_win_moves_less(self):
+		ratings = Ratings(['a', 'b', 'c', 'd'])
+		ratings.update('a', 'b', 1.0)
+		ratings.update('c', 'd', 1.0)
+		before = ratings.rating['a']
+		ratings.update('a', 'd', 1.0)
+		self.assertLess(ratings.rating['a'] - before, before - START_RATING, "Beating a weaker algo should count for less")
+		self.assertEqual(['a', 'c', 'b', 'd'], ratings.ranking())
+
+
+class SwissPairsTests(unittest.TestCase):
+	def test_pairs_by_score(self):
+		ratings = ratings_with_scores({'a': 2, 'b': 2, 'c': 1, 'd': 1, 'e': 0, 'f': 0})
+		pairs, sitting_out = swiss_pairs(ratings, set(), {})
+		self.assertEqual([('a', 'b'), ('c', 'd'), ('e', 'f')], pairs)
+		self.assertIsNone(sitting_out)
+
+	def test_swap_avoids_rematch(self):
+		# Greedy pairs a with b and leaves c and d, who already played, so one swap is needed
+		ratings = ratings_with_scores({'a': 3, 'b': 2, 'c': 1, 'd': 0})
+		pairs, sitting_out = swiss_pairs(ratings, {frozenset('cd')}, {})
+		self.assertEqual([('a', 'c'), ('b', 'd')], pairs)
+
+	def test_rematch_only_when_unavoidable(self):
+		ratings = ratings_with_scores({'a': 1, 'b': 0})
+		self.assertEqual([('a', 'b')], swiss_pairs(ratings, {frozenset('ab')}, {})[0])
+
+	def test_no_rematches_while_avoidable(self):
+		names = ['algo{}'.format(i) for i in range(16)]
+		ratings = Ratings(names)
+		played = set()
+		for round_number in range(default_rounds(len(names))):
+			pairs, sitting_out = swiss_pairs(ratings, played, {})
+			self.assertEqual(8, len(pairs))
+			self.assertEqual(16, len(set(name for pair in pairs for name in pair)), "Every algo should play once per round")
+			for name1, name2 in pairs:
+				self.assertNotIn(frozenset((name1, name2)), played, "Round {} repeated {} vs {}".format(round_number + 1, name1, name2))
+				played.add(frozenset((name1, name2)))
+				ratings.update(name1, name2, 1.0 if name1 < name2 else 0.0)
+
+	def test_one_bye_per_odd_round(self):
+		names = ['a', 'b', 'c', 'd', 'e']
+		ratings = Ratings(names)
+		byes = {}
+		for round_number in range(len(names)):
+			pairs, sitting_out = swiss_pairs(ratings, set(), byes)
+			self.assertIsNotNone(sitting_out, "One algo should sit out with an odd number of algos")
+			self.assertEqual(set(names) - {sitting_out}, set(name for pair in pairs for name in pair))
+			byes[sitting_out] = byes.get(sitting_out, 0) + 1
+			ratings.score[sitting_out] += 1
+		self.assertEqual(dict.fromkeys(names, 1), byes, "Every algo should sit out once before any sits out twice")
+
+	def test_default_rounds(self):
+		self.assertEqual(1, default_rounds(2))
+		self.assertEqual(2, default_rounds(3))
+		self.assertEqual(5, default_rounds(6))
+		self.assertEqual(8, default_rounds(40))
+
+
+class RunSwissTests(unittest.TestCase):
+	def test_rematches_are_new_games(self):
+		seeds = []
+
+		def play_match(name1, name2, seed, max_name_len, log_dir):
+			seeds.append((frozenset((name1, name2)), seed))
+			return {'winner': 1}
+
+		with mock.patch.object(tournament, 'play_match', play_match), mock.patch('sys.stdout'):
+			ratings = run_swiss(['a', 'b', 'c'], 4, 2, None, MemoryResults())
+		self.assertEqual(4, len(set(seeds)), "Four rounds of three algos need a rematch, which should be a new game")
+		self.assertEqual(8, sum(ratings.games.values()), "Every game should be rated once")
+		for pair in set(pair for pair, seed in seeds):
+			pair_seeds = [seed for other, seed in seeds if other == pair]
+			self.assertEqual(len(pair_seeds), len(set(pair_seeds)), "A rematch should use a new seed")
+
+
+if __name__ == '__main__':
+	unittest.main()
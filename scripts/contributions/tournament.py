@@ -0,0 +1,354 @@
+#!/usr/bin/env python
+
+'''
+------------------------------------------------------------------------------------------------
+Copyright: CC0 - completely open to edit, share, etc
+
+Short Description:
+This is a python script to rank many algos without playing every combination.
+run_arena.py plays every pair once, which is n*(n-1)/2 games; with 40 algos that is 780 games.
+This script ranks them with Swiss rounds or adaptive pairing instead, in a fraction of the games.
+------------------------------------------------------------------------------------------------
+
+README:
+
+This program assumes this file is in the contributions/scripts directory, next to run_arena.py
+
+Algos are chosen the same way as in run_arena.py, with -a, -s or -f:
+>py scripts/contributions/tournament.py swiss -a
+>py scripts/contributions/tournament.py adaptive -s algo1 algo2 algo3 algo4 -g 60
+
+Every algo has a Glicko rating: a rating (1500 to start with) and a deviation saying how
+unsure that rating still is (350 to start with). Both are updated after every game, as soon
+as it finishes, so the next pairings already use them.
+
+swiss:
+Plays --rounds rounds (enough to separate the algos by default: log2 of the number of algos,
+plus 2, but never more rounds than a round robin would take). In each round algos with the same
+score, then similar ratings, play each other, and no pair plays twice while that can be avoided.
+A pair that does meet again plays its k-th game with ALGO_SEED k, so it is a new game and not the
+stored result of their first. With an odd number of algos a different algo sits out each round.
+Each round's games are run together, so a round takes as long as its slowest game.
+
+adaptive:
+Keeps -b games running at all times. Each new game goes to the pair whose result would tell
+the most: algos whose rating is still unsure, against opponents they have about even chances
+with, preferring pairs that have played each other less. It stops after -g games (4 per algo
+by default), or once every rating deviation is below --target-deviation.
+A pair can play more than once, and its k-th game uses ALGO_SEED k, see run_arena.py.
+
+Both print the ranking as they go and at the end, with rating +- 2 deviations.
+
+Results are remembered in arena_results.jsonl like in run_arena.py (-r to change it, --fresh
+to play everything again), so games already played by the same versions of both algos are
+counted without being played again. -b and -l work like in run_arena.py.
+
+The ratings and pairings have tests, which run without the engine:
+>cd scripts/contributions && py -m unittest test_tournament
+'''
+
+import sys
+try:
+	import os
+	import math
+	import time
+	import argparse
+	from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, ALL_COMPLETED
+	from run_arena import run_all, run_specific, run_from_file, play_match, get_root_dir, ResultsStore
+except ImportError as e:
+	print("WARNING: Module not found, full error:\n")
+	print(str(e))
+	sys.exit()
+
+
+Q = math.log(10) / 400
+START_RATING = 1500
+START_DEVIATION = 350
+MIN_DEVIATION = 30
+
+# How much the deviation of an opponent weakens what a game against them says
+def glicko_g(deviation):
+	return 1 / math.sqrt(1 + 3 * Q * Q * deviation * deviation / (math.pi * math.pi))
+
+# Chance that a player with rating beats an opponent
+def glicko_expected(rating, opponent_rating, opponent_deviation):
+	return 1 / (1 + 10 ** (-glicko_g(opponent_deviation) * (rating - opponent_rating) / 400))
+
+# Glicko ratings updated one game at a time
+class Ratings:
+	def __init__(self, names):
+		self.rating = {name: START_RATING for name in names}
+		self.deviation = {name: START_DEVIATION for name in names}
+		self.score = {name: 0.0 for name in names}
+		self.games = {name: 0 for name in names}
+
+	# score is 1 if name1 won, 0 if name2 won and 0.5 for a game without a winner
+	def update(self, name1, name2, score):
+		rating1, deviation1 = self.rating[name1], self.deviation[name1]
+		rating2, deviation2 = self.rating[name2], self.deviation[name2]
+		for name, rating, deviation, opponent_rating, opponent_deviation, result in (
+				(name1, rating1, deviation1, rating2, deviation2, score),
+				(name2, rating2, deviation2, rating1, deviation1, 1 - score)):
+			g = glicko_g(opponent_deviation)
+			expected = glicko_expected(rating, opponent_rating, opponent_deviation)
+			d_squared = 1 / (Q * Q * g * g * expected * (1 - expected))
+			precision = 1 / (deviation * deviation) + 1 / d_squared
+			self.rating[name] = rating + Q / precision * g * (result - expected)
+			self.deviation[name] = max(MIN_DEVIATION, math.sqrt(1 / precision))
+			self.score[name] += result
+			self.games[name] += 1
+
+	# How much is expected to be learned from a game between two algos
+	def information(self, name1, name2):
+		expected = glicko_expected(self.rating[name1], self.rating[name2], self.deviation[name2])
+		return expected * (1 - expected) * (self.deviation[name1] ** 2 + self.deviation[name2] ** 2)
+
+	def ranking(self):
+		return sorted(self.rating, key=lambda name: (-self.rating[name], name))
+
+	def print_ranking(self, title):
+		fill = max(len(name) for name in self.rating)
+		print ()
+		print (title)
+		for place, name in enumerate(self.ranking(), 1):
+			print ('{:3}. {: <{fill}}  {:6.0f} +- {:3.0f}  {:4.1f} points from {} games'.format(
+				place, name, self.rating[name], 2 * self.deviation[name], self.score[name], self.games[name], fill=fill))
+		print ()
+
+# Plays games on a pool of workers, reusing stored results, and feeds every result to the ratings
+class GamePool:
+	def __init__(self, ratings, batch_size, log_dir, results):
+		self.ratings = ratings
+		self.batch_size = batch_size
+		self.log_dir = log_dir
+		self.results = results
+		self.max_name_len = max(len(name) for name in ratings.rating)
+		self.pool = ThreadPoolExecutor(max_workers=batch_size)
+		self.running = {}
+		self.played = 0
+		self.reused = 0
+		self.start = time.time()
+
+	# Starts a game, or counts its stored result straight away. Returns True if it was stored.
+	def submit(self, name1, name2, seed):
+		stored = self.results.get(name1, name2, seed)
+		if stored is not None:
+			self.reused += 1
+			self.record(name1, name2, stored.get('winner'))
+			return True
+		future = self.pool.submit(play_match, name1, name2, seed, self.max_name_len, self.log_dir)
+		self.running[future] = (name1, name2, seed)
+		return False
+
+	# Waits for at least one game to finish, or for all of them, and records the results
+	def collect(self, everything=False):
+		if not self.running:
+			return
+		done, _ = wait(self.running, return_when=ALL_COMPLETED if everything else FIRST_COMPLETED)
+		for future in done:
+			name1, name2, seed = self.running.pop(future)
+			summary = future.result()
+			self.results.add(name1, name2, seed, summary)
+			self.played += 1
+			self.record(name1, name2, summary.get('winner'))
+		minutes = (time.time() - self.start) / 60
+		print ('{} games played, {} results reused, {:.1f} matches per minute'.format(
+			self.played, self.reused, self.played / minutes if minutes > 0 else 0))
+
+	def record(self, name1, name2, winner):
+		self.ratings.update(name1, name2, {1: 1.0, 2: 0.0}.get(winner, 0.5))
+
+	def close(self, cancel=False):
+		if cancel:
+			for future in self.running:
+				future.cancel()
+		self.pool.shutdown(wait=True)
+
+# Pairs algos with equal scores, then close ratings, avoiding rematches. Returns the pairs and who sits out.
+def swiss_pairs(ratings, played, byes):
+	order = sorted(ratings.rating, key=lambda name: (-ratings.score[name], -ratings.rating[name], name))
+	sitting_out = None
+	if len(order) % 2 == 1:
+		sitting_out = min(reversed(order), key=lambda name: byes.get(name, 0))
+		order.remove(sitting_out)
+
+	def fresh(name1, name2):
+		return frozenset((name1, name2)) not in played
+
+	# Greedy from the top, each algo taking the closest algo below it it has not played yet
+	pairs = []
+	stuck = []
+	unpaired = list(order)
+	while unpaired:
+		first = unpaired.pop(0)
+		opponent = next((name for name in unpaired if fresh(first, name)), None)
+		if opponent is None:
+			stuck.append(first)
+		else:
+			unpaired.remove(opponent)
+			pairs.append((first, opponent))
+
+	# One repair pass for algos left without a new opponent: pair them with each other, or swap them
+	# into a pair whose algos they have not played, and only fall back to a rematch if neither works
+	while stuck:
+		first = stuck.pop(0)
+		opponent = next((name for name in stuck if fresh(first, name)), None)
+		if opponent is None:
+			for name in stuck:
+				for i, (name1, name2) in enumerate(pairs):
+					for a, b in ((name1, name2), (name2, name1)):
+						if opponent is None and fresh(first, a) and fresh(name, b):
+							pairs[i] = (first, a)
+							pairs.append((name, b))
+							opponent = name
+			if opponent is not None:
+				stuck.remove(opponent)
+				continue
+			opponent = stuck[0]
+		stuck.remove(opponent)
+		pairs.append((first, opponent))
+
+	# Best placed pairs first, each with the better placed algo first
+	place = {name: i for i, name in enumerate(order)}
+	pairs = [tuple(sorted(pair, key=place.get)) for pair in pairs]
+	pairs.sort(key=lambda pair: place[pair[0]])
+	return pairs, sitting_out
+
+# The number of rounds to separate the algos, log2 of their number plus 2, but no more than a round robin
+def default_rounds(count):
+	return max(1, min(math.ceil(math.log2(count)) + 2, count - 1))
+
+def run_swiss(names, rounds, batch_size, log_dir, results):
+	ratings = Ratings(names)
+	games = GamePool(ratings, batch_size, log_dir, results)
+	played = set()
+	byes = {}
+	print ('Swiss tournament of {} algos over {} rounds, {} games instead of {} for a round robin'.format(
+		len(names), rounds, rounds * (len(names) // 2), len(names) * (len(names) - 1) // 2))
+	# A pair that meets again plays with a new ALGO_SEED, so it is not the first game's stored result counted twice
+	meetings = {}
+	try:
+		for round_number in range(1, rounds + 1):
+			pairs, sitting_out = swiss_pairs(ratings, played, byes)
+			if sitting_out is not None:
+				byes[sitting_out] = byes.get(sitting_out, 0) + 1
+				ratings.score[sitting_out] += 1
+			print ('Round {}: {}{}'.format(round_number, ', '.join('{} vs {}'.format(*pair) for pair in pairs),
+				', {} sits out'.format(sitting_out) if sitting_out is not None else ''))
+			for name1, name2 in pairs:
+				key = frozenset((name1, name2))
+				played.add(key)
+				seed = meetings.get(key)
+				meetings[key] = meetings.get(key, 0) + 1
+				games.submit(name1, name2, seed)
+			games.collect(everything=True)
+			ratings.print_ranking('Ranking after round {}:'.format(round_number))
+	except KeyboardInterrupt:
+		print ('Stopping, matches that have not started yet are cancelled')
+		games.close(cancel=True)
+		raise
+	games.close()
+	return ratings
+
+def run_adaptive(names, max_games, target_deviation, batch_size, log_dir, results, base_seed=0):
+	ratings = Ratings(names)
+	games = GamePool(ratings, batch_size, log_dir, results)
+	pair_games = {}
+	print ('Adaptive pairing of {} algos, at most {} games instead of {} for a round robin'.format(
+		len(names), max_games, len(names) * (len(names) - 1) // 2))
+
+	# The most informative pair among algos that are not playing right now
+	def next_pair():
+		busy = set(name for pair in games.running.values() for name in pair[:2])
+		free = [name for name in names if name not in busy]
+		best = None
+		for i, name1 in enumerate(free):
+			for name2 in free[i + 1:]:
+				value = ratings.information(name1, name2) / (1 + pair_games.get(frozenset((name1, name2)), 0))
+				if best is None or value > best[0]:
+					best = (value, name1, name2)
+		return best and best[1:]
+
+	scheduled = 0
+	try:
+		while True:
+			settled = max(ratings.deviation.values()) < target_deviation
+			while not settled and scheduled < max_games and len(games.running) < batch_size:
+				pair = next_pair()
+				if pair is None:
+					break
+				key = frozenset(pair)
+				seed = base_seed + pair_games.get(key, 0)
+				pair_games[key] = pair_games.get(key, 0) + 1
+				scheduled += 1
+				if games.submit(pair[0], pair[1], seed):
+					settled = max(ratings.deviation.values()) < target_deviation
+			if not games.running:
+				break
+			games.collect()
+	except KeyboardInterrupt:
+		print ('Stopping, matches that have not started yet are cancelled')
+		games.close(cancel=True)
+		raise
+	games.close()
+	if max(ratings.deviation.values()) < target_deviation:
+		print ('Every rating is within {} after {} games'.format(target_deviation, scheduled))
+	return ratings
+
+# handles all the arguments
+def parse_args():
+	ap = argparse.ArgumentParser(add_help=False, formatter_class=argparse.RawTextHelpFormatter)
+	ap.add_argument('-h', '--help', action='help', help='show this help message and exit\n\n')
+	modes = ap.add_subparsers(dest='mode')
+
+	swiss = modes.add_parser('swiss', help='play rounds pairing algos with similar scores\n\n')
+	swiss.add_argument("--rounds", type=int, default=None, help="number of rounds, log2 of the number of algos plus 2 by default, at most one less than the number of algos")
+
+	adaptive = modes.add_parser('adaptive', help='keep playing the games that tell the most about the ratings\n\n')
+	adaptive.add_argument("-g", "--games", type=int, default=None, help="most games to play, 4 per algo by default")
+	adaptive.add_argument("--target-deviation", type=float, default=75, help="stop once every rating deviation is below this")
+	adaptive.add_argument("--seed", type=int, default=0, help="ALGO_SEED of the first game of each pair, the k-th game uses seed + k")
+
+	for mode in (swiss, adaptive):
+		mode.add_argument("-a", "--all", action='store_true', help="rank all algos in the directory")
+		mode.add_argument("-s", "--specific", nargs='*', default=[], help="rank the algos added")
+		mode.add_argument("-f", "--file", default='', help="rank the algos in a specified file")
+		mode.add_argument("-b", "--batch", type=int, default=None, help="number of games to run at a single time, defaults to the number of CPU cores")
+		mode.add_argument("-l", "--logs", default=None, help="directory for the output of each game, defaults to arena_logs in the repository root")
+		mode.add_argument("-r", "--results", default=None, help="file remembering the results of earlier runs, defaults to arena_results.jsonl in the repository root")
+		mode.add_argument("--fresh", action='store_true', help="play every game again, and remember the new results")
+	return vars(ap.parse_args())
+
+if __name__ == '__main__':
+	args = parse_args() # get command line arguments
+	if args['mode'] not in ('swiss', 'adaptive'):
+		print ('Choose swiss or adaptive, see -h')
+		sys.exit()
+
+	if args['all']:
+		matches = run_all()
+	elif len(args['specific']) > 0:
+		matches = run_specific(args['specific'])
+	elif args['file'] != '':
+		matches = run_from_file(args['file'])
+	else:
+		print ('No algos given - no action taken')
+		sys.exit()
+	# the same selection as run_arena.py, keeping the algos of its pairs in order
+	names = list(dict.fromkeys(name for match in matches for name in match))
+	if len(names) < 2:
+		print ('At least 2 algos are needed - no action taken')
+		sys.exit()
+
+	batch_size = args['batch'] or os.cpu_count() or 1
+	log_dir = args['logs'] or os.path.join(get_root_dir(), 'arena_logs')
+	os.makedirs(log_dir, exist_ok=True)
+	results = ResultsStore(args['results'] or os.path.join(get_root_dir(), 'arena_results.jsonl'), load=not args['fresh'])
+
+	start = time.time()
+	if args['mode'] == 'swiss':
+		rounds = args['rounds'] or default_rounds(len(names))
+		ratings = run_swiss(names, rounds, batch_size, log_dir, results)
+	else:
+		ratings = run_adaptive(names, args['games'] or 4 * len(names), args['target_deviation'], batch_size, log_dir, results, args['seed'])
+	ratings.print_ranking('Final ranking ({:.1f} minutes):'.format((time.time() - start) / 60))
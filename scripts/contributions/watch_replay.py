@@ -196,7 +196,8 @@ try:
 	import warnings
 	import argparse
 	import subprocess
-	import multiprocessing as mp
+	sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir))
+	import match_launch
 except ImportError as e:
 	sys.stderr.write("WARNING: Module not found, full error:\n\n")
 	sys.stderr.write(e)
@@ -1226,63 +1227,18 @@ class FileHandler:
 				self.replays.append(Replay(f_name))
 
 
-# This is all almost directly copied from run_match.py
-
-# Runs a single game
-def run_single_game(process_command):
-	print("Start run a match")
-	p = subprocess.Popen(
-		process_command,
-		shell=True,
-		stdout=sys.stdout,
-		stderr=sys.stderr
-		)
-	# daemon necessary so game shuts down if this script is shut down by user
-	p.daemon = 1
-	p.wait()
-	print("Finished running match")
-
+# Starts a match in the background with the same launcher as run_match.py, the engine printing to this terminal
 def run_match(a1='', a2=''):
-	# Get location of this run file
-	file_dir = os.path.dirname(os.path.realpath(__file__))
-	parent_dir = os.path.abspath('{}/..'.format(os.path.join(file_dir, os.pardir)))
+	# Set default path for algos if script is run with no params
+	default_algo = match_launch.root_dir() / "algos" / "starter-algo-ZIPME"
+	algo1 = a1 if a1 != '' else default_algo
+	algo2 = a2 if a2 != '' else default_algo
 
-	# Get if running in windows OS
-	is_windows = sys.platform.startswith('win')
-	print("Is windows: {}".format(is_windows))
+	print("Algo 1: ", match_launch.run_file(algo1))
+	print("Algo 2:", match_launch.run_file(algo2))
 
-	# Set default path for algos if script is run with no params
-	default_algo = parent_dir + "/algos/starter-algo-ZIPME/run.ps1" if is_windows else parent_dir + "/algos/starter-algo-ZIPME/run.sh" 
-	algo1 = default_algo
-	algo2 = default_algo
-
-	if a1 != '':
-		algo1 = a1
-	if a2 != '':
-		algo2 = a2
-
-	# If folder path is given instead of run file path, add the run file to the path based on OS
-	# trailing_char deals with if there is a trailing \ or / or not after the directory name
-	if is_windows:
-		if "run.ps1" not in algo1:
-			trailing_char = "" if algo1.endswith("\\") else "/"
-			algo1 = algo1 + trailing_char + "run.ps1"
-		if "run.ps1" not in algo2:
-			trailing_char = "" if algo2.endswith("\\") else "/"
-			algo2 = algo2 + trailing_char + "run.ps1"
-	else:
-		if "run.sh" not in algo1:
-			trailing_char = "" if algo1.endswith('/') else "/"
-			algo1 = algo1 + trailing_char + "run.sh"
-		if "run.sh" not in algo2:
-			trailing_char = "" if algo2.endswith('/') else "/"
-			algo2 = algo2 + trailing_char + "run.sh"
-
-	print("Algo 1: ", algo1)
-	print("Algo 2:", algo2)
-
-	match = mp.Process(target=run_single_game, args=("cd {} && java -jar engine.jar work {} {}".format(parent_dir, algo1, algo2),))
-	match.start()
+	print("Start run a match")
+	return match_launch.start_match(algo1, algo2)
 
 def main(args):
 	global BLIT
@@ -0,0 +1,144 @@
+'''
+Starts games of the engine for run_match.py and the scripts in contributions.
+
+The engine is started directly, with its working directory set to where it should write its
+replays, so no shell runs between the scripts and java and algo paths work the same way on
+Windows, Mac and Linux. Algos can be given as their directory or as their run.sh / run.ps1.
+
+    from match_launch import run_match
+    result = run_match('python-algo', 'algos/my-algo')
+    print(result.returncode, result.seconds, result.replay)
+'''
+
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+IS_WINDOWS = sys.platform.startswith('win')
+RUN_FILE = 'run.ps1' if IS_WINDOWS else 'run.sh'
+
+
+def root_dir():
+    """The root of the repository, where engine.jar and game-configs.json are"""
+    return Path(__file__).resolve().parent.parent
+
+
+def run_file(algo):
+    """The file the engine starts for an algo given as a directory or as its run file"""
+    path = Path(algo).expanduser().resolve()
+    if path.is_dir():
+        return path / RUN_FILE
+    return path
+
+
+def algo_name(algo):
+    """The name of an algo's directory, from the directory or its run file"""
+    path = run_file(algo)
+    return path.parent.name
+
+
+def engine_command(algo1, algo2, java_options=()):
+    """The command line of a game between two algos, for the engine in the working directory"""
+    return ['java'] + list(java_options) + ['-jar', 'engine.jar', 'work', str(run_file(algo1)), str(run_file(algo2))]
+
+
+def _replays(cwd):
+    """The replay files in the replays directory of cwd, with the time each was last written"""
+    return dict((path, path.stat().st_mtime_ns) for path in (Path(cwd) / 'replays').glob('*.replay'))
+
+
+class MatchResult:
+    """What became of a finished game
+
+    Attributes :
+        * algo1, algo2 (Path): The run files of both algos
+        * returncode (int): The exit code of the engine
+        * seconds (float): How long the engine ran, from start to exit
+        * replays (list): Every replay file (Path) the game wrote, oldest first
+        * replay (Path): The last of them, None when the engine wrote no replay
+
+    """
+    def __init__(self, algo1, algo2, returncode, seconds, replays):
+        self.algo1 = algo1
+        self.algo2 = algo2
+        self.returncode = returncode
+        self.seconds = seconds
+        self.replays = replays
+        self.replay = replays[-1] if replays else None
+
+    @property
+    def ok(self):
+        return self.returncode == 0
+
+    def __repr__(self):
+        return 'MatchResult({} vs {}, returncode={}, seconds={:.2f}, replay={})'.format(
+            self.algo1.parent.name, self.algo2.parent.name, self.returncode, self.seconds, self.replay)
+
+
+class Match:
+    """A game running in the background, see start_match
+
+    Attributes :
+        * process (Popen): The engine
+        * cwd (Path): Where the engine runs and writes its replays
+
+    """
+    def __init__(self, algo1, algo2, cwd=None, stdout=None, stderr=None, env=None, java_options=()):
+        self.algo1 = run_file(algo1)
+        self.algo2 = run_file(algo2)
+        self.cwd = Path(cwd) if cwd is not None else root_dir()
+        self.__before = _replays(self.cwd)
+        self.__start = time.time()
+        self.process = subprocess.Popen(engine_command(self.algo1, self.algo2, java_options),
+            cwd=str(self.cwd), env=env, stdout=stdout, stderr=stderr)
+
+    def poll(self):
+        """The exit code of the engine, None while the game is still running"""
+        return self.process.poll()
+
+    def wait(self):
+        """Waits for the game to finish and returns its MatchResult"""
+        returncode = self.process.wait()
+        seconds = time.time() - self.__start
+        # New replays, and any the engine wrote over
+        replays = [path for path, written in sorted(_replays(self.cwd).items(), key=lambda item: item[1])
+                   if self.__before.get(path) != written]
+        return MatchResult(self.algo1, self.algo2, returncode, seconds, replays)
+
+    def kill(self):
+        """Stops the engine, for example when the user stops the script"""
+        if self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+
+
+def start_match(algo1, algo2, cwd=None, stdout=None, stderr=None, env=None, java_options=()):
+    """Starts a game between two algos and returns without waiting for it
+
+    Args:
+        algo1, algo2: The directories or run files of both algos
+        cwd: Where the engine runs and writes its replays, the repository root by default.
+            It needs engine.jar and game-configs.json.
+        stdout, stderr: Where the output of the engine goes, as for subprocess.Popen
+        env: The environment of the engine and the algos, this process's by default
+        java_options: Options for the JVM, before -jar
+
+    Returns:
+        A Match
+    """
+    return Match(algo1, algo2, cwd, stdout, stderr, env, java_options)
+
+
+def run_match(algo1, algo2, cwd=None, stdout=None, stderr=None, env=None, java_options=()):
+    """Plays a game between two algos, see start_match
+
+    Returns:
+        The MatchResult of the game
+    """
+    match = start_match(algo1, algo2, cwd, stdout, stderr, env, java_options)
+    try:
+        return match.wait()
+    except KeyboardInterrupt:
+        match.kill()
+        raise